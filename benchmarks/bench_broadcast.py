@@ -0,0 +1,105 @@
+# benchmarks/bench_broadcast.py
+"""Рассылка новости подписчикам через Bot API в памяти.
+
+Проверяет, что каждый подписчик получает новость (и ровно один раз, если
+процесс не падал), что лимит Telegram соблюдается, а после "падения"
+рассылка продолжается с сохраненного места.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_broadcast --subscribers 50000 --rate 2000 --crash-after 20000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import broadcast
+import database
+from benchmarks.fake_bot import FakeBot
+
+
+def seed(subscribers, with_photo, image_dir):
+    database.init_db()
+    conn = database.get_connection()
+    image = None
+    if with_photo:
+        data = os.urandom(200_000)
+        image = database.StoredImage("bench.jpg", "bench", None, None, None, len(data))
+        with open(os.path.join(image_dir, image.path), "wb") as file:
+            file.write(data)
+        database.register_image(image)
+    with conn:
+        conn.executemany("INSERT INTO subscribers (chat_id) VALUES (?)",
+                         ((1000 + i,) for i in range(subscribers)))
+    news_id = database.insert_news("Новая модель BELAZ", "Представлена модель 75710.",
+                                   "2025-01-01 10:00:00", image)
+    database.create_broadcast(news_id)
+
+
+async def run(args, bot):
+    sender = broadcast.Broadcaster(bot, rate=args.rate, per_chat_rate=1,
+                                   batch_size=args.batch, owner="bench")
+    if args.crash_after:
+        # Имитируем падение процесса посреди рассылки
+        task = asyncio.create_task(sender.run_pending())
+        while sum(bot.delivered.values()) < args.crash_after and not task.done():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        print(f"Прервано после {sum(bot.delivered.values())} сообщений, перезапуск")
+        sender = broadcast.Broadcaster(bot, rate=args.rate, per_chat_rate=1,
+                                       batch_size=args.batch, owner="bench")
+    await sender.run_pending()
+    return sender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, default=50_000)
+    parser.add_argument("--rate", type=float, default=2000,
+                        help="Лимит рассылки, сообщений/с (в бою - 25)")
+    parser.add_argument("--api-limit", type=int, default=None,
+                        help="Лимит фейкового API, сверх него - 429 (по умолчанию rate * 1.2)")
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка ответа API, с")
+    parser.add_argument("--blocked", type=float, default=0.01, help="Доля заблокировавших бота")
+    parser.add_argument("--photo", action="store_true", help="Новость с изображением")
+    parser.add_argument("--crash-after", type=int, default=0,
+                        help="Прервать рассылку после N сообщений и продолжить")
+    args = parser.parse_args()
+
+    blocked = range(1000, 1000 + int(args.subscribers * args.blocked))
+    bot = FakeBot(latency=args.latency, global_limit=args.api_limit or int(args.rate * 1.2),
+                  blocked_chats=blocked)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(os.path.join(tmp, "bench.db"))
+        broadcast.IMAGE_DIR = tmp
+        seed(args.subscribers, args.photo, tmp)
+
+        start = time.perf_counter()
+        sender = asyncio.run(run(args, bot))
+        elapsed = time.perf_counter() - start
+
+        row = database.get_connection().execute(
+            "SELECT status, sent, failed FROM broadcasts").fetchone()
+        expected = args.subscribers - len(blocked)
+        duplicates = sum(count - 1 for count in bot.delivered.values() if count > 1)
+        missing = sum(1 for chat_id in range(1000 + len(blocked), 1000 + args.subscribers)
+                      if not bot.delivered[chat_id])
+        left = database.get_connection().execute("SELECT count(*) FROM subscribers").fetchone()[0]
+
+        print(f"Время: {elapsed:.1f} с, {sum(bot.delivered.values()) / elapsed:.0f} сообщ./с")
+        print(f"Статус: {row[0]}, доставлено {row[1]}, ошибок {row[2]} (ожидалось {expected})")
+        print(f"Не получили: {missing}, повторов: {duplicates}")
+        print(f"Вызовы API: {dict(bot.calls)}, 429: {bot.rate_limited}, повторов: {sender.retries}")
+        print(f"Загружено байт: {bot.uploaded_bytes}, осталось подписчиков: {left}")
+        database.close_all()
+
+
+if __name__ == "__main__":
+    main()
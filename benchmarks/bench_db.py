@@ -0,0 +1,91 @@
+# benchmarks/bench_db.py
+"""Микро-бенчмарк: задержка одного запроса при соединении на каждый вызов
+(как было в обработчиках) и при общем пуле соединений.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db --news 2000 --queries 5000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database
+
+
+def old_get_news_by_id(db_path, news_id):
+    """Старый путь: новое соединение на каждый запрос."""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT title, content, image_path, date FROM news WHERE id = ?", (news_id,))
+        return cursor.fetchone()
+
+
+def old_get_documents(db_path, doc_type):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, file_path FROM documents WHERE type = ?", (doc_type,))
+    docs = cursor.fetchall()
+    conn.close()
+    return docs
+
+
+def measure(func, args_list):
+    """Возвращает задержки в микросекундах."""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{name:<32} p50={p50:8.1f} мкс  p99={p99:8.1f} мкс")
+
+
+def seed(count):
+    conn = database.get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO news (title, content, image_path, date) VALUES (?, ?, ?, ?)",
+            [(f"Новость {i}", "Текст новости " * 50, None,
+              f"2025-01-01 00:00:{i % 60:02d}") for i in range(count)]
+        )
+        conn.executemany(
+            "INSERT INTO documents (name, type, file_path) VALUES (?, ?, ?)",
+            [(f"Документ {i}", "application" if i % 2 else "template",
+              f"docs/doc_{i}.docx") for i in range(100)]
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--news", type=int, default=2000, help="Сколько новостей создать")
+    parser.add_argument("--queries", type=int, default=5000, help="Сколько запросов выполнить")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        database.configure(db_path)
+        database.init_db()
+        seed(args.news)
+
+        ids = [((i % args.news) + 1,) for i in range(args.queries)]
+        types = [("application" if i % 2 else "template",) for i in range(args.queries)]
+
+        report("get_news_by_id: connect/call", measure(lambda i: old_get_news_by_id(db_path, i), ids))
+        report("get_news_by_id: пул", measure(database.get_news_by_id, ids))
+        report("get_documents: connect/call", measure(lambda t: old_get_documents(db_path, t), types))
+        report("get_documents: пул", measure(database.get_documents, types))
+
+        database.close_all()
+
+
+if __name__ == "__main__":
+    main()
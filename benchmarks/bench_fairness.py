@@ -0,0 +1,63 @@
+# benchmarks/bench_fairness.py
+"""Один пользователь засыпает бота обновлениями - остальные не должны ждать.
+
+Обновления идут через настоящий runtime.PerUserUpdateProcessor (как в
+Application: каждое - своей задачей), обработчик - пауза --work секунд.
+Пользователь A присылает --flood обновлений разом, следом пользователь B -
+одно. Обновления A идут по очереди, а B должен закончиться примерно за
+время одного обработчика, а не после очереди A. Код выхода 1, если B ждал
+дольше --threshold обработчиков.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_fairness --flood 100 --limit 64
+"""
+import argparse
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from runtime import PerUserUpdateProcessor
+
+
+def make_update(user_id):
+    user = SimpleNamespace(id=user_id)
+    return SimpleNamespace(effective_user=user, effective_chat=user)
+
+
+async def run(args):
+    processor = PerUserUpdateProcessor(args.limit)
+    finished = {}
+
+    async def handler(name):
+        await asyncio.sleep(args.work)
+        finished[name] = time.perf_counter()
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(processor.process_update(make_update(1), handler(("A", i))))
+             for i in range(args.flood)]
+    await asyncio.sleep(0)  # Обновления A уже в обработке, когда приходит B
+    tasks.append(asyncio.create_task(processor.process_update(make_update(2), handler("B"))))
+    await asyncio.gather(*tasks)
+    return finished["B"] - started, max(finished.values()) - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--flood", type=int, default=100, help="Обновлений от пользователя A")
+    parser.add_argument("--limit", type=int, default=64, help="max_concurrent_updates")
+    parser.add_argument("--work", type=float, default=0.01, help="Время обработчика, с")
+    parser.add_argument("--threshold", type=float, default=5,
+                        help="Сколько обработчиков может ждать B без регрессии")
+    args = parser.parse_args()
+
+    waited, total = asyncio.run(run(args))
+    print(f"A: {args.flood} обновлений за {total:.2f} с; "
+          f"B: ответ через {waited * 1000:.1f} мс ({waited / args.work:.1f} обработчиков)")
+    if waited > args.threshold * args.work:
+        print("Регрессия: обновление B ждало очередь A")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
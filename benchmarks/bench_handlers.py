@@ -0,0 +1,345 @@
+# benchmarks/bench_handlers.py
+"""Сколько стоит нажатие кнопки: настоящие обработчики бота на синтетических
+обновлениях и Bot API в памяти (fake_bot.LocalRequest).
+
+Для каждого сценария: задержка p50/p99, пропускная способность, число
+SQL-запросов и вызовов Bot API на одну операцию. Результаты можно сохранить
+в JSON (--json) и сравнить с прошлым запуском (--compare).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_handlers --news 10000 --documents 500 --json after.json
+    python -m benchmarks.bench_handlers --compare before.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.warnings import PTBUserWarning
+
+import botapi
+import database
+import images
+import metrics
+from cache import render_cache
+from config import ADMIN_ID
+from handlers.inline import inline_cache
+from main import build_application
+from benchmarks.fake_bot import LocalRequest
+from benchmarks.sandbox import isolate_files
+
+
+class SqlCounter:
+    """Считаем запросы из всех потоков пула (callback для database.set_trace)"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, sql):
+        with self._lock:
+            self.count += 1
+
+
+class UpdateFactory:
+    """Собираем JSON обновлений Telegram и превращаем их в telegram.Update"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def _message(self, user_id, **fields):
+        message = {"message_id": next(self._ids), "date": int(time.time()),
+                   "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id)}
+        message.update(fields)
+        return message
+
+    def _update(self, **fields):
+        return Update.de_json(dict(update_id=next(self._ids), **fields), self.bot)
+
+    def callback(self, user_id, data, photo=False):
+        """Нажатие кнопки под текстовым сообщением или под фото (photo=True)"""
+        if photo:
+            message = self._message(user_id, caption="news", photo=[
+                {"file_id": "shown", "file_unique_id": "u-shown", "width": 1280, "height": 720}])
+        else:
+            message = self._message(user_id, text="menu")
+        message["from"] = {"id": self.bot.id, "is_bot": True, "first_name": "Bench"}
+        return self._update(callback_query={
+            "id": str(next(self._ids)), "from": self._user(user_id), "chat_instance": "1",
+            "data": data, "message": message})
+
+    def text(self, user_id, text):
+        fields = {"text": text}
+        if text.startswith("/"):
+            command = text.split()[0]
+            fields["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return self._update(message=self._message(user_id, **fields))
+
+    def inline(self, user_id, query, offset=""):
+        return self._update(inline_query={
+            "id": str(next(self._ids)), "from": self._user(user_id), "query": query,
+            "offset": offset})
+
+    def photo(self, user_id):
+        file_id = f"admin-photo-{next(self._ids)}"
+        return self._update(message=self._message(user_id, photo=[
+            {"file_id": file_id, "file_unique_id": f"u-{file_id}", "width": 1280, "height": 720}]))
+
+
+def build_scenarios(factory, args, news_ids, photo_news_ids, doc_ids):
+    """Сценарий: функция (номер итерации, пользователь) -> список обновлений"""
+    rnd = random.Random(42)
+    # Якоря для листания: новости из первых страниц, как листают чаще всего
+    recent = news_ids[:200]
+    return {
+        "main_menu": lambda i, user: [factory.callback(user, "back_to_main")],
+        "news_menu": lambda i, user: [factory.callback(user, "news")],
+        "news_page": lambda i, user: [factory.callback(user, f"news_older:{rnd.choice(recent)}")],
+        "news_detail": lambda i, user: [factory.callback(user, f"news_item:{rnd.choice(news_ids)}")],
+        "news_detail_photo": lambda i, user: [
+            factory.callback(user, f"news_item:{rnd.choice(photo_news_ids)}")],
+        # Переходы из-под фото новости: правка медиа или подписи вместо отправки нового
+        "news_detail_from_photo": lambda i, user: [
+            factory.callback(user, f"news_item:{rnd.choice(photo_news_ids)}", photo=True)],
+        "news_back_from_photo": lambda i, user: [factory.callback(user, "news", photo=True)],
+        "confirm_delete": lambda i, user: [
+            factory.callback(ADMIN_ID, f"confirm_delete:{rnd.choice(news_ids)}")],
+        "confirm_delete_photo": lambda i, user: [
+            factory.callback(ADMIN_ID, f"confirm_delete:{rnd.choice(photo_news_ids)}", photo=True)],
+        "documents_list": lambda i, user: [
+            factory.callback(user, f"doclist:{('application', 'template')[i % 2]}")],
+        "send_document": lambda i, user: [factory.callback(user, f"doc:{rnd.choice(doc_ids)}")],
+        "send_bundle": lambda i, user: [
+            factory.callback(user, f"docbundle:{('application', 'template')[i % 2]}")],
+        "contacts_page": lambda i, user: [
+            factory.callback(user, f"contacts_page:{rnd.randrange(args.contacts // 10 or 1)}")],
+        "contacts_search": lambda i, user: [
+            factory.text(user, f"/contacts {rnd.choice(('отдел 1', '17 20', 'dept4', 'кадр'))}")],
+        # Inline-режим: запрос набирается по буквам, как в клиенте Telegram
+        "inline_typing": lambda i, user: [
+            factory.inline(user, word[:length])
+            for word in [("новость", "документ", "текст новости", "выставка")[i % 4]]
+            for length in range(1, len(word) + 1)],
+        "unknown_button": lambda i, user: [factory.callback(user, "removed_button:1")],
+        # Диалог добавления новости целиком: команда, фото, заголовок, текст, время
+        "add_news": lambda i, user: [
+            factory.text(ADMIN_ID, "/add_news"),
+            factory.photo(ADMIN_ID),
+            factory.text(ADMIN_ID, f"Бенчмарк {i}"),
+            factory.text(ADMIN_ID, "Текст новости из бенчмарка."),
+            factory.text(ADMIN_ID, "/now"),
+        ],
+    }
+
+
+def seed(args, tmp):
+    """База нужного размера, файлы документов и изображения части новостей"""
+    doc_dir = os.path.join(tmp, "docs")
+    os.makedirs(doc_dir)
+    database.init_db()
+    database.seed_db(news_count=args.news, documents_count=args.documents, doc_dir=doc_dir,
+                     contacts_count=args.contacts)
+
+    conn = database.get_connection()
+    payload = os.urandom(args.file_size)
+    for doc_id, path in conn.execute("SELECT id, file_path FROM documents").fetchall():
+        full_path = path if os.path.isabs(path) else os.path.join(tmp, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as file:
+            file.write(payload)
+        conn.execute("UPDATE documents SET file_path = ? WHERE id = ?", (full_path, doc_id))
+
+    news_ids = [row[0] for row in conn.execute("SELECT id FROM news ORDER BY date DESC, id DESC")]
+    photo_news_ids = news_ids[::max(1, len(news_ids) // 50)]
+    for news_id in photo_news_ids:
+        image = images.store(os.urandom(1024) + payload)
+        conn.execute("UPDATE news SET image_path = ?, image_fingerprint = ? WHERE id = ?",
+                     (image.path, image.fingerprint, news_id))
+    conn.commit()
+    doc_ids = [row[0] for row in conn.execute("SELECT id FROM documents")]
+    return news_ids, photo_news_ids, doc_ids
+
+
+async def run_scenario(application, api, sql, make_updates, args, concurrency):
+    errors = []
+
+    async def on_error(update, context):
+        errors.append(context.error)
+
+    application.add_error_handler(on_error)
+    processor = application.update_processor
+    latencies = []
+    users = itertools.cycle(range(100_000, 100_000 + args.users))
+    counter = itertools.count()
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= args.ops:
+                return
+            updates = make_updates(i, next(users))
+            if args.cold:
+                render_cache.clear()
+                inline_cache.clear()
+            started = time.perf_counter()
+            for update in updates:
+                # Как Application: через процессор, обновления одного пользователя по порядку
+                await processor.process_update(update, application.process_update(update))
+            latencies.append(time.perf_counter() - started)
+
+    api.reset()
+    sql.count = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    application.remove_error_handler(on_error)
+
+    latencies.sort()
+    ops = len(latencies)
+    return {
+        "ops": ops,
+        "concurrency": concurrency,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[max(0, int(ops * 0.99) - 1)] * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "throughput": round(ops / elapsed, 1),
+        "sql_per_op": round(sql.count / ops, 2),
+        "api_per_op": round(sum(api.calls.values()) / ops, 2),
+        "api_calls": dict(api.calls),
+        "uploaded_bytes_per_op": api.uploaded_bytes // ops,
+        "errors": len(errors),
+    }
+
+
+async def run(args, tmp):
+    # Схема - до initialize(): хранилище состояния только читает базу
+    database.init_db()
+    api = LocalRequest(latency=args.latency, file_size=args.file_size)
+    request = botapi.MeteredRequest(api) if metrics.enabled else api
+    if args.api_rate:
+        # Лимит на чат тоже поднят: иначе диалог админа упрется в 1 сообщение/с
+        request = botapi.ScheduledRequest(request, rate=args.api_rate, burst=args.api_rate,
+                                          per_chat_rate=args.api_rate, per_chat_burst=args.api_rate)
+    application = build_application(
+        "webhook", Application.builder().token("1:local").request(request).get_updates_request(api),
+        retention=False)
+    await application.initialize()
+    await application.update_processor.initialize()
+
+    sql = SqlCounter()
+    database.set_trace(sql)
+    news_ids, photo_news_ids, doc_ids = seed(args, tmp)
+    factory = UpdateFactory(application.bot)
+    scenarios = build_scenarios(factory, args, news_ids, photo_news_ids, doc_ids)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+
+    results = {}
+    for name in selected:
+        render_cache.clear()
+        inline_cache.clear()
+        # Диалог админа идет по шагам, параллельно его не запустить
+        concurrency = 1 if name == "add_news" else args.concurrency
+        results[name] = await run_scenario(application, api, sql, scenarios[name], args,
+                                           concurrency)
+        print_result(name, results[name])
+
+    database.set_trace(None)
+    await application.update_processor.shutdown()
+    await application.shutdown()
+    return results
+
+
+def print_result(name, result):
+    api = ", ".join(f"{method} {count / result['ops']:.2f}"
+                    for method, count in sorted(result["api_calls"].items()))
+    print(f"{name:<18} p50 {result['p50_ms']:7.2f} мс  p99 {result['p99_ms']:7.2f} мс  "
+          f"{result['throughput']:8.1f} оп/с  SQL {result['sql_per_op']:5.1f}  "
+          f"API {result['api_per_op']:4.1f} ({api})"
+          + (f"  ошибок {result['errors']}" if result["errors"] else ""))
+
+
+def compare(results, baseline_path, threshold):
+    """Сравниваем с прошлым запуском; True, если есть регрессия больше threshold"""
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)["scenarios"]
+    regressed = False
+    print(f"\nСравнение с {baseline_path} (p50, p99, SQL на операцию):")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:<18} нет в базовом запуске")
+            continue
+        ratios = [result[key] / old[key] if old[key] else 1.0 for key in ("p50_ms", "p99_ms")]
+        sql_delta = result["sql_per_op"] - old["sql_per_op"]
+        # Доли запроса - шум от попаданий в кэш; регрессия - целый лишний запрос
+        worse = any(ratio > threshold for ratio in ratios) or sql_delta >= 1
+        regressed |= worse
+        print(f"{name:<18} x{ratios[0]:.2f}  x{ratios[1]:.2f}  SQL {sql_delta:+.1f}"
+              + ("  <- регрессия" if worse else ""))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--news", type=int, default=5000)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--contacts", type=int, default=500)
+    parser.add_argument("--ops", type=int, default=500, help="Операций на сценарий")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка Bot API, с")
+    parser.add_argument("--api-rate", type=float, default=0,
+                        help="Пропускать запросы через планировщик botapi с этим лимитом, в секунду")
+    parser.add_argument("--file-size", type=int, default=100_000, help="Размер документов, байт")
+    parser.add_argument("--cold", action="store_true", help="Сбрасывать кэш экранов перед операцией")
+    parser.add_argument("--scenarios", help="Через запятую (по умолчанию все)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Включить metrics (оценить накладные расходы) и вывести их")
+    parser.add_argument("--json", help="Сохранить результаты в файл")
+    parser.add_argument("--compare", help="Сравнить с результатами прошлого запуска")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Во сколько раз может вырасти задержка без регрессии")
+    args = parser.parse_args()
+    # Предупреждения обработчиков (например, "неизвестная кнопка") - часть сценариев
+    logging.getLogger().setLevel(logging.ERROR)
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+
+    metrics.enabled = args.metrics
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(os.path.join(tmp, "bench.db"))
+        isolate_files(tmp)
+        results = asyncio.run(run(args, tmp))
+        database.close_all()
+
+    output = {
+        "meta": {"args": vars(args), "python": platform.python_version(),
+                 "sqlite": database.sqlite3.sqlite_version, "time": time.strftime("%Y-%m-%d %H:%M:%S")},
+        "scenarios": results,
+    }
+    if args.metrics:
+        print(metrics.render())
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(output, file, ensure_ascii=False, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_search.py
+"""Бенчмарк полнотекстового поиска по новостям (FTS5).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_search --news 100000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import database
+
+SYLLABLES = ["ба", "ла", "зо", "ми", "ра", "то", "ке", "ню", "сы", "де", "го", "пу", "ве", "шо"]
+
+
+def make_vocabulary(size, rnd):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    # Порядок = ранг частоты; перемешиваем, чтобы частота не зависела от алфавита
+    words = sorted(words)
+    rnd.shuffle(words)
+    return words
+
+
+def seed(count, vocabulary, rnd):
+    # Частоты слов по закону Ципфа, как в живом тексте
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    conn = database.get_connection()
+    batch = []
+    with conn:
+        for i in range(count):
+            title = " ".join(rnd.choices(vocabulary, cum_weights=weights, k=5))
+            content = " ".join(rnd.choices(vocabulary, cum_weights=weights, k=80))
+            batch.append((title, content, f"2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}"))
+            if len(batch) == 5000:
+                conn.executemany("INSERT INTO news (title, content, date) VALUES (?, ?, ?)", batch)
+                batch.clear()
+        conn.executemany("INSERT INTO news (title, content, date) VALUES (?, ?, ?)", batch)
+    conn.execute("INSERT INTO news_fts (news_fts) VALUES ('optimize')")
+
+
+def measure(queries, pages=(0,)):
+    timings = []
+    for text in queries:
+        match = database.fts_query(text)
+        for page in pages:
+            start = time.perf_counter()
+            database.search_news(match, page)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+    print(f"{name:<28} p50={p50:7.2f} мс  p99={p99:7.2f} мс  max={timings[-1]:7.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--news", type=int, default=100_000, help="Сколько новостей создать")
+    parser.add_argument("--queries", type=int, default=200, help="Запросов в каждом сценарии")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    vocabulary = make_vocabulary(5000, rnd)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(os.path.join(tmp, "bench.db"))
+        database.init_db()
+        start = time.perf_counter()
+        seed(args.news, vocabulary, rnd)
+        print(f"Создано {args.news} новостей за {time.perf_counter() - start:.1f} с")
+
+        rare = rnd.sample(vocabulary[1000:], args.queries)
+        common = rnd.choices(vocabulary[:50], k=args.queries)
+        report("редкое слово", measure(rare))
+        report("частое слово", measure(common))
+        report("префикс (3 буквы)", measure([w[:3] for w in rare]))
+        report("два слова", measure([f"{a} {b}" for a, b in zip(common, rare)]))
+        report("частое слово, стр. 1-3", measure(common[:args.queries // 3], pages=(1, 2, 3)))
+
+        database.close_all()
+
+
+if __name__ == "__main__":
+    main()
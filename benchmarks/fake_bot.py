@@ -0,0 +1,145 @@
+# benchmarks/fake_bot.py
+"""Bot API в памяти для бенчмарков: записывает вызовы, имитирует задержку
+сети, лимиты Telegram (429 RetryAfter) и заблокировавших бота пользователей."""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+
+from telegram.error import Forbidden, RetryAfter
+from telegram.request import BaseRequest
+
+
+class FakeBot:
+    def __init__(self, latency=0.0, global_limit=None, blocked_chats=()):
+        self.latency = latency
+        self.global_limit = global_limit  # Сообщений в секунду, сверх - 429
+        self.blocked_chats = set(blocked_chats)
+        self.calls = Counter()  # метод -> число вызовов
+        self.delivered = Counter()  # chat_id -> доставлено сообщений
+        self.uploaded_bytes = 0
+        self.rate_limited = 0
+        self._recent = deque()
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.calls.clear()
+        self.delivered.clear()
+        self.uploaded_bytes = 0
+        self.rate_limited = 0
+
+    async def _call(self, method, chat_id=None):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.global_limit:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.global_limit:
+                self.rate_limited += 1
+                raise RetryAfter(1)
+            self._recent.append(now)
+        if chat_id in self.blocked_chats:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+
+    def _upload(self, media):
+        """Считаем загруженные байты; строка - это уже file_id."""
+        if isinstance(media, str):
+            return media
+        self.uploaded_bytes += len(media) if isinstance(media, (bytes, bytearray)) else 0
+        return f"file-{next(self._ids)}"
+
+    def _message(self, chat_id, **fields):
+        message = dict(message_id=next(self._ids), chat_id=chat_id, photo=None, document=None)
+        message.update(fields)
+        return SimpleNamespace(**message)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("send_message", chat_id)
+        self.delivered[chat_id] += 1
+        return self._message(chat_id, text=text)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        await self._call("send_photo", chat_id)
+        file_id = self._upload(photo)
+        self.delivered[chat_id] += 1
+        return self._message(chat_id, photo=[SimpleNamespace(file_id=file_id)])
+
+    async def send_document(self, chat_id, document, **kwargs):
+        await self._call("send_document", chat_id)
+        file_id = self._upload(document)
+        self.delivered[chat_id] += 1
+        return self._message(chat_id, document=SimpleNamespace(file_id=file_id))
+
+
+class LocalRequest(BaseRequest):
+    """Транспорт Bot API без сети для настоящего telegram.Bot.
+
+    Отвечает на любой метод: getMe - описанием бота, send*/edit* - сообщением
+    в тот же чат (с file_id для фото и документов), getFile и скачивание -
+    сгенерированным файлом, остальное - True. Нужен, чтобы гонять настоящие
+    обработчики и Application, не обращаясь к Telegram.
+    """
+
+    def __init__(self, latency=0.0, file_size=100_000):
+        self.latency = latency
+        self.file_size = file_size
+        self.calls = Counter()
+        self.uploaded_bytes = 0
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.calls.clear()
+        self.uploaded_bytes = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _file(self, kind, file_id=None):
+        file_id = file_id or f"{kind}-{next(self._ids)}"
+        return {"file_id": file_id, "file_unique_id": f"u-{file_id}", "file_size": self.file_size}
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if "/file/bot" in url:
+            # Скачивание файла: содержимое зависит от пути, чтобы работала дедупликация
+            self.calls["downloadFile"] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            seed = url.rsplit("/", 1)[-1].encode()
+            return 200, (seed * (self.file_size // len(seed) + 1))[:self.file_size]
+
+        name = url.rsplit("/", 1)[-1]
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        if request_data and request_data.contains_files:
+            self.uploaded_bytes += sum(len(part[1]) for part in request_data.multipart_data.values())
+
+        if name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif name == "getFile":
+            result = dict(self._file("file", params["file_id"]),
+                          file_path=f"photos/{params['file_id']}.jpg")
+        elif name.startswith(("send", "edit")) and "chat_id" in params:
+            result = {"message_id": next(self._ids), "date": int(time.time()),
+                      "chat": {"id": int(params["chat_id"]), "type": "private"},
+                      "text": params.get("text") or params.get("caption") or ""}
+            if name in ("sendPhoto", "editMessageMedia"):
+                result["photo"] = [dict(self._file("photo"), width=1280, height=720)]
+            elif name == "sendDocument":
+                result["document"] = self._file("document")
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
@@ -0,0 +1,193 @@
+# benchmarks/replay_updates.py
+"""Отправка записанных обновлений на webhook-сервер бота.
+
+Обновления берутся из файла (JSON-список или по одному JSON в строке) или
+генерируются. Клиент держит несколько keep-alive соединений, как Telegram,
+и повторяет запросы, получившие 503.
+
+Без --url поднимается бот в этом же процессе: настоящие обработчики и
+webhook-сервер, Bot API отвечает локально (fake_bot.LocalRequest), база и
+файлы - во временном каталоге (sandbox.isolate_files), без очистки
+(retention.py) и сервера метрик. Telegram не нужен.
+
+Запуск из корня проекта:
+    python -m benchmarks.replay_updates --updates 5000 --connections 40
+    python -m benchmarks.replay_updates --url http://127.0.0.1:8080/telegram --secret ... --file updates.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+import database
+import metrics
+import webhook
+from benchmarks.fake_bot import LocalRequest
+from benchmarks.sandbox import isolate_files
+
+SECRET = "bench-secret"
+
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as file:
+        text = file.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def generate_updates(count, users):
+    """Смесь команд и нажатий кнопок от users пользователей"""
+    buttons = ["news", "docs", "help", "contacts", "doclist:application", "back_to_main"]
+    updates = []
+    for update_id in range(1, count + 1):
+        user = {"id": 10_000 + update_id % users, "is_bot": False, "first_name": "User"}
+        chat = {"id": user["id"], "type": "private"}
+        if update_id % 4 == 0:
+            updates.append({"update_id": update_id, "message": {
+                "message_id": update_id, "date": int(time.time()), "chat": chat, "from": user,
+                "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}})
+        else:
+            updates.append({"update_id": update_id, "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": "1",
+                "data": buttons[update_id % len(buttons)],
+                "message": {"message_id": update_id, "date": int(time.time()), "chat": chat,
+                            "from": {"id": 1, "is_bot": True, "first_name": "Bench"},
+                            "text": "menu"}}})
+    return updates
+
+
+async def post(reader, writer, host, path, secret, body):
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                  f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def replay(url, secret, updates, connections, batch):
+    """Шлем обновления по connections соединениям, возвращаем задержки и число 503"""
+    parts = urlsplit(url)
+    queue = asyncio.Queue()
+    for start in range(0, len(updates), batch):
+        queue.put_nowait(updates[start:start + batch])
+    latencies = []
+    statuses = {}
+
+    async def worker():
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+        try:
+            while not queue.empty():
+                chunk = queue.get_nowait()
+                while chunk:
+                    body = json.dumps(chunk if batch > 1 else chunk[0]).encode()
+                    started = time.perf_counter()
+                    status, payload = await post(reader, writer, parts.netloc, parts.path,
+                                                 secret, body)
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == 200:
+                        break
+                    if status != 503:
+                        raise RuntimeError(f"Ответ {status}: {payload}")
+                    # Как Telegram: повторяем то, что не приняли
+                    chunk = chunk[payload.get("accepted", 0):]
+                    await asyncio.sleep(0.05)
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    return latencies, statuses
+
+
+async def run_local(args, updates):
+    """Бот в этом же процессе: webhook-сервер + настоящие обработчики"""
+    from telegram.ext import Application
+    from main import build_application
+
+    api = LocalRequest(latency=args.latency)
+    application = build_application(
+        "webhook", Application.builder().token("1:local").request(api).get_updates_request(api),
+        retention=False)
+    server = webhook.WebhookServer(application, host="127.0.0.1", port=0, secret=SECRET,
+                                   enqueue_timeout=args.enqueue_timeout)
+    stop = asyncio.Event()
+    bot_task = asyncio.create_task(webhook.run(application, stop, server))
+    while server._server is None:
+        await asyncio.sleep(0.01)
+
+    url = f"http://127.0.0.1:{server.port}{server.path}"
+    started = time.perf_counter()
+    latencies, statuses = await replay(url, SECRET, updates, args.connections, args.batch)
+    accepted_time = time.perf_counter() - started
+
+    # Остановка дообрабатывает все принятые обновления
+    stop.set()
+    await bot_task
+    total_time = time.perf_counter() - started
+    return latencies, statuses, accepted_time, total_time, server, api
+
+
+def report(latencies, statuses, elapsed, count):
+    latencies.sort()
+    print(f"Обновлений: {count}, запросов: {len(latencies)}, ответы: {statuses}")
+    print(f"Прием: {elapsed:.2f} с, {count / elapsed:.0f} обновл./с")
+    print(f"Задержка ответа, мс: медиана {statistics.median(latencies) * 1000:.1f}, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}, "
+          f"макс {latencies[-1] * 1000:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="Адрес webhook работающего бота (иначе - бот в процессе)")
+    parser.add_argument("--secret", default=SECRET)
+    parser.add_argument("--file", help="Записанные обновления (JSON или JSONL)")
+    parser.add_argument("--updates", type=int, default=5000, help="Сколько сгенерировать")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=1, help="Обновлений в одном запросе")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="Задержка локального Bot API, с")
+    parser.add_argument("--enqueue-timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    updates = load_updates(args.file) if args.file else generate_updates(args.updates, args.users)
+
+    if args.url:
+        started = time.perf_counter()
+        latencies, statuses = asyncio.run(
+            replay(args.url, args.secret, updates, args.connections, args.batch))
+        report(latencies, statuses, time.perf_counter() - started, len(updates))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(os.path.join(tmp, "bench.db"))
+        isolate_files(tmp)
+        # Порт метрик занят рабочим ботом, а стенд считает свое сам
+        metrics.enabled = False
+        database.init_db()
+        database.seed_db()
+        latencies, statuses, accepted_time, total_time, server, api = asyncio.run(
+            run_local(args, updates))
+        report(latencies, statuses, accepted_time, len(updates))
+        print(f"Обработка до конца (с остановкой): {total_time:.2f} с, "
+              f"принято {server.accepted}, отклонено {server.rejected}, "
+              f"в работе после остановки {server.queue.pending}")
+        print(f"Вызовы Bot API: {sum(api.calls.values())} {dict(api.calls.most_common(5))}")
+
+
+if __name__ == "__main__":
+    main()
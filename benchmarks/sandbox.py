@@ -0,0 +1,21 @@
+# benchmarks/sandbox.py
+"""Файлы бота для стендов: изображения, превью и комплекты документов пишутся
+во временный каталог, поэтому замеры не трогают рабочие news_images/ и bundles/."""
+import os
+
+import broadcast
+import bundles
+import images
+import manifest
+import retention
+from handlers import inline as inline_handlers
+from handlers import news as news_handlers
+
+
+def isolate_files(tmp):
+    """Переключаем модули, импортировавшие IMAGE_DIR и BUNDLE_DIR из config, на tmp"""
+    image_dir = os.path.join(tmp, "images")
+    for module in (images, news_handlers, inline_handlers, broadcast, manifest, retention):
+        module.IMAGE_DIR = image_dir
+    bundles.BUNDLE_DIR = os.path.join(tmp, "bundles")
+    return image_dir
@@ -0,0 +1,251 @@
+# botapi.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import time
+from telegram.request import BaseRequest, HTTPXRequest
+from config import (BOTAPI_RATE, BOTAPI_BURST, BOTAPI_PER_CHAT_RATE, BOTAPI_PER_CHAT_BURST,
+                    BOTAPI_MAX_RETRIES)
+from ratelimit import TokenBucket, KeyedLimiter
+import metrics
+"""Транспорт исходящих запросов к Bot API: планировщик с лимитами и
+приоритетами, замер времени вызовов"""
+
+logger = logging.getLogger(__name__)
+
+# Очереди по приоритету: меньше - раньше
+INTERACTIVE = 0  # Ответы пользователю: сообщения, правки, answerCallbackQuery
+CLEANUP = 1  # Уборка, которую пользователь не ждет (удаление старых сообщений)
+BULK = 2  # Рассылки
+
+LANE_NAMES = {INTERACTIVE: "interactive", CLEANUP: "cleanup", BULK: "bulk"}
+
+# Очередь по умолчанию для кода, который не знает о планировщике.
+# Рассылка выставляет BULK для своей задачи - ее запросы пропускают ответы пользователям.
+lane = contextvars.ContextVar("botapi_lane", default=INTERACTIVE)
+
+CLEANUP_METHODS = {"deleteMessage", "deleteMessages"}
+# Сообщения в чат: на них действует лимит Telegram ~1 в секунду на чат
+CHAT_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "sendMediaGroup", "copyMessage",
+                "forwardMessage"}
+# Правки одного сообщения: если предыдущая еще в очереди, отправится только последняя
+EDIT_METHODS = {"editMessageText", "editMessageCaption", "editMessageMedia",
+                "editMessageReplyMarkup"}
+# Остальное (getMe, setWebhook, getFile...) идет без очереди
+SCHEDULED_METHODS = CLEANUP_METHODS | CHAT_METHODS | EDIT_METHODS | {"answerCallbackQuery"}
+
+
+def _api_method(url):
+    # .../bot<token>/sendMessage или .../file/bot<token>/<путь> при скачивании
+    return "downloadFile" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+
+
+class MeteredRequest(BaseRequest):
+    """Обертка над транспортом: время каждого метода Bot API, ошибки и
+    объем загруженных файлов (send_document, send_photo) в metrics."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = _api_method(url)
+        if request_data is not None and request_data.contains_files:
+            uploaded = sum(len(part[1]) for part in request_data.multipart_data.values()
+                           if isinstance(part, tuple))
+            metrics.UPLOADED_BYTES.inc((api_method,), uploaded)
+
+        start = time.perf_counter()
+        try:
+            code, payload = await self.inner.do_request(
+                url, method, request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+                connect_timeout=connect_timeout, pool_timeout=pool_timeout)
+        except Exception:
+            metrics.API_ERRORS.inc((api_method, "network"))
+            raise
+        finally:
+            metrics.API_SECONDS.observe((api_method,), time.perf_counter() - start)
+        if code >= 400:
+            metrics.API_ERRORS.inc((api_method, str(code)))
+        return code, payload
+
+
+class _Job:
+    __slots__ = ("url", "method", "request_data", "kwargs", "ready", "result", "cancelled")
+
+    def __init__(self, url, method, request_data, kwargs):
+        self.url = url
+        self.method = method
+        self.request_data = request_data
+        self.kwargs = kwargs
+        self.ready = None  # Future, которую планировщик завершает, когда пора отправлять
+        self.result = None  # Future ответа, если на задание ждут несколько правок
+        self.cancelled = False
+
+
+class ScheduledRequest(BaseRequest):
+    """Планировщик исходящих запросов поверх транспорта.
+
+    - общий лимит (rate в секунду) и лимит сообщений на чат;
+    - очереди с приоритетом: ответы пользователю обгоняют удаление старых
+      сообщений и рассылку;
+    - на 429 ждем retry_after и повторяем запрос сами, обработчик ошибку не видит;
+    - правки одного сообщения, не успевшие уйти, схлопываются в последнюю.
+    """
+
+    def __init__(self, inner, rate=BOTAPI_RATE, burst=BOTAPI_BURST,
+                 per_chat_rate=BOTAPI_PER_CHAT_RATE, per_chat_burst=BOTAPI_PER_CHAT_BURST,
+                 max_retries=BOTAPI_MAX_RETRIES):
+        self.inner = inner
+        self.bucket = TokenBucket(rate, burst)
+        self.chat_limiter = KeyedLimiter(per_chat_rate, per_chat_burst)
+        self.max_retries = max_retries
+        self.coalesced = 0
+        self.retried = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._pending_edits = {}  # (метод, chat_id, message_id) -> _Job в очереди
+        self._wakeup = None
+        self._dispatcher = None
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        await self.inner.shutdown()
+
+    async def _dispatch(self):
+        """Выпускаем задания по одному на токен общего ведра, старшие - первыми"""
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self.bucket.acquire()
+            while self._heap:
+                _, _, job = heapq.heappop(self._heap)
+                if not job.cancelled:
+                    job.ready.set_result(None)
+                    break
+
+    async def _wait_turn(self, job, priority):
+        job.ready = asyncio.get_running_loop().create_future()
+        self._wakeup.set()
+        heapq.heappush(self._heap, (priority, next(self._seq), job))
+        try:
+            await job.ready
+        except asyncio.CancelledError:
+            job.cancelled = True
+            raise
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = _api_method(url)
+        if api_method not in SCHEDULED_METHODS or self._dispatcher is None:
+            return await self.inner.do_request(url, method, request_data, **kwargs)
+
+        params = request_data.parameters if request_data else {}
+        chat_id = params.get("chat_id")
+        priority = lane.get()
+        if api_method in CLEANUP_METHODS:
+            priority = max(priority, CLEANUP)
+
+        edit_key = None
+        if api_method in EDIT_METHODS and "message_id" in params:
+            edit_key = (api_method, chat_id, params["message_id"])
+            queued = self._pending_edits.get(edit_key)
+            if queued is not None:
+                # Предыдущая правка еще не ушла - отправим вместо нее эту
+                queued.request_data = request_data
+                self.coalesced += 1
+                if queued.result is None:
+                    queued.result = asyncio.get_running_loop().create_future()
+                return await asyncio.shield(queued.result)
+
+        job = _Job(url, method, request_data, kwargs)
+        if edit_key is not None:
+            self._pending_edits[edit_key] = job
+        started = time.perf_counter()
+        try:
+            if api_method in CHAT_METHODS and chat_id is not None:
+                await self.chat_limiter.acquire(chat_id)
+            result = await self._send(job, api_method, chat_id, priority, edit_key, started)
+        except BaseException as e:
+            if job.result is not None and not job.result.done():
+                if isinstance(e, asyncio.CancelledError):
+                    job.result.cancel()
+                else:
+                    job.result.set_exception(e)
+                    job.result.exception()  # Не логировать "exception was never retrieved"
+            raise
+        finally:
+            if edit_key is not None and self._pending_edits.get(edit_key) is job:
+                del self._pending_edits[edit_key]
+        if job.result is not None:
+            job.result.set_result(result)
+        return result
+
+    async def _send(self, job, api_method, chat_id, priority, edit_key, started):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(job, priority)
+            if attempt == 0 and metrics.enabled:
+                metrics.API_QUEUE_SECONDS.observe((LANE_NAMES[priority],),
+                                                  time.perf_counter() - started)
+            if edit_key is not None and self._pending_edits.get(edit_key) is job:
+                # Ушло в отправку - новые правки встанут в очередь отдельно
+                del self._pending_edits[edit_key]
+            code, payload = await self.inner.do_request(
+                job.url, job.method, job.request_data, **job.kwargs)
+            if code != 429 or attempt == self.max_retries:
+                return code, payload
+
+            retry_after = _retry_after(payload)
+            logger.warning(f"429 на {api_method}, ждем {retry_after} с")
+            self.retried += 1
+            # Telegram просит подождать - не шлем ничего, иначе пауза вырастет
+            self.bucket.pause(retry_after)
+            if chat_id is not None:
+                self.chat_limiter.bucket(chat_id).pause(retry_after)
+        return code, payload
+
+
+def _retry_after(payload):
+    try:
+        return float(json.loads(payload)["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return 1.0
+
+
+def create_request():
+    """Транспорт для Application.builder().request(): как по умолчанию в PTB,
+    через планировщик и с замером времени, если метрики включены."""
+    request = HTTPXRequest(connection_pool_size=256)
+    if metrics.enabled:
+        request = MeteredRequest(request)
+    return ScheduledRequest(request)
@@ -0,0 +1,225 @@
+# broadcast.py
+import asyncio
+import html
+import logging
+import os
+import socket
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from config import (IMAGE_DIR, BROADCAST_RATE, BROADCAST_PER_CHAT_RATE, BROADCAST_BATCH_SIZE,
+                    BROADCAST_MAX_RETRIES, BROADCAST_LEASE, BROADCAST_POLL_INTERVAL)
+from database import (get_news_by_id, get_subscribers_after, claim_broadcast,
+                      save_broadcast_progress, renew_broadcast_lease, save_news_image_file_id,
+                      set_subscription)
+from ratelimit import TokenBucket, KeyedLimiter, retry_after_seconds
+from runtime import run_blocking, read_file
+from cache import render_cache
+from manifest import manifest
+import metrics
+import botapi
+"""Фоновая рассылка новых статей подписчикам"""
+
+logger = logging.getLogger(__name__)
+
+CAPTION_LIMIT = 1024
+MESSAGE_LIMIT = 4096
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _format(news, limit):
+    """Текст для parse_mode="HTML". Лимит Telegram - на видимый текст, поэтому
+    обрезаем до экранирования: сущность вроде &amp; не разрежется."""
+    head = f"📢 {news.title}\n\n"
+    content = _truncate(news.content, max(limit - len(head), 1))
+    return f"📢 <b>{html.escape(news.title)}</b>\n\n{html.escape(content)}"
+
+
+class Broadcaster:
+    """Рассылает новости из очереди broadcasts всем подписчикам.
+
+    Подписчики обходятся пачками по chat_id, после каждой пачки прогресс
+    сохраняется в БД - после перезапуска рассылка продолжится с того же места
+    (получатели недосохраненной пачки могут получить новость повторно).
+    Скорость ограничена общим ведром токенов и ведром на каждый чат;
+    на 429 отправка приостанавливается на retry_after для всех.
+    Изображение загружается один раз, дальше рассылается по file_id.
+
+    Паузы на 429 могут растянуть пачку дольше аренды, поэтому, пока идет
+    рассылка, аренда продлевается отдельной задачей (_keep_lease); если ее
+    все же забрал другой процесс, следующая пачка не начинается.
+    """
+
+    def __init__(self, bot, rate=BROADCAST_RATE, per_chat_rate=BROADCAST_PER_CHAT_RATE,
+                 batch_size=BROADCAST_BATCH_SIZE, max_retries=BROADCAST_MAX_RETRIES,
+                 lease_seconds=BROADCAST_LEASE, owner=None):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.global_bucket = TokenBucket(rate)
+        self.chat_limiter = KeyedLimiter(per_chat_rate, 1)
+        self.retries = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """В очереди появилась рассылка - начинаем, не дожидаясь опроса."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                while await self.run_pending():
+                    pass
+            except Exception as e:
+                logger.error(f"Ошибка рассылки: {e}")
+                metrics.error("broadcast")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), BROADCAST_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_pending(self):
+        """Обрабатываем одну рассылку из очереди. False - очередь пуста."""
+        broadcast = await run_blocking(claim_broadcast, self.owner, self.lease_seconds)
+        if broadcast is None:
+            return False
+        # Запросы рассылки пропускают вперед ответы пользователям (см. botapi)
+        token = botapi.lane.set(botapi.BULK)
+        lease = asyncio.create_task(self._keep_lease(broadcast.id))
+        try:
+            await self.deliver(broadcast, lease)
+        finally:
+            lease.cancel()
+            botapi.lane.reset(token)
+        return True
+
+    async def _keep_lease(self, broadcast_id):
+        """Продлеваем аренду каждую треть ее срока. Завершается, если аренда потеряна."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await run_blocking(renew_broadcast_lease, broadcast_id, self.owner,
+                                             self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Не удалось продлить аренду рассылки {broadcast_id}: {e}")
+                metrics.error("broadcast")
+                return
+            if not renewed:
+                logger.warning(f"Рассылку {broadcast_id} забрал другой процесс")
+                return
+
+    async def deliver(self, broadcast, lease=None):
+        """Рассылаем новость с сохраненного места. lease - задача _keep_lease:
+        если она завершилась, аренда могла перейти к другому процессу."""
+        news = await run_blocking(get_news_by_id, broadcast.news_id)
+        if news is None:
+            # Новость удалили до рассылки
+            await run_blocking(save_broadcast_progress, broadcast, self.owner,
+                               self.lease_seconds, True)
+            return
+
+        markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("📰 Открыть", callback_data=f"news_item:{news.id}")
+        ]])
+
+        image_file = os.path.join(IMAGE_DIR, news.image_path) if news.image_path else None
+        fingerprint = manifest.fingerprint(image_file) if image_file else None
+        photo_data = None
+        if fingerprint:
+            text = _format(news, CAPTION_LIMIT)
+            if broadcast.photo_file_id is None and news.image_fingerprint == fingerprint:
+                broadcast = broadcast._replace(photo_file_id=news.image_file_id)
+            if broadcast.photo_file_id is None:
+                photo_data = await run_blocking(read_file, image_file)
+        else:
+            text = _format(news, MESSAGE_LIMIT)
+
+        logger.info(f"Рассылка {broadcast.id} (новость {news.id}) с chat_id > {broadcast.last_chat_id}")
+        while True:
+            if lease is not None and lease.done():
+                # Продолжит владелец аренды с сохраненного места
+                return
+            chat_ids = await run_blocking(get_subscribers_after, broadcast.last_chat_id,
+                                          self.batch_size)
+            if not chat_ids:
+                break
+
+            sent = failed = 0
+            rest = chat_ids
+            # Пока нет file_id, отправляем по одному: первая удачная загрузка даст его
+            while fingerprint and broadcast.photo_file_id is None and rest:
+                message = await self._send(rest[0], text, markup, photo_data)
+                rest = rest[1:]
+                if message:
+                    sent += 1
+                    file_id = message.photo[-1].file_id
+                    broadcast = broadcast._replace(photo_file_id=file_id)
+                    await run_blocking(save_news_image_file_id, news.id, file_id, fingerprint)
+                    render_cache.discard("news", ("detail", news.id))
+                else:
+                    failed += 1
+
+            photo = broadcast.photo_file_id if fingerprint else None
+            results = await asyncio.gather(
+                *(self._send(chat_id, text, markup, photo) for chat_id in rest))
+            sent += sum(1 for r in results if r)
+            failed += sum(1 for r in results if not r)
+
+            broadcast = broadcast._replace(
+                last_chat_id=chat_ids[-1],
+                sent=broadcast.sent + sent,
+                failed=broadcast.failed + failed,
+            )
+            await run_blocking(save_broadcast_progress, broadcast, self.owner, self.lease_seconds)
+
+        await run_blocking(save_broadcast_progress, broadcast, self.owner,
+                           self.lease_seconds, True)
+        logger.info(f"Рассылка {broadcast.id} завершена: "
+                    f"доставлено {broadcast.sent}, ошибок {broadcast.failed}")
+
+    async def _send(self, chat_id, text, markup, photo):
+        """Отправляем одно сообщение с повторами. Возвращает Message или None."""
+        for attempt in range(self.max_retries):
+            await self.global_bucket.acquire()
+            await self.chat_limiter.acquire(chat_id)
+            try:
+                if photo is not None:
+                    return await self.bot.send_photo(chat_id=chat_id, photo=photo, caption=text,
+                                                     parse_mode="HTML", reply_markup=markup)
+                return await self.bot.send_message(chat_id=chat_id, text=text,
+                                                   parse_mode="HTML", reply_markup=markup)
+            except RetryAfter as e:
+                # Лимит превышен: останавливаем всю рассылку, а не только этот чат
+                self.retries += 1
+                self.global_bucket.pause(retry_after_seconds(e))
+            except Forbidden:
+                # Пользователь заблокировал бота - больше не пишем ему
+                await run_blocking(set_subscription, chat_id, False)
+                return None
+            except BadRequest as e:
+                logger.warning(f"Рассылка в чат {chat_id} не удалась: {e}")
+                return None
+            except NetworkError:
+                self.retries += 1
+                await asyncio.sleep(min(2 ** attempt, 30))
+        logger.warning(f"Рассылка в чат {chat_id}: исчерпаны попытки")
+        return None
@@ -0,0 +1,115 @@
+# bundles.py
+import asyncio
+import hashlib
+import logging
+import os
+import zipfile
+from config import BUNDLE_DIR, BUNDLE_MAX_SIZE
+from database import Bundle, get_bundle_sources, get_bundle, save_bundle
+from runtime import run_blocking
+from manifest import manifest
+"""ZIP-архивы "Скачать все" для типа документов.
+
+Ключ архива - sha256 от названий и хэшей содержимого входящих в него
+файлов (хэши берутся из manifest; пока он не готов - размер и mtime). Пока ни один
+документ типа не изменился, ключ тот же: архив берется с диска или, после
+первой отправки, отправляется по file_id. Архив пишется в файл по одной
+записи, файлы документов читаются с диска частями - целиком в памяти он не
+собирается. Уже сжатые форматы (.docx, .xlsx, .pdf) кладутся без сжатия.
+"""
+
+logger = logging.getLogger(__name__)
+
+STORED_EXTENSIONS = (".docx", ".xlsx", ".pdf", ".odt", ".zip")
+
+_tasks = {}  # тип -> задача prepare(), чтобы два нажатия не собирали один архив
+
+
+class BundleTooLarge(Exception):
+    pass
+
+
+def plan(doc_type):
+    """Состав архива (блокирующий вызов): (ключ, [(путь, имя в архиве)], размер)"""
+    entries = []
+    digest = hashlib.sha256()
+    names = set()
+    total = 0
+    for _, name, file_path in get_bundle_sources(doc_type):
+        entry = manifest.get(file_path)
+        if entry is None:
+            # Файл вне списка или список еще не готов - смотрим на диск
+            try:
+                st = os.stat(file_path)
+            except FileNotFoundError:
+                continue  # Файла нет - в архив не попадет
+            size, content = st.st_size, f"{st.st_size}:{st.st_mtime_ns}"
+        else:
+            size, content = entry.size, entry.hash or entry.fingerprint
+        base, ext = name, os.path.splitext(file_path)[1]
+        arcname = f"{base}{ext}"
+        number = 1
+        while arcname.lower() in names:
+            number += 1
+            arcname = f"{base} ({number}){ext}"
+        names.add(arcname.lower())
+        entries.append((file_path, arcname))
+        total += size
+        digest.update(f"{arcname}\t{content}\n".encode())
+    return digest.hexdigest(), entries, total
+
+
+def build(doc_type, key, entries):
+    """Пишем архив во временный файл и переименовываем (блокирующий вызов)"""
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    path = os.path.join(BUNDLE_DIR, f"{doc_type}-{key[:16]}.zip")
+    tmp_path = path + ".tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for file_path, arcname in entries:
+                method = (zipfile.ZIP_STORED if file_path.lower().endswith(STORED_EXTENSIONS)
+                          else zipfile.ZIP_DEFLATED)
+                archive.write(file_path, arcname, compress_type=method)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    bundle = Bundle(key, doc_type, path, os.path.getsize(path), None)
+    for old_path in save_bundle(bundle):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+    logger.info(f"Архив {path}: {len(entries)} файлов, {bundle.size} байт")
+    return bundle
+
+
+def prepare(doc_type):
+    """Актуальный архив типа (блокирующий вызов): из базы или собранный заново.
+
+    None - документов нет; BundleTooLarge - архив не отправить.
+    """
+    key, entries, total = plan(doc_type)
+    if not entries:
+        return None
+    bundle = get_bundle(key)
+    if bundle is not None and (bundle.file_id or os.path.exists(bundle.path)):
+        return bundle
+    if total > BUNDLE_MAX_SIZE:
+        raise BundleTooLarge(total)
+    return build(doc_type, key, entries)
+
+
+async def get(doc_type):
+    """prepare() в пуле потоков; одновременные запросы ждут одну сборку"""
+    task = _tasks.get(doc_type)
+    if task is None:
+        task = asyncio.ensure_future(run_blocking(prepare, doc_type))
+        _tasks[doc_type] = task
+        task.add_done_callback(lambda _: _tasks.pop(doc_type, None))
+    return await asyncio.shield(task)
@@ -0,0 +1,156 @@
+# cache.py
+import time
+from collections import OrderedDict, defaultdict
+from config import (RENDER_CACHE_SIZE, RENDER_CACHE_SYNC_INTERVAL, INLINE_CACHE_SIZE,
+                    INLINE_CACHE_TTL)
+from database import get_data_versions
+from runtime import run_blocking
+"""Кэш готовых экранов бота с инвалидацией по версии"""
+
+
+class RenderCache:
+    """LRU-кэш отрисованных экранов (текст, клавиатура и т.п.).
+
+    Записи разбиты по пространствам имен ("news", "docs"). У каждого
+    пространства есть счетчик версии: запись, сохраненная при старой версии,
+    считается устаревшей. Поэтому после изменения данных достаточно
+    вызвать bump() - перебирать ключи не нужно.
+
+    Версия - пара (счетчик из data_versions, счетчик процесса). Первый
+    поднимают триггеры базы при любой правке, в том числе из другого
+    процесса; sync_versions() перечитывает его не чаще sync_interval.
+    Второй поднимает bump() - свои правки видны сразу.
+    """
+
+    def __init__(self, max_entries=RENDER_CACHE_SIZE, sync_interval=RENDER_CACHE_SYNC_INTERVAL):
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self.synced_at = None
+        self._entries = OrderedDict()  # (namespace, key) -> (version, value)
+        self._versions = defaultdict(int)
+        self._shared = {}  # namespace -> версия из data_versions
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace, key):
+        """Возвращает значение или None, если записи нет или она устарела."""
+        entry = self._entries.get((namespace, key))
+        if entry is None or entry[0] != self.version(namespace):
+            if entry is not None:
+                del self._entries[(namespace, key)]
+            self.misses += 1
+            return None
+        self._entries.move_to_end((namespace, key))
+        self.hits += 1
+        return entry[1]
+
+    def version(self, namespace):
+        return self._shared.get(namespace, 0), self._versions[namespace]
+
+    def sync(self, shared):
+        """Версии из базы: name -> version"""
+        self._shared = shared
+
+    def put(self, namespace, key, value, version=None):
+        """Сохраняем значение. version - версия, при которой читались данные:
+        если ее успели поднять, запись сразу окажется устаревшей."""
+        if version is None:
+            version = self.version(namespace)
+        self._entries[(namespace, key)] = (version, value)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, namespace, key):
+        """Удаляем одну запись (например, когда у новости появился file_id)."""
+        self._entries.pop((namespace, key), None)
+
+    def bump(self, namespace):
+        """Инвалидируем все записи пространства имен после изменения данных."""
+        self._versions[namespace] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+render_cache = RenderCache()
+
+
+async def sync_versions(cache=render_cache):
+    """Сверяем версии кэша с базой, если с прошлой сверки прошло sync_interval"""
+    now = time.monotonic()
+    if cache.synced_at is not None and now - cache.synced_at < cache.sync_interval:
+        return
+    cache.synced_at = now  # До запроса: одновременные обработчики не сверяют повторно
+    cache.sync(await run_blocking(get_data_versions))
+
+
+async def cached_view(namespace, key, render, *args):
+    """Берем экран из кэша или строим его функцией render в пуле потоков."""
+    await sync_versions()
+    view = render_cache.get(namespace, key)
+    if view is None:
+        version = render_cache.version(namespace)
+        view = await run_blocking(render, *args)
+        render_cache.put(namespace, key, view, version)
+    return view
+
+
+class QueryCache:
+    """LRU-кэш ответов на запросы, которые набираются по буквам (inline-режим).
+
+    Ключ - нормализованный текст запроса. Запись живет не дольше ttl секунд
+    и устаревает вместе с версиями пространств render_cache (после
+    bump("news") или bump("docs") и правок в базе, см. sync_versions). find() ищет самый длинный закэшированный
+    префикс запроса: если тот ответ был полным, результаты допечатанного
+    запроса - его подмножество.
+    """
+
+    def __init__(self, max_entries=INLINE_CACHE_SIZE, ttl=INLINE_CACHE_TTL,
+                 namespaces=("news", "docs"), cache=render_cache):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespaces = namespaces
+        self.cache = cache
+        self._entries = OrderedDict()  # запрос -> (версии, время, значение)
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    def versions(self):
+        """Версии данных, при которых строится ответ (передать в put)"""
+        return tuple(self.cache.version(namespace) for namespace in self.namespaces)
+
+    def _get(self, query, versions, now):
+        entry = self._entries.get(query)
+        if entry is None:
+            return None
+        if entry[0] != versions or now - entry[1] > self.ttl:
+            del self._entries[query]
+            return None
+        self._entries.move_to_end(query)
+        return entry[2]
+
+    def find(self, query):
+        """(найденный запрос, значение) - сам запрос или самый длинный его
+        префикс из кэша; (None, None), если ничего нет."""
+        versions, now = self.versions(), time.monotonic()
+        for end in range(len(query), -1, -1):
+            value = self._get(query[:end], versions, now)
+            if value is not None:
+                if end == len(query):
+                    self.hits += 1
+                else:
+                    self.prefix_hits += 1
+                return query[:end], value
+        self.misses += 1
+        return None, None
+
+    def put(self, query, value, versions):
+        self._entries[query] = (versions, time.monotonic(), value)
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -6,5 +6,127 @@ DB_PATH = os.path.join("news_images", "bot.db")  # Имя файла базы д
 IMAGE_DIR = "news_images"  # Папка для хранения изображений
 ADMIN_ID = 774229520
 
+NEWS_PAGE_SIZE = 8  # Сколько новостей показывать на одной странице меню
+DOCS_PAGE_SIZE = 10  # Сколько документов показывать на одной странице списка
+SEARCH_PAGE_SIZE = 8  # Сколько результатов поиска на одной странице
+SEARCH_RANK_LIMIT = 2000  # Если совпадений больше, сортируем по свежести, а не по bm25
+
 # States для ConversationHandler
-WAIT_IMAGE, WAIT_TITLE, WAIT_CONTENT = range(3)
\ No newline at end of file
+WAIT_IMAGE, WAIT_TITLE, WAIT_CONTENT, WAIT_PUBLISH = range(4)
+
+# Настройки подключения к SQLite
+DB_TIMEOUT = 5.0  # Сколько ждать блокировку записи, сек.
+DB_CACHED_STATEMENTS = 256  # Размер кэша подготовленных запросов на соединение
+
+# Импорт документов (python import_docs.py)
+DOCS_DIR = "docs"  # Каталог с бланками по умолчанию
+DOC_EXTENSIONS = (".docx", ".doc", ".pdf", ".xlsx", ".xls", ".odt", ".rtf")
+# Тип документа по имени папки или файла: первое совпадение по подстроке
+DOC_TYPE_RULES = (
+    ("application", ("заявлен", "application")),
+    ("template", ("шаблон", "template", "договор", "бланк")),
+)
+IMPORT_BATCH_SIZE = 500  # Файлов в одной транзакции
+IMPORT_WORKERS = None  # Процессы для хэширования (None - по числу ядер)
+
+# ZIP-архивы "Скачать все" по типам документов
+BUNDLE_DIR = "bundles"  # Где хранить собранные архивы
+BUNDLE_MAX_SIZE = 50 * 1024 * 1024  # Лимит Telegram на отправку файла ботом, байт
+
+# Текст документов: превью в списках и поиск по содержимому
+DOC_INDEX_WORKERS = 2  # Процессы для разбора .docx
+DOC_INDEX_INTERVAL = 300  # Как часто проверять, не изменились ли файлы, сек.
+DOC_INDEX_BATCH = 50  # Документов в одной транзакции
+DOC_TEXT_MAX_CHARS = 200_000  # Сколько текста документа хранить и индексировать
+DOC_PREVIEW_LENGTH = 100  # Длина превью в списке документов
+DOC_SEARCH_LIMIT = 10  # Сколько документов показывать в результатах поиска
+
+# Справочник контактов (в памяти, см. contacts.py)
+CONTACTS_PAGE_SIZE = 10  # Контактов на странице списка и результатов поиска
+CONTACTS_REFRESH_INTERVAL = 30  # Как часто проверять, не изменилась ли таблица, сек.
+
+# Список файлов на диске (IMAGE_DIR, DOCS_DIR и каталоги документов из базы)
+MANIFEST_WORKERS = 4  # Потоки для обхода каталогов и хэширования
+MANIFEST_RESCAN_INTERVAL = 60  # Как часто пересматривать каталоги, сек.
+
+# Асинхронный рантайм
+MAX_CONCURRENT_UPDATES = 64  # Сколько обновлений обрабатывается одновременно
+BLOCKING_WORKERS = 8  # Потоки для блокирующей работы (SQLite, файлы)
+
+# Состояние диалогов (user_data вместе с шагом диалога, dialogs.py) хранится в базе
+# True - несколько процессов бота на одной базе (например, за балансировщиком
+# в режиме webhook): состояние пользователя читается перед каждым обновлением
+STATE_SHARED = False
+STATE_LOCK_LEASE = 30  # Секунд аренды пользователя процессом (дольше - процесс упал)
+STATE_LOCK_POLL = 0.05  # Как часто проверять, не освободил ли пользователя другой процесс, сек.
+
+# Кэш отрисованных экранов (текст + клавиатура)
+RENDER_CACHE_SIZE = 512  # Максимум записей, старые вытесняются (LRU)
+# Как часто сверять версии с базой (правки других процессов бота и импорта), сек.
+RENDER_CACHE_SYNC_INTERVAL = 1.0
+
+# Inline-режим (@бот текст): новости и документы в любом чате
+INLINE_PAGE_SIZE = 20  # Результатов в одном ответе (Telegram принимает до 50)
+INLINE_MAX_RESULTS = 100  # Сколько новостей и документов искать на один запрос
+INLINE_MIN_QUERY = 2  # Запрос короче - показываем свежие новости (1 буква совпадет почти везде)
+INLINE_CACHE_SIZE = 1024  # Ответов в кэше бота
+INLINE_CACHE_TTL = 300  # Сколько хранить ответ в кэше бота, сек.
+INLINE_CACHE_TIME = 30  # Сколько Telegram может отдавать наш ответ без запроса к боту, сек.
+
+# Статистика использования (/stats)
+STATS_FLUSH_INTERVAL = 5  # Как часто записывать накопленные счетчики в базу, сек.
+STATS_TOP = 5  # Сколько новостей, документов и меню показывать в отчете
+
+# Отложенная публикация новостей (publisher.py)
+PUBLISH_TIME_FORMAT = "%d.%m.%Y %H:%M"  # Как админ вводит время публикации
+# При STATE_SHARED новость может запланировать другой процесс: раз в столько
+# секунд очередь перечитывается из базы (в одном процессе - не нужно)
+PUBLISH_RESYNC_INTERVAL = 60
+
+# Архив новостей и очистка файлов (retention.py)
+# Новости старше стольких дней переносятся в news_archive; None - не переносить (по умолчанию)
+RETENTION_DAYS = None
+RETENTION_INTERVAL = 3600  # Как часто запускать очистку, сек.
+RETENTION_BATCH = 200  # Новостей или файлов за один шаг (одна короткая транзакция)
+RETENTION_PAUSE = 0.1  # Пауза между шагами, чтобы не занимать запись надолго, сек.
+# Изображения без ссылок моложе этого не удаляются: это могут быть черновики диалога
+IMAGE_GC_GRACE = 7 * 24 * 3600
+VACUUM_PAGES = 256  # Страниц за один шаг PRAGMA incremental_vacuum
+
+# Рассылка новостей подписчикам
+BROADCAST_RATE = 25  # Сообщений в секунду всего (лимит Telegram ~30)
+BROADCAST_PER_CHAT_RATE = 1  # Сообщений в секунду в один чат
+BROADCAST_BATCH_SIZE = 100  # Подписчиков в пачке; прогресс сохраняется после каждой
+BROADCAST_MAX_RETRIES = 5  # Попыток на одного получателя
+BROADCAST_LEASE = 60  # Секунд аренды рассылки одним процессом
+BROADCAST_POLL_INTERVAL = 60  # Как часто проверять очередь без явного сигнала, сек.
+
+# Обработка загружаемых изображений
+IMAGE_WORKERS = 2  # Потоки для хэширования, записи и превью
+IMAGE_PREVIEW_SIZE = 320  # Длинная сторона превью, px
+
+# Получение обновлений: "polling" или "webhook" (бот за обратным прокси)
+BOT_MODE = "polling"
+WEBHOOK_LISTEN = "127.0.0.1"  # Адрес встроенного HTTP-сервера (прокси рядом)
+WEBHOOK_PORT = 8080
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_URL = ""  # Публичный адрес прокси для setWebhook; пусто - не регистрировать
+WEBHOOK_SECRET = ""  # Заголовок X-Telegram-Bot-Api-Secret-Token, обязателен для webhook
+WEBHOOK_MAX_CONNECTIONS = 40  # Параллельных соединений от Telegram
+WEBHOOK_MAX_PENDING = 256  # Обновлений в работе, дальше запросы ждут места
+WEBHOOK_ENQUEUE_TIMEOUT = 10  # Сколько ждать места, потом 503, сек.
+WEBHOOK_MAX_BODY = 1024 * 1024  # Максимальный размер запроса, байт
+WEBHOOK_IDLE_TIMEOUT = 75  # Закрываем простаивающее keep-alive соединение, сек.
+WEBHOOK_DRAIN_TIMEOUT = 10  # Сколько ждать текущие запросы при остановке, сек.
+
+# Метрики Prometheus (http://METRICS_LISTEN:METRICS_PORT/metrics)
+METRICS_ENABLED = False
+METRICS_LISTEN = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Планировщик исходящих запросов к Bot API
+BOTAPI_RATE = 30  # Запросов в секунду всего (лимит Telegram ~30)
+BOTAPI_BURST = 30  # Сколько можно отправить подряд после простоя
+BOTAPI_PER_CHAT_RATE = 1  # Сообщений в секунду в один чат
+BOTAPI_PER_CHAT_BURST = 3  # Короткая серия сообщений в чат без ожидания
+BOTAPI_MAX_RETRIES = 3  # Повторов после 429, потом ошибка уходит обработчику
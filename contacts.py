@@ -0,0 +1,153 @@
+# contacts.py
+import asyncio
+import bisect
+import logging
+import re
+import time
+from config import CONTACTS_REFRESH_INTERVAL
+from database import get_contacts, get_contacts_version
+from runtime import run_blocking
+import metrics
+"""Справочник контактов в памяти: листание по алфавиту и поиск по началу
+названия отдела, телефона или email.
+
+Таблица contacts читается целиком при первом обращении. Дальше раз в
+CONTACTS_REFRESH_INTERVAL проверяется счетчик изменений (data_versions,
+обновляется триггерами), и таблица перечитывается, только если он вырос.
+Обработчики работают с готовым индексом - без запросов к базе.
+"""
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+_LAST = "\U0010ffff"  # Больше любого символа: верхняя граница диапазона префикса
+
+
+def _contact_keys(contact):
+    """Ключи поиска контакта: слова и название отдела, хвосты номера, части email"""
+    department = contact.department.casefold()
+    keys = {department}
+    keys.update(_WORD.findall(department))
+    # "+375 (17) 123-45-67": находится по 375..., 17..., 123..., 4567 и т.д.
+    groups = _DIGITS.findall(contact.phone)
+    keys.update("".join(groups[i:]) for i in range(len(groups)))
+    if contact.email:
+        email = contact.email.casefold()
+        keys.add(email)
+        keys.update(part for part in re.split(r"[@.]", email) if part)
+    return keys
+
+
+def normalize_query(text):
+    """Слова запроса в виде ключей индекса. Номер телефона - одни цифры:
+    "123-45" и "12345" ищут одно и то же."""
+    text = text.casefold().strip()
+    if not text:
+        return ()
+    if not any(char.isalpha() for char in text):
+        digits = "".join(_DIGITS.findall(text))
+        return (digits,) if digits else ()
+    return tuple(sorted(set(_WORD.findall(text))))
+
+
+class ContactIndex:
+    """Снимок справочника: контакты по алфавиту и отсортированные ключи.
+
+    Не меняется после создания - обновление подменяет весь снимок.
+    """
+
+    def __init__(self, contacts, version):
+        self.version = version
+        self.contacts = sorted(contacts, key=lambda contact: (contact.department.casefold(),
+                                                              contact.id))
+        pairs = sorted((key, position) for position, contact in enumerate(self.contacts)
+                       for key in _contact_keys(contact))
+        self._keys = [key for key, _ in pairs]
+        self._positions = [position for _, position in pairs]
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def _prefix(self, prefix):
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + _LAST, start)
+        return set(self._positions[start:end])
+
+    def page(self, page, page_size):
+        """Страница списка: (контакты, есть ли следующая)"""
+        start = page * page_size
+        return self.contacts[start:start + page_size], start + page_size < len(self.contacts)
+
+    def search(self, words):
+        """Контакты, у которых каждое слово запроса - начало какого-то ключа"""
+        positions = None
+        for word in words:
+            found = self._prefix(word)
+            positions = found if positions is None else positions & found
+            if not positions:
+                return []
+        return [self.contacts[position] for position in sorted(positions or ())]
+
+
+def load():
+    """Читаем таблицу и строим индекс (блокирующий вызов)"""
+    # Версию - до чтения: правка между запросами вызовет лишнее обновление, но не потеряется
+    version = get_contacts_version()
+    return ContactIndex(get_contacts(), version)
+
+
+class ContactDirectory:
+    """Текущий снимок справочника и его фоновое обновление."""
+
+    def __init__(self, interval=CONTACTS_REFRESH_INTERVAL):
+        self.interval = interval
+        self.loaded_at = None
+        self._index = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def get(self):
+        """Текущий снимок; при первом обращении - загрузка из базы"""
+        if self._index is None:
+            async with self._lock:
+                if self._index is None:
+                    await self.refresh(force=True)
+        return self._index
+
+    async def refresh(self, force=False):
+        """Перечитываем контакты, если они изменились. True - снимок обновлен."""
+        if not force and self._index is not None:
+            version = await run_blocking(get_contacts_version)
+            if version == self._index.version:
+                return False
+        started = time.perf_counter()
+        self._index = await run_blocking(load)
+        self.loaded_at = time.time()
+        logger.info(f"Контакты: {len(self._index)}, индекс построен за "
+                    f"{time.perf_counter() - started:.3f} с")
+        return True
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка обновления контактов: {e}")
+                metrics.error("contacts")
+            await asyncio.sleep(self.interval)
+
+
+directory = ContactDirectory()
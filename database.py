@@ -1,62 +1,1015 @@
 # database.py
 import sqlite3
 import os
-from config import DB_PATH, IMAGE_DIR
-"""Инициализация базы данных"""
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from config import (DB_PATH, IMAGE_DIR, DB_TIMEOUT, DB_CACHED_STATEMENTS, NEWS_PAGE_SIZE,
+                    DOCS_PAGE_SIZE, SEARCH_PAGE_SIZE, SEARCH_RANK_LIMIT, DOC_SEARCH_LIMIT)
+import metrics
+import migrations
+"""Инициализация базы данных и общий слой доступа к ней"""
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-def init_db():
-    """Создаем таблицы в базе данных."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+logger = logging.getLogger(__name__)
 
-    # Очищаем и заполняем таблицу новостей
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS news (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        content TEXT NOT NULL,
-        image_path TEXT,
-        date TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
-        )
-    ''')
-
-    # Таблица документов
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        type TEXT NOT NULL,
-        file_path TEXT NOT NULL
+
+# --- Типизированные строки ---
+class News(NamedTuple):
+    id: int
+    title: str
+    content: str
+    image_path: Optional[str]
+    date: str
+    image_file_id: Optional[str] = None  # file_id Telegram после первой отправки
+    image_fingerprint: Optional[str] = None  # Отпечаток файла, для которого выдан file_id
+    image_preview: Optional[str] = None  # Уменьшенная копия для списков
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    image_size: Optional[int] = None
+
+
+class StoredImage(NamedTuple):
+    """Изображение в хранилище: файл назван по хэшу содержимого."""
+    path: str  # Относительно IMAGE_DIR
+    hash: str
+    preview_path: Optional[str]  # Уменьшенная копия для списков
+    width: Optional[int]
+    height: Optional[int]
+    size: int
+    file_id: Optional[str] = None  # file_id Telegram, если он уже известен
+    fingerprint: Optional[str] = None
+
+
+class NewsListItem(NamedTuple):
+    """Облегченная строка для меню: без текста новости, дата уже отформатирована."""
+    id: int
+    title: str
+    date_label: str
+
+
+class NewsPage(NamedTuple):
+    items: list
+    prev_id: Optional[int]  # Якорь для перехода к более свежим новостям
+    next_id: Optional[int]  # Якорь для перехода к более старым новостям
+
+
+class Document(NamedTuple):
+    id: int
+    name: str
+    type: str
+    file_path: str
+    file_id: Optional[str] = None
+    file_fingerprint: Optional[str] = None
+    preview: Optional[str] = None  # Начало текста документа (для .docx)
+
+
+class DocumentPage(NamedTuple):
+    items: list
+    prev_id: Optional[int]  # Якорь для перехода к предыдущей странице
+    next_id: Optional[int]  # Якорь для перехода к следующей странице
+
+
+class DocumentHit(NamedTuple):
+    """Документ, найденный по содержимому, с фрагментом вокруг совпадения."""
+    id: int
+    name: str
+    snippet: str
+
+
+class Contact(NamedTuple):
+    id: int
+    department: str
+    phone: str
+    email: Optional[str]
+
+
+class Broadcast(NamedTuple):
+    id: int
+    news_id: int
+    last_chat_id: Optional[int]  # Рассылка дошла до подписчиков с chat_id <= last_chat_id
+    sent: int
+    failed: int
+    photo_file_id: Optional[str]
+
+
+# --- Пул соединений: одно соединение на поток ---
+_db_path = DB_PATH
+_local = threading.local()
+_connections = []  # Все открытые соединения, чтобы закрыть их при выходе
+_connections_lock = threading.Lock()
+# Поколение пула: close_all() его увеличивает, и соединения, закэшированные
+# в других потоках (run_blocking, пулы images и manifest), открываются заново
+_generation = 0
+_trace = None  # callback(sql) для каждого запроса, см. set_trace()
+
+
+class _TimedConnection(sqlite3.Connection):
+    """Соединение, которое пишет время запросов в metrics (если метрики включены).
+
+    Замеряется execute() - для запросов, результат которых сразу читается
+    целиком, это время всего запроса.
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.SQL_SECONDS.observe((metrics.statement_label(sql),), time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            metrics.SQL_SECONDS.observe((metrics.statement_label(sql),), time.perf_counter() - start)
+
+
+def _connect():
+    """Открываем соединение и настраиваем его один раз."""
+    # check_same_thread=False нужен только для close_all():
+    # в остальном соединение используется лишь своим потоком
+    conn = sqlite3.connect(
+        _db_path,
+        timeout=DB_TIMEOUT,
+        cached_statements=DB_CACHED_STATEMENTS,
+        check_same_thread=False,
+        factory=_TimedConnection if metrics.enabled else sqlite3.Connection,
     )
-    ''')
-
-    # Таблица новостей
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS news (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        content TEXT NOT NULL,
-        date TEXT DEFAULT (datetime('now', 'localtime'))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if _trace is not None:
+        conn.set_trace_callback(_trace)
+    return conn
+
+
+def get_connection():
+    """Возвращает соединение текущего потока (создает при первом вызове)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        # Поколение - до открытия: configure() меняет путь раньше, чем поколение
+        generation = _generation
+        conn = _connect()
+        with _connections_lock:
+            _connections.append(conn)
+        _local.conn, _local.generation = conn, generation
+    return conn
+
+
+def close_all():
+    """Закрываем все соединения пула."""
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        for conn in _connections:
+            try:
+                # Обновляет статистику индексов, если SQLite сочтет нужным (обычно мгновенно)
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+            conn.close()
+        _connections.clear()
+    _local.__dict__.clear()
+
+
+def set_trace(callback):
+    """Вызывать callback(sql) на каждый запрос во всех соединениях пула
+    (None - отключить). Для подсчета запросов в бенчмарках."""
+    global _trace
+    _trace = callback
+    with _connections_lock:
+        for conn in _connections:
+            conn.set_trace_callback(callback)
+
+
+def configure(db_path):
+    """Переключаем пул на другой файл БД (для бенчмарков и отладки)."""
+    global _db_path
+    _db_path = db_path
+    close_all()
+
+
+def file_fingerprint(path):
+    """Отпечаток файла на диске (размер + mtime) или None, если файла нет."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _fetch_all(sql, params, row_type):
+    rows = get_connection().execute(sql, params).fetchall()
+    return [row_type(*row) for row in rows]
+
+
+def _fetch_one(sql, params, row_type):
+    row = get_connection().execute(sql, params).fetchone()
+    return row_type(*row) if row else None
+
+
+# --- Новости ---
+def get_all_news():
+    """Получаем все новости из БД"""
+    try:
+        return _fetch_all(
+            "SELECT id, title, content, image_path, date FROM news WHERE publish_at IS NULL "
+            "ORDER BY date DESC, id DESC",
+            (), News)
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка получения новостей: {str(e)}")
+        return []
+
+
+_NEWS_LIST_COLUMNS = "id, title, COALESCE(strftime('%d.%m.%Y', date), date)"
+
+
+def get_news_page(before_id=None, after_id=None, limit=NEWS_PAGE_SIZE):
+    """Страница меню новостей (keyset-пагинация по индексу (date, id)).
+
+    Запланированные новости не показываются: условие publish_at IS NULL
+    совпадает с условием частичного индекса idx_news_published.
+
+    before_id - показать новости старше указанной, after_id - новее.
+    Без якоря возвращается первая (самая свежая) страница.
+    """
+    if after_id is not None:
+        rows = _fetch_all(
+            f"SELECT {_NEWS_LIST_COLUMNS} FROM news WHERE publish_at IS NULL "
+            "AND (date, id) > (SELECT date, id FROM news WHERE id = ?) "
+            "ORDER BY date ASC, id ASC LIMIT ?",
+            (after_id, limit + 1), NewsListItem)
+        has_newer = len(rows) > limit
+        items = rows[:limit][::-1]
+        has_older = True
+    else:
+        if before_id is not None:
+            rows = _fetch_all(
+                f"SELECT {_NEWS_LIST_COLUMNS} FROM news WHERE publish_at IS NULL "
+                "AND (date, id) < (SELECT date, id FROM news WHERE id = ?) "
+                "ORDER BY date DESC, id DESC LIMIT ?",
+                (before_id, limit + 1), NewsListItem)
+        else:
+            rows = _fetch_all(
+                f"SELECT {_NEWS_LIST_COLUMNS} FROM news WHERE publish_at IS NULL "
+                "ORDER BY date DESC, id DESC LIMIT ?",
+                (limit + 1,), NewsListItem)
+        has_older = len(rows) > limit
+        items = rows[:limit]
+        has_newer = before_id is not None
+
+    if not items:
+        return NewsPage([], None, None)
+    return NewsPage(
+        items,
+        items[0].id if has_newer else None,
+        items[-1].id if has_older else None,
     )
-    ''')
-
-    # Таблица контактов
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS contacts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        department TEXT NOT NULL,
-        phone TEXT NOT NULL,
-        email TEXT
+
+
+def fts_query(text):
+    """Превращаем текст пользователя в безопасный запрос FTS5.
+
+    Каждое слово берется в кавычки (операторы FTS5 не срабатывают),
+    последнее слово ищется по префиксу - пользователь мог не допечатать его.
+    Возвращает None, если слов нет.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _news_search_order(conn, match):
+    """Запрос FTS и порядок результатов для search_news.
+
+    bm25 приходится считать для каждого совпадения, поэтому для неизбирательных
+    запросов (больше SEARCH_RANK_LIMIT совпадений) результаты идут от свежих
+    к старым: FTS5 отдает их в порядке rowid и останавливается на LIMIT.
+    Префиксный поиск FTS5 читает списки документов целиком, поэтому если слово
+    и без префикса встречается очень часто, ищем его точно.
+    """
+    def count_matches(expr):
+        return conn.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM news_fts WHERE news_fts MATCH ? LIMIT ?)",
+            (expr, SEARCH_RANK_LIMIT + 1)).fetchone()[0]
+
+    exact = match[:-1] if match.endswith("*") else match
+    if exact != match and count_matches(exact) > SEARCH_RANK_LIMIT:
+        return exact, "rowid DESC"
+    return match, "rank" if count_matches(match) <= SEARCH_RANK_LIMIT else "rowid DESC"
+
+
+# Запланированные новости исключаем до LIMIT, по индексу idx_news_scheduled
+_NOT_SCHEDULED = "rowid NOT IN (SELECT id FROM news WHERE publish_at IS NOT NULL)"
+
+
+def search_news(match, page=0, limit=SEARCH_PAGE_SIZE):
+    """Полнотекстовый поиск по заголовку и тексту, лучшие совпадения первыми.
+
+    match - запрос, подготовленный fts_query(). Возвращает (строки, есть_еще).
+    """
+    match, order = _news_search_order(get_connection(), match)
+    # Сначала выбираем лучшие rowid только по индексу FTS (веса bm25
+    # заданы в init_db), и лишь для них читаем строки news
+    rows = _fetch_all(
+        "SELECT n.id, n.title, COALESCE(strftime('%d.%m.%Y', n.date), n.date) "
+        f"FROM (SELECT rowid, rank FROM news_fts WHERE news_fts MATCH ? AND {_NOT_SCHEDULED} "
+        f"      ORDER BY {order} LIMIT ? OFFSET ?) AS hit "
+        "JOIN news AS n ON n.id = hit.rowid "
+        f"ORDER BY hit.{order}",
+        (match, limit + 1, page * limit), NewsListItem)
+    return rows[:limit], len(rows) > limit
+
+
+_NEWS_COLUMNS = ("id, title, content, image_path, date, image_file_id, image_fingerprint, "
+                 "image_preview, image_width, image_height, image_size")
+
+
+def search_news_full(match, limit):
+    """Как search_news, но целые новости (для inline-режима), не больше limit"""
+    match, order = _news_search_order(get_connection(), match)
+    columns = ", ".join(f"n.{column}" for column in _NEWS_COLUMNS.split(", "))
+    return _fetch_all(
+        f"SELECT {columns} "
+        f"FROM (SELECT rowid, rank FROM news_fts WHERE news_fts MATCH ? AND {_NOT_SCHEDULED} "
+        f"      ORDER BY {order} LIMIT ?) AS hit "
+        "JOIN news AS n ON n.id = hit.rowid "
+        f"ORDER BY hit.{order}",
+        (match, limit), News)
+
+
+def get_latest_news(limit):
+    """Самые свежие новости целиком"""
+    return _fetch_all(f"SELECT {_NEWS_COLUMNS} FROM news WHERE publish_at IS NULL "
+                      "ORDER BY date DESC, id DESC LIMIT ?", (limit,), News)
+
+
+def get_news_by_id(news_id):
+    """Получение конкретной опубликованной новости (запланированные скрыты, как в списке)"""
+    try:
+        return _fetch_one(f"SELECT {_NEWS_COLUMNS} FROM news WHERE id = ? AND publish_at IS NULL",
+                          (news_id,), News)
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка получения новости {news_id}: {str(e)}")
+        return None
+
+
+def insert_news(title, content, date, image=None, publish_at=None):
+    """Сохраняем новость, возвращаем ее id.
+
+    image - StoredImage из хранилища изображений (счетчик ссылок увеличивается).
+    publish_at - время отложенной публикации; до него новость скрыта.
+    """
+    conn = get_connection()
+    with conn:
+        if image is None:
+            cursor = conn.execute(
+                "INSERT INTO news (title, content, date, publish_at) VALUES (?, ?, ?, ?)",
+                (title, content, date, publish_at)
+            )
+        else:
+            cursor = conn.execute(
+                "INSERT INTO news (title, content, date, publish_at, image_path, image_preview, "
+                "image_width, image_height, image_size, image_file_id, image_fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (title, content, date, publish_at, image.path, image.preview_path, image.width,
+                 image.height, image.size, image.file_id, image.fingerprint)
+            )
+            conn.execute("UPDATE images SET refcount = refcount + 1 WHERE path = ?", (image.path,))
+    return cursor.lastrowid
+
+
+def get_scheduled_news():
+    """Очередь отложенной публикации: [(id, publish_at)] по индексу idx_news_scheduled"""
+    return get_connection().execute(
+        "SELECT id, publish_at FROM news WHERE publish_at IS NOT NULL").fetchall()
+
+
+def publish_news(news_id, now):
+    """Публикуем запланированную новость, если ее время (<= now) пришло.
+
+    В одной транзакции новость становится видимой (с датой публикации) и
+    ставится в очередь рассылки. Несколько процессов бота могут попытаться
+    опубликовать одну новость - удастся одному. Возвращает True, если
+    опубликовал этот вызов.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "UPDATE news SET date = publish_at, publish_at = NULL "
+            "WHERE id = ? AND publish_at IS NOT NULL AND publish_at <= ?", (news_id, now))
+        if not cursor.rowcount:
+            return False
+        conn.execute("INSERT INTO broadcasts (news_id) VALUES (?)", (news_id,))
+    return True
+
+
+def remove_news(news_id):
+    """Удаляем новость. Возвращает файлы (относительно IMAGE_DIR), на которые
+    больше никто не ссылается и которые можно удалить с диска."""
+    conn = get_connection()
+    with conn:
+        row = conn.execute("SELECT image_path FROM news WHERE id = ?", (news_id,)).fetchone()
+        conn.execute("DELETE FROM news WHERE id = ?", (news_id,))
+        if not row or not row[0]:
+            return []
+
+        image_path = row[0]
+        image = conn.execute(
+            "SELECT preview_path, refcount FROM images WHERE path = ?", (image_path,)).fetchone()
+        if image is None:
+            # Изображение из старой схемы (до хранилища): удаляем, если больше не используется
+            still_used = conn.execute(
+                "SELECT 1 FROM news WHERE image_path = ? LIMIT 1", (image_path,)).fetchone()
+            return [] if still_used else [image_path]
+
+        preview_path, refcount = image
+        if refcount > 1:
+            conn.execute("UPDATE images SET refcount = refcount - 1 WHERE path = ?", (image_path,))
+            return []
+        conn.execute("DELETE FROM images WHERE path = ?", (image_path,))
+    return [image_path] + ([preview_path] if preview_path else [])
+
+
+def register_image(image):
+    """Добавляем файл в хранилище изображений (пока без ссылок из новостей)"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO images (path, hash, preview_path, width, height, size) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET preview_path = COALESCE(excluded.preview_path, preview_path), "
+            # Снова загружено для черновика - сборщик (retention.py) отсчитывает время заново
+            "created_at = excluded.created_at",
+            (image.path, image.hash, image.preview_path, image.width, image.height, image.size)
+        )
+
+
+def release_image(path):
+    """Удаляем из хранилища изображение без ссылок (например, диалог отменен).
+    Возвращает файлы для удаления с диска."""
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            "SELECT preview_path FROM images WHERE path = ? AND refcount = 0", (path,)).fetchone()
+        if row is None:
+            return []
+        conn.execute("DELETE FROM images WHERE path = ?", (path,))
+    return [path] + ([row[0]] if row[0] else [])
+
+
+def save_news_image_file_id(news_id, file_id, fingerprint):
+    """Запоминаем file_id изображения новости вместе с отпечатком файла"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE news SET image_file_id = ?, image_fingerprint = ? WHERE id = ?",
+            (file_id, fingerprint, news_id)
+        )
+
+
+# --- Документы ---
+_DOCUMENT_COLUMNS = "id, name, type, file_path, file_id, file_fingerprint"
+
+
+def get_documents(doc_type: str) -> list:
+    """Получаем документы из БД по типу (вместе с превью текста)."""
+    return _fetch_all(
+        "SELECT d.id, d.name, d.type, d.file_path, d.file_id, d.file_fingerprint, t.preview "
+        "FROM documents AS d LEFT JOIN document_texts AS t ON t.document_id = d.id "
+        "WHERE d.type = ?",
+        (doc_type,), Document)
+
+
+_DOCUMENT_LIST_QUERY = (
+    "SELECT d.id, d.name, d.type, d.file_path, d.file_id, d.file_fingerprint, t.preview "
+    "FROM documents AS d LEFT JOIN document_texts AS t ON t.document_id = d.id "
+    "WHERE d.type = ? ")
+
+
+def get_documents_page(doc_type, after_id=None, before_id=None, limit=DOCS_PAGE_SIZE):
+    """Страница списка документов одного типа по названию (keyset-пагинация
+    по индексу (type, name), в котором есть и id).
+
+    after_id - показать документы после указанного, before_id - перед ним.
+    Без якоря возвращается первая страница.
+    """
+    if before_id is not None:
+        rows = _fetch_all(
+            _DOCUMENT_LIST_QUERY +
+            "AND (d.name, d.id) < (SELECT name, id FROM documents WHERE id = ?) "
+            "ORDER BY d.name DESC, d.id DESC LIMIT ?",
+            (doc_type, before_id, limit + 1), Document)
+        has_prev = len(rows) > limit
+        items = rows[:limit][::-1]
+        has_next = True
+    else:
+        if after_id is not None:
+            rows = _fetch_all(
+                _DOCUMENT_LIST_QUERY +
+                "AND (d.name, d.id) > (SELECT name, id FROM documents WHERE id = ?) "
+                "ORDER BY d.name, d.id LIMIT ?",
+                (doc_type, after_id, limit + 1), Document)
+        else:
+            rows = _fetch_all(_DOCUMENT_LIST_QUERY + "ORDER BY d.name, d.id LIMIT ?",
+                              (doc_type, limit + 1), Document)
+        has_next = len(rows) > limit
+        items = rows[:limit]
+        has_prev = after_id is not None
+
+    if not items:
+        return DocumentPage([], None, None)
+    return DocumentPage(
+        items,
+        items[0].id if has_prev else None,
+        items[-1].id if has_next else None,
     )
-    ''')
 
-    conn.commit()
-    conn.close()
 
-def seed_db():
-    """Заполняем базу тестовыми данными."""
-    conn = sqlite3.connect(DB_PATH)
+def get_all_documents():
+    """Все документы с превью текста, по названию."""
+    return _fetch_all(
+        "SELECT d.id, d.name, d.type, d.file_path, d.file_id, d.file_fingerprint, t.preview "
+        "FROM documents AS d LEFT JOIN document_texts AS t ON t.document_id = d.id "
+        "ORDER BY d.name, d.id",
+        (), Document)
+
+
+def get_document_by_id(doc_id: int):
+    """Документ по id."""
+    return _fetch_one(
+        f"SELECT {_DOCUMENT_COLUMNS} FROM documents WHERE id = ?",
+        (doc_id,), Document)
+
+
+def save_document_file_id(doc_id, file_id, fingerprint):
+    """Запоминаем file_id документа вместе с отпечатком файла."""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE documents SET file_id = ?, file_fingerprint = ? WHERE id = ?",
+            (file_id, fingerprint, doc_id)
+        )
+
+
+class DocumentState(NamedTuple):
+    """Что импорт помнит о файле документа, чтобы не хэшировать его повторно."""
+    size: Optional[int]
+    mtime_ns: Optional[int]
+    hash: Optional[str]
+
+
+def get_document_states():
+    """Все документы: file_path -> DocumentState (одним запросом)."""
+    rows = get_connection().execute(
+        "SELECT file_path, file_size, file_mtime_ns, file_hash FROM documents")
+    return {path: DocumentState(size, mtime_ns, file_hash)
+            for path, size, mtime_ns, file_hash in rows}
+
+
+def upsert_documents(rows):
+    """Добавляем или обновляем документы пачкой в одной транзакции.
+
+    rows - (name, type, file_path, file_hash, file_size, file_mtime_ns).
+    У обновленного файла сбрасывается file_id: содержимое уже другое.
+    """
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO documents (name, type, file_path, file_hash, file_size, file_mtime_ns)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (file_path) DO UPDATE SET
+                file_hash = excluded.file_hash,
+                file_size = excluded.file_size,
+                file_mtime_ns = excluded.file_mtime_ns,
+                file_id = CASE WHEN file_hash IS excluded.file_hash THEN file_id END,
+                file_fingerprint = CASE WHEN file_hash IS excluded.file_hash
+                                        THEN file_fingerprint END
+            """,
+            rows
+        )
+
+
+def get_document_text_states():
+    """Для обновления индекса текста: (id, file_path, отпечаток и хэш файла,
+    из которого извлечен текст; None - текста еще нет)."""
+    return get_connection().execute(
+        "SELECT d.id, d.file_path, t.fingerprint, t.hash "
+        "FROM documents AS d LEFT JOIN document_texts AS t ON t.document_id = d.id"
+    ).fetchall()
+
+
+def save_document_texts(texts, touched=()):
+    """Сохраняем извлеченные тексты одной транзакцией.
+
+    texts - (document_id, fingerprint, hash, text, preview);
+    touched - (fingerprint, document_id) файлов, у которых поменялся только
+    mtime: текст прежний, обновляем отпечаток.
+    """
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO document_texts (document_id, fingerprint, hash, text, preview) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (document_id) DO UPDATE SET fingerprint = excluded.fingerprint, "
+            "hash = excluded.hash, text = excluded.text, preview = excluded.preview",
+            texts
+        )
+        conn.executemany(
+            "UPDATE document_texts SET fingerprint = ? WHERE document_id = ?", touched)
+
+
+def search_documents(match, limit=DOC_SEARCH_LIMIT):
+    """Поиск документов по тексту. match - запрос, подготовленный fts_query()."""
+    return _fetch_all(
+        "SELECT d.id, d.name, hit.snippet "
+        "FROM (SELECT rowid, rank, snippet(documents_fts, 0, '«', '»', '…', 12) AS snippet "
+        "      FROM documents_fts WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?) AS hit "
+        "JOIN documents AS d ON d.id = hit.rowid "
+        "ORDER BY hit.rank",
+        (match, limit), DocumentHit)
+
+
+def get_file_references():
+    """Все пути к файлам, которые хранит база (для сверки с диском).
+
+    Возвращает (news, documents, images): [(id, image_path, image_preview)],
+    [(id, file_path)], [(path, preview_path)]. Пути новостей и изображений -
+    относительно IMAGE_DIR.
+    """
+    conn = get_connection()
+    news = conn.execute(
+        "SELECT id, image_path, image_preview FROM news WHERE image_path IS NOT NULL").fetchall()
+    documents = conn.execute("SELECT id, file_path FROM documents").fetchall()
+    images = conn.execute("SELECT path, preview_path FROM images").fetchall()
+    return news, documents, images
+
+
+def remove_documents(paths):
+    """Удаляем документы, файлов которых больше нет."""
+    conn = get_connection()
+    with conn:
+        conn.executemany("DELETE FROM documents WHERE file_path = ?",
+                         ((path,) for path in paths))
+
+
+# --- Архив новостей и сборка мусора (retention.py) ---
+def archive_news(before, limit):
+    """Переносим до limit самых старых новостей с датой раньше before в
+    news_archive одной транзакцией. Возвращает (сколько перенесено, файлы
+    относительно IMAGE_DIR, на которые больше никто не ссылается)."""
+    conn = get_connection()
+    with conn:
+        rows = conn.execute(
+            "SELECT id, image_path FROM news WHERE publish_at IS NULL AND date < ? "
+            "ORDER BY date, id LIMIT ?", (before, limit)).fetchall()
+        if not rows:
+            return 0, []
+        ids = [news_id for news_id, _ in rows]
+        placeholders = ",".join("?" * len(ids))
+        # OR IGNORE: строка уже в архиве, если прошлый перенос прервался после вставки
+        conn.execute(
+            "INSERT OR IGNORE INTO news_archive (id, title, content, date, image_file_id) "
+            f"SELECT id, title, content, date, image_file_id FROM news WHERE id IN ({placeholders})",
+            ids)
+        conn.execute(f"DELETE FROM news WHERE id IN ({placeholders})", ids)
+
+        released = Counter(image_path for _, image_path in rows if image_path)
+        conn.executemany("UPDATE images SET refcount = refcount - ? WHERE path = ?",
+                         [(count, path) for path, count in released.items()])
+        files = []
+        for path in released:
+            image = conn.execute(
+                "SELECT preview_path FROM images WHERE path = ? AND refcount <= 0",
+                (path,)).fetchone()
+            if image is not None:
+                conn.execute("DELETE FROM images WHERE path = ?", (path,))
+                files.extend([path] + ([image[0]] if image[0] else []))
+            # Изображения старой схемы (не из хранилища) подберет сборка файлов без ссылок
+    return len(rows), files
+
+
+def release_stale_images(before, limit):
+    """Удаляем из хранилища до limit изображений без ссылок, загруженных раньше
+    before (брошенные черновики). Возвращает (сколько, файлы для удаления)."""
+    conn = get_connection()
+    with conn:
+        rows = conn.execute(
+            "SELECT path, preview_path FROM images WHERE refcount <= 0 AND created_at < ? "
+            "AND NOT EXISTS (SELECT 1 FROM news WHERE news.image_path = images.path) LIMIT ?",
+            (before, limit)).fetchall()
+        conn.executemany("DELETE FROM images WHERE path = ?", [(path,) for path, _ in rows])
+    return len(rows), [path for row in rows for path in row if path]
+
+
+def get_image_references(paths):
+    """Какие из путей (относительно IMAGE_DIR) еще упоминаются в базе"""
+    if not paths:
+        return set()
+    placeholders = ",".join("?" * len(paths))
+    rows = get_connection().execute(
+        f"SELECT path FROM images WHERE path IN ({placeholders}) "
+        f"UNION SELECT preview_path FROM images WHERE preview_path IN ({placeholders}) "
+        f"UNION SELECT image_path FROM news WHERE image_path IN ({placeholders}) "
+        f"UNION SELECT image_preview FROM news WHERE image_preview IN ({placeholders})",
+        list(paths) * 4).fetchall()
+    return {row[0] for row in rows}
+
+
+def incremental_vacuum(pages):
+    """Возвращаем ОС до pages свободных страниц (короткая транзакция записи).
+
+    Возвращает (освобождено, осталось свободных) или None, если база создана
+    без auto_vacuum = INCREMENTAL (см. enable_incremental_vacuum).
+    """
+    conn = get_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return None
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if before:
+        # Каждая строка результата - шаг освобождения: без fetchall выполнится только первый
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return before - after, after
+
+
+def enable_incremental_vacuum():
+    """Переводим существующую базу на auto_vacuum = INCREMENTAL.
+
+    Нужен полный VACUUM: база переписывается целиком и все это время
+    заблокирована, поэтому - только при остановленном боте.
+    """
+    conn = get_connection()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+# --- Подписки и рассылки ---
+def set_subscription(chat_id, subscribed):
+    """Подписываем чат на новости или отписываем его"""
+    conn = get_connection()
+    with conn:
+        if subscribed:
+            conn.execute("INSERT OR IGNORE INTO subscribers (chat_id) VALUES (?)", (chat_id,))
+        else:
+            conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
+
+
+def is_subscribed(chat_id):
+    row = get_connection().execute(
+        "SELECT 1 FROM subscribers WHERE chat_id = ?", (chat_id,)).fetchone()
+    return row is not None
+
+
+def get_subscribers_after(chat_id, limit):
+    """Следующая пачка подписчиков (keyset по chat_id; None - с начала)"""
+    if chat_id is None:
+        rows = get_connection().execute(
+            "SELECT chat_id FROM subscribers ORDER BY chat_id LIMIT ?", (limit,)).fetchall()
+    else:
+        rows = get_connection().execute(
+            "SELECT chat_id FROM subscribers WHERE chat_id > ? ORDER BY chat_id LIMIT ?",
+            (chat_id, limit)).fetchall()
+    return [row[0] for row in rows]
+
+
+def create_broadcast(news_id):
+    """Ставим рассылку новости в очередь"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("INSERT INTO broadcasts (news_id) VALUES (?)", (news_id,))
+    return cursor.lastrowid
+
+
+_BROADCAST_COLUMNS = "id, news_id, last_chat_id, sent, failed, photo_file_id"
+
+
+def claim_broadcast(owner, lease_seconds):
+    """Берем в работу незавершенную рассылку, если ее не держит другой процесс.
+
+    Аренда продлевается при каждом сохранении прогресса; если процесс упал,
+    после ее истечения рассылку подхватит следующий.
+    """
+    conn = get_connection()
+    now = time.time()
+    candidates = _fetch_all(
+        f"SELECT {_BROADCAST_COLUMNS} FROM broadcasts "
+        "WHERE status = 'pending' AND (lease_until IS NULL OR lease_until < ? OR lease_owner = ?) "
+        "ORDER BY id",
+        (now, owner), Broadcast)
+    for broadcast in candidates:
+        with conn:
+            cursor = conn.execute(
+                "UPDATE broadcasts SET lease_owner = ?, lease_until = ? "
+                "WHERE id = ? AND status = 'pending' "
+                "AND (lease_until IS NULL OR lease_until < ? OR lease_owner = ?)",
+                (owner, now + lease_seconds, broadcast.id, now, owner))
+        if cursor.rowcount:
+            return broadcast
+    return None
+
+
+def save_broadcast_progress(broadcast, owner, lease_seconds, done=False):
+    """Сохраняем прогресс рассылки (и продлеваем аренду)"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE broadcasts SET last_chat_id = ?, sent = ?, failed = ?, photo_file_id = ?, "
+            "status = ?, lease_until = ? WHERE id = ? AND lease_owner = ?",
+            (broadcast.last_chat_id, broadcast.sent, broadcast.failed, broadcast.photo_file_id,
+             "done" if done else "pending", time.time() + lease_seconds,
+             broadcast.id, owner))
+
+
+def renew_broadcast_lease(broadcast_id, owner, lease_seconds):
+    """Продлеваем аренду посреди пачки. False - рассылку забрал другой процесс."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "UPDATE broadcasts SET lease_until = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = 'pending'",
+            (time.time() + lease_seconds, broadcast_id, owner))
+    return cursor.rowcount > 0
+
+
+def get_contacts():
+    """Все контакты (справочник держит их в памяти, см. contacts.py)"""
+    return _fetch_all("SELECT id, department, phone, email FROM contacts ORDER BY department, id",
+                      (), Contact)
+
+
+def get_data_versions():
+    """Все счетчики изменений: имя -> версия (для кэша экранов)"""
+    return dict(get_connection().execute("SELECT name, version FROM data_versions"))
+
+
+def get_contacts_version():
+    """Счетчик изменений таблицы contacts (растет при любой правке)"""
+    row = get_connection().execute(
+        "SELECT version FROM data_versions WHERE name = 'contacts'").fetchone()
+    return row[0] if row else 0
+
+
+# --- Архивы документов (bundles.py) ---
+class Bundle(NamedTuple):
+    key: str
+    doc_type: str
+    path: str
+    size: int
+    file_id: Optional[str]
+
+
+def get_bundle_sources(doc_type):
+    """Документы для архива: [(id, name, file_path)] по названию"""
+    return get_connection().execute(
+        "SELECT id, name, file_path FROM documents WHERE type = ? ORDER BY name, id",
+        (doc_type,)).fetchall()
+
+
+def get_bundle(key):
+    return _fetch_one("SELECT key, doc_type, path, size, file_id FROM bundles WHERE key = ?",
+                      (key,), Bundle)
+
+
+def save_bundle(bundle):
+    """Записываем новый архив типа; возвращаем пути прежних архивов этого типа"""
+    conn = get_connection()
+    with conn:
+        old = conn.execute("SELECT path FROM bundles WHERE doc_type = ? AND key != ?",
+                           (bundle.doc_type, bundle.key)).fetchall()
+        conn.execute("DELETE FROM bundles WHERE doc_type = ? AND key != ?",
+                     (bundle.doc_type, bundle.key))
+        conn.execute(
+            "INSERT INTO bundles (key, doc_type, path, size, file_id) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET path = excluded.path, size = excluded.size",
+            bundle)
+    return [row[0] for row in old]
+
+
+def save_bundle_file_id(key, file_id):
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE bundles SET file_id = ? WHERE key = ?", (file_id, key))
+
+
+# --- Статистика использования (usage.py) ---
+def add_usage(rows):
+    """Прибавляем счетчики: [(час, вид, элемент, сколько)] одной транзакцией"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO usage_hourly (hour, kind, item, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (hour, kind, item) DO UPDATE SET count = count + excluded.count",
+            rows)
+
+
+def get_usage_top(kind, since_hour, limit):
+    """Самые частые элементы вида kind с часа since_hour: [(элемент, сколько)]"""
+    return get_connection().execute(
+        "SELECT item, SUM(count) AS total FROM usage_hourly "
+        "WHERE hour >= ? AND kind = ? GROUP BY item ORDER BY total DESC LIMIT ?",
+        (since_hour, kind, limit)).fetchall()
+
+
+def get_usage_totals(since_hour):
+    """Суммы по часам и видам с часа since_hour: [(час, вид, сколько)]"""
+    return get_connection().execute(
+        "SELECT hour, kind, SUM(count) FROM usage_hourly WHERE hour >= ? GROUP BY hour, kind",
+        (since_hour,)).fetchall()
+
+
+def get_news_titles(ids):
+    """{id: заголовок} для отчетов"""
+    ids = list(ids)
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" * len(ids))
+    return dict(get_connection().execute(
+        f"SELECT id, title FROM news WHERE id IN ({placeholders})", ids).fetchall())
+
+
+def get_document_names(ids):
+    """{id: название} для отчетов"""
+    ids = list(ids)
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" * len(ids))
+    return dict(get_connection().execute(
+        f"SELECT id, name FROM documents WHERE id IN ({placeholders})", ids).fetchall())
+
+
+# --- Состояние диалогов (state.py): JSON, как его сериализует state ---
+def get_user_states():
+    """user_data всех пользователей: [(user_id, data)]"""
+    return get_connection().execute("SELECT user_id, data FROM user_state").fetchall()
+
+
+def lock_user_state(user_id, owner, lease_seconds):
+    """Берем аренду пользователя и читаем его состояние.
+
+    Возвращает (True, data) или (False, None), если пользователя держит
+    другой процесс. Истекшая аренда (процесс упал) переходит к нам.
+    """
+    conn = get_connection()
+    now = time.time()
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO user_locks (user_id, owner, lease_until) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET owner = excluded.owner, "
+            "lease_until = excluded.lease_until "
+            "WHERE user_locks.lease_until < ? OR user_locks.owner = excluded.owner",
+            (user_id, owner, now + lease_seconds, now))
+        if not cursor.rowcount:
+            return False, None
+        row = conn.execute("SELECT data FROM user_state WHERE user_id = ?", (user_id,)).fetchone()
+    return True, (row[0] if row else None)
+
+
+def save_states(users, unlock=(), owner=None):
+    """Записываем накопленные изменения одной транзакцией.
+
+    users - [(user_id, data)], data None - удалить запись. unlock -
+    пользователи, аренду которых снимаем после записи.
+    """
+    conn = get_connection()
+    with conn:
+        conn.executemany("DELETE FROM user_state WHERE user_id = ?",
+                         [(user_id,) for user_id, data in users if data is None])
+        conn.executemany(
+            "INSERT INTO user_state (user_id, data) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data",
+            [(user_id, data) for user_id, data in users if data is not None])
+        conn.executemany("DELETE FROM user_locks WHERE user_id = ? AND owner = ?",
+                         [(user_id, owner) for user_id in unlock])
+
+
+def init_db():
+    """Создаем таблицы в базе данных (или обновляем схему до текущей версии)."""
+    conn = get_connection()
+    if conn.execute("SELECT count(*) FROM sqlite_master").fetchone()[0] == 0:
+        # Новая база: место после удалений возвращается по частям (retention.py).
+        # Режим можно сменить только VACUUM, на пустой базе он мгновенный.
+        enable_incremental_vacuum()
+    migrations.migrate(conn)
+
+
+def seed_db(news_count=2, documents_count=2, doc_dir="docs", contacts_count=2):
+    """Заполняем базу тестовыми данными.
+
+    Сверх двух примеров добавляются сгенерированные новости, документы и
+    контакты (для бенчмарков на базе нужного размера). Файлы документов не
+    создаются.
+    """
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Очищаем таблицы перед заполнением (для тестов)
@@ -72,6 +1025,12 @@ def seed_db():
             ("Шаблон договора", "template", "docs/template_1.docx")
         ]
     )
+    doc_types = ("application", "template")
+    cursor.executemany(
+        "INSERT INTO documents (name, type, file_path) VALUES (?, ?, ?)",
+        ((f"Документ №{i}", doc_types[i % 2], os.path.join(doc_dir, f"{doc_types[i % 2]}_{i}.docx"))
+         for i in range(2, documents_count))
+    )
 
     # Добавляем новости
     cursor.executemany(
@@ -81,6 +1040,13 @@ def seed_db():
             ("Выставка в Минске", "Приглашаем 15-20 октября.", "news_images/expo.jpg")
         ]
     )
+    start = datetime(2024, 1, 1)
+    cursor.executemany(
+        "INSERT INTO news (title, content, date) VALUES (?, ?, ?)",
+        ((f"Новость №{i}", f"Текст новости №{i}. " * 20,
+          (start + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S"))
+         for i in range(2, news_count))
+    )
 
     # Добавляем контакты
     cursor.executemany(
@@ -90,11 +1056,23 @@ def seed_db():
             ("Техподдержка", "+375 (17) 765-43-21", "support@belaz.by")
         ]
     )
+    cursor.executemany(
+        "INSERT INTO contacts (department, phone, email) VALUES (?, ?, ?)",
+        ((f"Отдел №{i}", f"+375 (17) {200 + i // 10000:03d}-{i // 100 % 100:02d}-{i % 100:02d}",
+          f"dept{i}@belaz.by")
+         for i in range(2, contacts_count))
+    )
 
     conn.commit()
-    conn.close()
 
 if __name__ == "__main__":
-    init_db()  # Создаем таблицы
-    seed_db()  # Заполняем данными
+    # python database.py - только миграции; --seed стирает таблицы и заполняет примерами
+    import argparse
+    parser = argparse.ArgumentParser(description="Создание и обновление схемы базы")
+    parser.add_argument("--seed", action="store_true",
+                        help="Очистить таблицы и заполнить тестовыми данными")
+    args = parser.parse_args()
+    init_db()  # Создаем таблицы или обновляем схему
+    if args.seed:
+        seed_db()  # Заполняем данными
     print("✅ База данных готова!")
\ No newline at end of file
@@ -0,0 +1,70 @@
+# dialogs.py
+"""Диалог по шагам, шаг которого хранится в user_data.
+
+То же, что ConversationHandler (entry_points, states, fallbacks, обработчики
+возвращают следующий шаг или ConversationHandler.END), но текущий шаг лежит
+в context.user_data: при STATE_SHARED его, как и черновик, подгружает из
+базы state.py через публичный refresh_user_data, без внутренностей PTB.
+"""
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, BaseHandler, ConversationHandler
+
+
+def _first_match(handlers, update):
+    for handler in handlers:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return handler, check
+    return None
+
+
+class UserDataDialog(BaseHandler):
+    """Обработчик диалога: шаг - context.user_data[f"{name}_step"].
+
+    Регистрируется в отдельной группе раньше остальных обработчиков:
+    обновление, которое обработал диалог, дальше не идет
+    (ApplicationHandlerStop), остальные обрабатываются как обычно.
+    """
+
+    def __init__(self, name, entry_points, states, fallbacks):
+        super().__init__(self._unused)
+        self.name = name
+        self.step_key = f"{name}_step"
+        self.entry_points = entry_points
+        self.states = states
+        self.fallbacks = fallbacks
+
+    @staticmethod
+    async def _unused(update, context):
+        raise NotImplementedError  # Вызовы идут через handle_update
+
+    def check_update(self, update):
+        if not isinstance(update, Update) or update.effective_user is None:
+            return None
+        # Шаг пользователя здесь еще не известен: user_data подгружается перед
+        # обработчиком. Запоминаем, что подошло бы на каждом шаге.
+        entry = _first_match(self.entry_points, update)
+        steps = {}
+        for step, handlers in self.states.items():
+            match = _first_match(handlers, update)
+            if match:
+                steps[step] = match
+        fallback = _first_match(self.fallbacks, update)
+        if entry is None and not steps and fallback is None:
+            return None
+        return entry, steps, fallback
+
+    async def handle_update(self, update, application, check_result, context):
+        entry, steps, fallback = check_result
+        step = context.user_data.get(self.step_key)
+        match = entry if step is None else steps.get(step) or fallback
+        if match is None:
+            return None  # Не для диалога - дальше обработают другие группы
+
+        handler, check = match
+        new_step = await handler.handle_update(update, application, check, context)
+        if new_step == ConversationHandler.END:
+            context.user_data.pop(self.step_key, None)
+        elif new_step is not None:
+            context.user_data[self.step_key] = new_step
+        raise ApplicationHandlerStop
@@ -0,0 +1,108 @@
+# doc_index.py
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import (DOC_INDEX_WORKERS, DOC_INDEX_INTERVAL, DOC_INDEX_BATCH, DOC_TEXT_MAX_CHARS,
+                    DOC_PREVIEW_LENGTH)
+from database import (get_document_text_states, save_document_texts, file_fingerprint)
+from docx_text import process_file, make_preview
+from runtime import run_blocking
+from cache import render_cache
+import metrics
+"""Индекс текста документов: превью для списков и поиск по содержимому.
+
+Для каждого документа хранится отпечаток (размер + mtime) и хэш файла, из
+которого извлечен текст. При обновлении проверяется только stat файлов:
+разбираются новые документы и те, у которых изменился отпечаток, а если
+при этом совпал хэш (файл лишь перезаписан) - обновляется отпечаток.
+"""
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn, а не fork: бот многопоточный, форк мог бы унести чужие блокировки
+        _pool = ProcessPoolExecutor(DOC_INDEX_WORKERS,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def find_stale():
+    """Документы, текст которых нужно (пере)извлечь: (id, путь, отпечаток, хэш)"""
+    stale = []
+    for doc_id, path, indexed_fingerprint, indexed_hash in get_document_text_states():
+        fingerprint = file_fingerprint(path)
+        if fingerprint is not None and fingerprint != indexed_fingerprint:
+            stale.append((doc_id, path, fingerprint, indexed_hash))
+    return stale
+
+
+def refresh(batch_size=DOC_INDEX_BATCH):
+    """Обновляем индекс (блокирующий вызов). Возвращает число измененных текстов."""
+    stale = find_stale()
+    if not stale:
+        return 0
+
+    pool = _get_pool()
+    changed = 0
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        futures = [pool.submit(process_file, path, indexed_hash, DOC_TEXT_MAX_CHARS)
+                   for _, path, _, indexed_hash in batch]
+        texts, touched = [], []
+        for (doc_id, path, fingerprint, _), future in zip(batch, futures):
+            file_hash, text = future.result()
+            if file_hash is None:
+                continue  # Файл пропал между stat и чтением - проверим в следующий раз
+            if text is None:
+                touched.append((fingerprint, doc_id))
+            else:
+                texts.append((doc_id, fingerprint, file_hash, text,
+                              make_preview(text, DOC_PREVIEW_LENGTH)))
+        save_document_texts(texts, touched)
+        changed += len(texts)
+    logger.info(f"Индекс документов: проверено {len(stale)}, текст обновлен у {changed}")
+    return changed
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+class DocumentIndexer:
+    """Фоновое обновление индекса: при старте и раз в DOC_INDEX_INTERVAL."""
+
+    def __init__(self, interval=DOC_INDEX_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await run_blocking(refresh):
+                    # Превью в списках и результаты поиска устарели
+                    render_cache.bump("docs")
+            except Exception as e:
+                logger.error(f"Ошибка индексации документов: {e}")
+                metrics.error("doc_index")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,80 @@
+# docx_text.py
+import hashlib
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+"""Извлечение текста из .docx без сторонних библиотек.
+
+Из архива читается только word/document.xml, и тот потоково (iterparse):
+абзацы собираются по мере разбора и сразу выбрасываются из дерева, так что
+память не зависит от размера документа. Модуль выполняется в процессах
+пула, поэтому импортирует только стандартную библиотеку.
+"""
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_TEXT, _TAB, _PARAGRAPH = W + "t", W + "tab", W + "p"
+_BREAKS = (W + "br", W + "cr")
+
+CHUNK_SIZE = 1024 * 1024
+_SPACES = re.compile(r"\s+")
+
+
+def extract_text(path, max_chars):
+    """Текст документа: абзацы через перевод строки, не длиннее max_chars"""
+    lines = []
+    length = 0
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as xml:
+        paragraph = []
+        for _, element in ET.iterparse(xml):
+            tag = element.tag
+            if tag == _TEXT:
+                paragraph.append(element.text or "")
+            elif tag == _TAB:
+                paragraph.append("\t")
+            elif tag in _BREAKS:
+                paragraph.append("\n")
+            elif tag == _PARAGRAPH:
+                line = "".join(paragraph).strip()
+                paragraph = []
+                element.clear()
+                if line:
+                    lines.append(line)
+                    length += len(line) + 1
+                    if length >= max_chars:
+                        break
+    return "\n".join(lines)[:max_chars]
+
+
+def make_preview(text, length):
+    """Начало текста одной строкой, обрезанное по границе слова"""
+    text = _SPACES.sub(" ", text).strip()
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(" ", 1)[0] or text[:length]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def process_file(path, known_hash, max_chars):
+    """Задача пула: хэш файла и, если содержимое изменилось, его текст.
+
+    Возвращает (hash, text). text = None - хэш совпал с known_hash, текст
+    прежний. hash = None - файл не прочитать. Из файлов других форматов и
+    поврежденных .docx текст пустой: повторно их разбирать не нужно, пока
+    файл не изменится.
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            while chunk := file.read(CHUNK_SIZE):
+                digest.update(chunk)
+    except OSError:
+        return None, None
+    file_hash = digest.hexdigest()
+    if file_hash == known_hash:
+        return file_hash, None
+    if not path.lower().endswith(".docx"):
+        return file_hash, ""
+    try:
+        return file_hash, extract_text(path, max_chars)
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError):
+        return file_hash, ""
@@ -0,0 +1,96 @@
+# handlers/contacts.py
+import logging
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from config import CONTACTS_PAGE_SIZE
+from contacts import directory, normalize_query
+from keyboards import back_button
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def format_contact(contact):
+    lines = [f"🏢 {contact.department}", f"📱 {contact.phone}"]
+    if contact.email:
+        lines.append(f"✉️ {contact.email}")
+    return "\n".join(lines)
+
+
+def render_contacts(title, contacts, page, has_more, route):
+    """Страница контактов с кнопками листания (route:страница)"""
+    text = "\n\n".join([title] + [format_contact(contact) for contact in contacts])
+    keyboard = []
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"{route}:{page - 1}"))
+    if has_more:
+        nav.append(InlineKeyboardButton("Дальше ➡️", callback_data=f"{route}:{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def render_contacts_page(index, page):
+    """Справочник по алфавиту"""
+    if not len(index):
+        return "📞 Справочник контактов пока пуст", back_button()
+    contacts, has_more = index.page(page, CONTACTS_PAGE_SIZE)
+    pages = (len(index) + CONTACTS_PAGE_SIZE - 1) // CONTACTS_PAGE_SIZE
+    title = (f"📞 Контакты предприятия ({page + 1}/{pages})\n"
+             "Поиск по отделу, телефону или email: /contacts кадры")
+    return render_contacts(title, contacts, page, has_more, "contacts_page")
+
+
+def render_contact_search(index, words, page):
+    """Результаты поиска по началу слов"""
+    found = index.search(words)
+    if not found:
+        return "🔍 Контакты не найдены", back_button()
+    start = page * CONTACTS_PAGE_SIZE
+    contacts = found[start:start + CONTACTS_PAGE_SIZE]
+    title = f"🔍 Найдено контактов: {len(found)}"
+    return render_contacts(title, contacts, page, start + CONTACTS_PAGE_SIZE < len(found),
+                           "contacts_found")
+
+
+async def show_contacts(update, context, page=0):
+    """Кнопка контактов в главном меню и листание справочника"""
+    query = update.callback_query
+    await query.answer()
+    text, markup = render_contacts_page(await directory.get(), page)
+    await query.edit_message_text(text, reply_markup=markup)
+
+
+async def contacts_command(update, context):
+    """/contacts [текст] - справочник или поиск по нему"""
+    try:
+        index = await directory.get()
+        words = normalize_query(" ".join(context.args))
+        if not words:
+            text, markup = render_contacts_page(index, 0)
+        else:
+            # Запрос храним у пользователя, как и поиск новостей
+            context.user_data['contacts_query'] = words
+            text, markup = render_contact_search(index, words, 0)
+        await update.message.reply_text(text, reply_markup=markup)
+
+    except Exception as e:
+        logger.error(f"Ошибка в contacts_command: {e}")
+        metrics.error("contacts_command")
+        await update.message.reply_text("❌ Ошибка поиска контактов")
+
+
+async def show_contact_search_page(update, context, page):
+    """Листание результатов поиска контактов"""
+    query = update.callback_query
+    await query.answer()
+
+    words = context.user_data.get('contacts_query')
+    if not words:
+        await query.edit_message_text("🔍 Запрос устарел, повторите поиск: /contacts текст",
+                                      reply_markup=back_button())
+        return
+
+    text, markup = render_contact_search(await directory.get(), words, page)
+    await query.edit_message_text(text, reply_markup=markup)
@@ -1,55 +1,207 @@
 # handlers/docs.py
-import sqlite3
-from config import DB_PATH
+import logging
+import os
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from database import (get_documents_page, get_document_by_id, save_document_file_id, fts_query,
+                      search_documents, save_bundle_file_id)
+from runtime import run_blocking, read_file
+from cache import cached_view
+from keyboards import back_button
+from manifest import manifest
+import bundles
+import metrics
+import usage
 
+logger = logging.getLogger(__name__)
 
-def get_documents(doc_type: str) -> list:
-    """Получаем документы из БД по типу."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT name, file_path FROM documents WHERE type = ?",
-        (doc_type,)
-    )
-    docs = cursor.fetchall()
-    conn.close()
-    return docs
+TEXT_LIMIT = 4000  # Telegram принимает до 4096 символов в сообщении
 
 
-def show_docs_menu(update, context):
-    """Показываем меню типов документов."""
+def render_docs_menu():
+    """Меню типов документов."""
     keyboard = [
-        [InlineKeyboardButton("📝 Заявления", callback_data="docs_application")],
-        [InlineKeyboardButton("📑 Шаблоны", callback_data="docs_template")],
+        [InlineKeyboardButton("📝 Заявления", callback_data="doclist:application")],
+        [InlineKeyboardButton("📑 Шаблоны", callback_data="doclist:template")],
+        [InlineKeyboardButton("🔍 Поиск по тексту", callback_data="docsearch_help")],
         [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
     ]
-    update.callback_query.edit_message_text(
-        "📄 Выберите тип документа:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    return "📄 Выберите тип документа:", InlineKeyboardMarkup(keyboard)
+
+
+def render_documents_list(doc_type: str, after_id=None, before_id=None):
+    """Страница списка документов одного типа."""
+    page = get_documents_page(doc_type, after_id=after_id, before_id=before_id)
+    if not page.items and (after_id or before_id):
+        # Якорный документ могли удалить - показываем первую страницу
+        page = get_documents_page(doc_type)
+
+    keyboard = []
+    lines = ["📂 Доступные документы:"]
+    length = len(lines[0])
+    for doc in page.items:
+        # Формируем кнопки: название -> id документа
+        keyboard.append([InlineKeyboardButton(doc.name, callback_data=f"doc:{doc.id}")])
+        # Под заголовком - начало текста, пока сообщение не упирается в лимит Telegram
+        if doc.preview:
+            line = f"\n• {doc.name}: {doc.preview}"
+            if length + len(line) <= TEXT_LIMIT:
+                lines.append(line)
+                length += len(line)
+
+    # Навигация по страницам
+    nav = []
+    if page.prev_id is not None:
+        nav.append(InlineKeyboardButton(
+            "⬅️ Предыдущие", callback_data=f"doclist_prev:{doc_type}:{page.prev_id}"))
+    if page.next_id is not None:
+        nav.append(InlineKeyboardButton(
+            "Следующие ➡️", callback_data=f"doclist_next:{doc_type}:{page.next_id}"))
+    if nav:
+        keyboard.append(nav)
+
+    if page.items:
+        keyboard.append([InlineKeyboardButton("📦 Скачать все (ZIP)",
+                                              callback_data=f"docbundle:{doc_type}")])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="docs")])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
 
 
-def show_documents_list(update, context, doc_type: str):
-    """Показываем список документов."""
-    docs = get_documents(doc_type)
+def render_document_search(match):
+    """Документы, в тексте которых нашлись слова запроса."""
+    hits = search_documents(match)
+    if not hits:
+        return "🔍 В документах ничего не найдено", back_button()
+
+    lines = ["🔍 Найдено в документах:"]
     keyboard = []
-    for doc in docs:
-        # Формируем кнопки: название -> file_path
-        keyboard.append([InlineKeyboardButton(doc[0], callback_data=f"file_{doc[1]}")])
+    for hit in hits:
+        lines.append(f"\n📄 {hit.name}\n{hit.snippet}")
+        keyboard.append([InlineKeyboardButton(hit.name, callback_data=f"doc:{hit.id}")])
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="docs")])
+    return "\n".join(lines)[:TEXT_LIMIT], InlineKeyboardMarkup(keyboard)
+
+
+async def show_docs_menu(update, context):
+    """Показываем меню типов документов."""
+    text, markup = await cached_view("docs", "menu", render_docs_menu)
+    await update.callback_query.edit_message_text(text, reply_markup=markup)
+
+
+async def show_documents_list(update, context, doc_type: str, after_id=None, before_id=None):
+    """Показываем страницу списка документов."""
+    text, markup = await cached_view("docs", ("list", doc_type, after_id, before_id),
+                                     render_documents_list, doc_type, after_id, before_id)
+    await update.callback_query.edit_message_text(text, reply_markup=markup)
+
+
+async def docsearch_command(update, context):
+    """/docsearch <текст> - поиск по содержимому документов."""
+    try:
+        match = fts_query(" ".join(context.args))
+        if match is None:
+            await update.message.reply_text(
+                "🔍 Напишите, что искать в документах, например: /docsearch отпуск")
+            return
+
+        text, markup = await cached_view("docs", ("search", match), render_document_search, match)
+        await update.message.reply_text(text, reply_markup=markup)
 
-    update.callback_query.edit_message_text(
-        "📂 Доступные документы:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+    except Exception as e:
+        logger.error(f"Ошибка в docsearch_command: {e}")
+        metrics.error("docsearch_command")
+        await update.message.reply_text("❌ Ошибка поиска")
+
+
+async def show_docsearch_help(update, context):
+    """Кнопка поиска в меню документов."""
+    await update.callback_query.edit_message_text(
+        "🔍 Чтобы найти документ по тексту, отправьте команду /docsearch и слова для поиска.\n"
+        "Например: /docsearch отпуск",
+        reply_markup=back_button()
     )
 
 
-def send_document(update, context, file_path: str):
-    """Отправляем файл пользователю."""
-    chat_id = update.callback_query.message.chat_id
+async def send_document(update, context, doc_id: int):
+    """Кнопка документа: отправляем файл в чат."""
+    await update.callback_query.answer()
+    await deliver_document(context, update.callback_query.message.chat_id, doc_id)
+
+
+async def deliver_document(context, chat_id, doc_id):
+    """Отправляем файл пользователю (кнопка или ссылка из inline-режима).
+
+    Если Telegram уже выдал file_id для этой версии файла, отправляем по нему
+    без чтения с диска; иначе загружаем файл и запоминаем новый file_id.
+    """
+    doc = await run_blocking(get_document_by_id, doc_id)
+    if doc is None:
+        await context.bot.send_message(chat_id, "❌ Файл не найден.")
+        return
+
+    file_path = doc.file_path
+    # Наличие файла - по списку в памяти, без обращения к диску
+    fingerprint = manifest.fingerprint(file_path)
+    if fingerprint is None:
+        await context.bot.send_message(chat_id, "❌ Файл не найден.")
+        return
+
+    usage.counters.hit(usage.DOCUMENT, doc.id)
+    if doc.file_id and doc.file_fingerprint == fingerprint:
+        try:
+            await context.bot.send_document(chat_id, document=doc.file_id)
+            return
+        except BadRequest as e:
+            logger.warning(f"file_id документа {doc.id} отклонен: {e}")
+
     try:
-        with open(file_path, 'rb') as file:
-            context.bot.send_document(chat_id, document=file)
+        data = await run_blocking(read_file, file_path)
     except FileNotFoundError:
-        context.bot.send_message(chat_id, "❌ Файл не найден.")
\ No newline at end of file
+        await context.bot.send_message(chat_id, "❌ Файл не найден.")
+        return
+
+    message = await context.bot.send_document(chat_id, document=data,
+                                              filename=os.path.basename(file_path))
+    await run_blocking(save_document_file_id, doc.id, message.document.file_id, fingerprint)
+
+
+async def send_bundle(update, context, doc_type: str):
+    """Кнопка "Скачать все": ZIP со всеми документами типа.
+
+    Архив собирается один раз на версию документов; после первой отправки
+    уходит по file_id, без чтения с диска.
+    """
+    query = update.callback_query
+    await query.answer()
+    chat_id = query.message.chat_id
+    try:
+        bundle = await bundles.get(doc_type)
+    except bundles.BundleTooLarge:
+        await context.bot.send_message(
+            chat_id, "❌ Архив слишком большой для Telegram, скачайте документы по одному.")
+        return
+    except Exception as e:
+        logger.error(f"Ошибка сборки архива {doc_type}: {e}")
+        metrics.error("send_bundle")
+        await context.bot.send_message(chat_id, "❌ Не удалось собрать архив.")
+        return
+
+    if bundle is None:
+        await context.bot.send_message(chat_id, "📂 Документов пока нет.")
+        return
+
+    if bundle.file_id:
+        try:
+            await context.bot.send_document(chat_id, document=bundle.file_id)
+            return
+        except BadRequest as e:
+            logger.warning(f"file_id архива {bundle.key[:16]} отклонен: {e}")
+
+    try:
+        data = await run_blocking(read_file, bundle.path)
+    except FileNotFoundError:
+        await context.bot.send_message(chat_id, "❌ Архив не найден, попробуйте еще раз.")
+        return
+
+    message = await context.bot.send_document(chat_id, document=data, filename=f"{doc_type}.zip")
+    await run_blocking(save_bundle_file_id, bundle.key, message.document.file_id)
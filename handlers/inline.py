@@ -0,0 +1,149 @@
+# handlers/inline.py
+import logging
+import os
+import re
+import unicodedata
+from typing import NamedTuple
+from telegram import (InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle,
+                      InlineQueryResultCachedDocument, InlineQueryResultCachedPhoto,
+                      InputTextMessageContent)
+from config import (IMAGE_DIR, INLINE_PAGE_SIZE, INLINE_MAX_RESULTS, INLINE_MIN_QUERY,
+                    INLINE_CACHE_TIME)
+from database import fts_query, search_news_full, get_latest_news, get_all_documents
+from runtime import run_blocking
+from cache import QueryCache, cached_view, sync_versions
+from manifest import manifest
+from handlers.news import format_news
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CAPTION_LIMIT = 1024
+MESSAGE_LIMIT = 4096
+DESCRIPTION_LENGTH = 100
+
+inline_cache = QueryCache()
+
+
+class InlineHit(NamedTuple):
+    words: frozenset  # Слова, по которым результат находится (для допечатанных запросов)
+    result: object  # InlineQueryResult
+
+
+class InlineAnswer(NamedTuple):
+    hits: tuple
+    complete: bool  # Найдено все, а не первые INLINE_MAX_RESULTS
+
+
+def query_words(text):
+    """Слова запроса так, как их видит FTS5 (unicode61 remove_diacritics 2):
+    в нижнем регистре и без диакритики - "ёлка" и "елка" одно и то же."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"\w+", text)
+
+
+def matches(words, hit_words):
+    """Все слова запроса есть у результата, последнее - по началу"""
+    *exact, last = words
+    return (all(word in hit_words for word in exact)
+            and any(word.startswith(last) for word in hit_words))
+
+
+def _short(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def news_result(news):
+    """Новость с фото - по file_id, без загрузки; иначе - текстом"""
+    text = format_news(news)
+    description = _short(news.content, DESCRIPTION_LENGTH)
+    if news.image_path and news.image_file_id:
+        fingerprint = manifest.fingerprint(os.path.join(IMAGE_DIR, news.image_path))
+        if fingerprint == news.image_fingerprint:
+            return InlineQueryResultCachedPhoto(
+                id=f"n{news.id}", photo_file_id=news.image_file_id, title=news.title,
+                description=description, caption=_short(text, CAPTION_LIMIT), parse_mode="HTML")
+    return InlineQueryResultArticle(
+        id=f"n{news.id}", title=news.title, description=description,
+        input_message_content=InputTextMessageContent(_short(text, MESSAGE_LIMIT),
+                                                      parse_mode="HTML"))
+
+
+def document_result(doc, bot_username):
+    """Документ с file_id отправляется сразу, остальные - ссылкой в чат с ботом"""
+    description = _short(doc.preview, DESCRIPTION_LENGTH) if doc.preview else None
+    if doc.file_id and doc.file_fingerprint == manifest.fingerprint(doc.file_path):
+        return InlineQueryResultCachedDocument(
+            id=f"d{doc.id}", title=doc.name, document_file_id=doc.file_id,
+            description=description)
+    link = f"https://t.me/{bot_username}?start=doc_{doc.id}"
+    return InlineQueryResultArticle(
+        id=f"d{doc.id}", title=f"📄 {doc.name}", description=description or "Документ",
+        input_message_content=InputTextMessageContent(f"📄 {doc.name}"),
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📥 Получить файл", url=link)]]))
+
+
+def find_news(words):
+    """Новости по запросу (блокирующий вызов). Пустой запрос - самые свежие."""
+    if not words:
+        return get_latest_news(INLINE_PAGE_SIZE), False
+    rows = search_news_full(fts_query(" ".join(words)), INLINE_MAX_RESULTS + 1)
+    return rows[:INLINE_MAX_RESULTS], len(rows) <= INLINE_MAX_RESULTS
+
+
+def load_documents():
+    """Все документы со словами названия (блокирующий вызов, кэшируется)"""
+    return [(doc, frozenset(query_words(doc.name))) for doc in get_all_documents()]
+
+
+async def search(words, bot_username):
+    """Ответ на запрос: документы (по названию), затем новости"""
+    documents = await cached_view("docs", "inline", load_documents)
+    found_docs = [(doc, doc_words) for doc, doc_words in documents
+                  if words and matches(words, doc_words)]
+    news, news_complete = await run_blocking(find_news, words)
+
+    hits = [InlineHit(doc_words, document_result(doc, bot_username))
+            for doc, doc_words in found_docs[:INLINE_MAX_RESULTS]]
+    hits.extend(InlineHit(frozenset(query_words(f"{item.title} {item.content}")),
+                          news_result(item))
+                for item in news)
+    return InlineAnswer(tuple(hits), news_complete and len(found_docs) <= INLINE_MAX_RESULTS)
+
+
+async def inline_query(update, context):
+    """@бот текст - новости и документы прямо в поле ввода любого чата.
+
+    Ответы кэшируются по тексту запроса; допечатанный запрос отвечается
+    фильтром по полному ответу на его начало, без обращения к базе.
+    """
+    query = update.inline_query
+    try:
+        words = query_words(query.query)
+        key = " ".join(words)
+        if len(key) < INLINE_MIN_QUERY:
+            words, key = [], ""
+        await sync_versions()
+        found_key, answer = inline_cache.find(key)
+        if answer is None or (found_key != key and not answer.complete):
+            versions = inline_cache.versions()
+            answer = await search(words, context.bot.username)
+            inline_cache.put(key, answer, versions)
+        elif found_key != key:
+            answer = InlineAnswer(tuple(hit for hit in answer.hits if matches(words, hit.words)),
+                                  True)
+            inline_cache.put(key, answer, inline_cache.versions())
+
+        offset = int(query.offset) if query.offset.isdigit() else 0
+        page = answer.hits[offset:offset + INLINE_PAGE_SIZE]
+        next_offset = (str(offset + INLINE_PAGE_SIZE)
+                       if offset + INLINE_PAGE_SIZE < len(answer.hits) else "")
+        await query.answer([hit.result for hit in page], cache_time=INLINE_CACHE_TIME,
+                           next_offset=next_offset)
+
+    except Exception as e:
+        logger.error(f"Ошибка в inline_query: {e}")
+        metrics.error("inline_query")
+        await query.answer([], cache_time=0)
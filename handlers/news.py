@@ -1,156 +1,255 @@
-import sqlite3
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import NamedTuple
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import CommandHandler, MessageHandler, Filters, ConversationHandler
-from config import DB_PATH, IMAGE_DIR, ADMIN_ID, WAIT_IMAGE, WAIT_TITLE, WAIT_CONTENT
+from telegram.error import BadRequest
+from telegram.ext import CommandHandler, MessageHandler, filters, ConversationHandler
+from config import (IMAGE_DIR, ADMIN_ID, WAIT_IMAGE, WAIT_TITLE, WAIT_CONTENT, WAIT_PUBLISH,
+                    PUBLISH_TIME_FORMAT)
+from database import (News, get_news_page, get_news_by_id, insert_news, remove_news,
+                      fts_query, search_news, create_broadcast, set_subscription,
+                      is_subscribed,
+                      save_news_image_file_id)
+from runtime import run_blocking, read_file
+from cache import render_cache, cached_view
+from keyboards import back_button
+from manifest import manifest
+import images
+import screens
+import metrics
+import usage
 
 
 logger = logging.getLogger(__name__)
 
 
-def get_all_news():
-    """Получаем все новости из БД"""
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, title, content, image_path, date FROM news ORDER BY date DESC"
-            )
-            return cursor.fetchall()
-    except Exception as e:
-        logger.error(f"Ошибка получения новостей: {str(e)}")
-        return []
+class NewsDetailView(NamedTuple):
+    news: News
+    text: str
+    keyboard: tuple  # Общие для всех кнопки, без админских
+    markup: InlineKeyboardMarkup
+
+
+def render_news_menu(before_id=None, after_id=None):
+    """Строим текст и клавиатуру страницы меню новостей"""
+    page = get_news_page(before_id=before_id, after_id=after_id)
+    if not page.items and (before_id or after_id):
+        # Якорная новость могла быть удалена - показываем первую страницу
+        page = get_news_page()
+
+    if not page.items:
+        return "📭 Новостей пока нет", None
+
+    keyboard = []
+    for item in page.items:
+        btn_text = f"📰 {item.title} ({item.date_label})"
+
+        keyboard.append([
+            InlineKeyboardButton(
+            btn_text,
+            callback_data=f"news_item:{item.id}"
+        )])
+
+    # Навигация по страницам
+    nav = []
+    if page.prev_id is not None:
+        nav.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"news_newer:{page.prev_id}"))
+    if page.next_id is not None:
+        nav.append(InlineKeyboardButton("Старее ➡️", callback_data=f"news_older:{page.next_id}"))
+    if nav:
+        keyboard.append(nav)
+
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
+    return "📢 Выберите новость:", InlineKeyboardMarkup(keyboard)
+
+
+def format_news(news):
+    """Текст новости для parse_mode="HTML" (экран новости и inline-режим)"""
+    formatted_date = datetime.strptime(news.date, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y %H:%M")
+    return f"<b>{news.title}</b>\n\n{news.content}\n\n<em>{formatted_date}</em>"
+
+
+def render_news_detail(news_id):
+    """Строим экран новости (без кнопок, зависящих от пользователя)"""
+    news = get_news_by_id(news_id)
+    if not news:
+        return None
+
+    text = format_news(news)
+
+    keyboard = (
+        (InlineKeyboardButton("📰 К списку новостей", callback_data="news"),),
+        (InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main"),),
+    )
+    return NewsDetailView(news, text, keyboard, InlineKeyboardMarkup(keyboard))
+
+
+async def show_news_menu(update, context, before_id=None, after_id=None):
+    """Отображает страницу меню новостей"""
+    query = update.callback_query
+    await query.answer()
 
-def get_news_by_id(news_id):
-    """Получение конкретной новости"""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT title, content, image_path, date FROM news WHERE id = ?", (news_id,))
-            return cursor.fetchone()
+        text, markup = await cached_view(
+            "news", ("menu", before_id, after_id), render_news_menu, before_id, after_id)
+        # Возврат к списку бывает и из-под фото новости
+        await screens.show_text(update, context, text, reply_markup=markup)
+
     except Exception as e:
-        logger.error(f"Ошибка получения новости {news_id}: {str(e)}")
-        return None
+        logger.error(f"Ошибка в show_news_menu: {str(e)}")
+        metrics.error("show_news_menu")
+        await screens.show_caption(update, context, "❌ Ошибка загрузки меню")
 
-def show_news_menu(update, context):
-    """Отображает меню новостей"""
+
+async def show_news_detail(update, context, news_id):
+    """Показ полной новости"""
     query = update.callback_query
-    query.answer()
+    await query.answer()
 
     try:
-        news_items = get_all_news()
+        logger.debug("Загружаем новость ID: %s", news_id)
 
-        if not news_items:
-            query.edit_message_text("📭 Новостей пока нет")
+        view = await cached_view("news", ("detail", int(news_id)), render_news_detail, news_id)
+
+        if not view:
+            await screens.show_text(update, context, "❌ Новость не найдена",
+                                    reply_markup=back_button())
             return
 
-        keyboard = []
-        for news_id, title, _, _, date in news_items:
-            formatted_date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
-            btn_text = f"📰 {title} ({formatted_date})"
+        news, text, markup = view.news, view.text, view.markup
+        usage.counters.hit(usage.NEWS, news.id)
 
-            keyboard.append([
-                InlineKeyboardButton(
-                btn_text,
-                callback_data=f"news_{news_id}"  # Унифицированный префикс
-            )])
+        # Кнопка удаления добавляется для каждого админа отдельно, в кэш не попадает
+        if query.from_user.id == ADMIN_ID:
+            markup = InlineKeyboardMarkup(view.keyboard + (
+                (InlineKeyboardButton("❌ Удалить", callback_data=f"confirm_delete:{news_id}"),),
+            ))
 
-        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
+        image_file = os.path.join(IMAGE_DIR, news.image_path) if news.image_path else None
+        fingerprint = manifest.fingerprint(image_file) if image_file else None
 
-        query.edit_message_text(
-            "📢 Выберите новость:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        # Сообщение правится на месте; новое отправляется, только если
+        # текст нужно сменить на фото или наоборот
+        if fingerprint:
+            await show_news_photo(update, context, news, image_file, fingerprint,
+                                  caption=text, parse_mode="HTML", reply_markup=markup)
+        else:
+            await screens.show_text(update, context, text, parse_mode="HTML", reply_markup=markup)
 
     except Exception as e:
-        logger.error(f"Ошибка в show_news_menu: {str(e)}")
-        query.edit_message_text("❌ Ошибка загрузки меню")
+        logger.error(f"Ошибка в show_news_detail: {str(e)}")
+        metrics.error("show_news_detail")
+        await screens.show_caption(update, context, "❌ Ошибка загрузки новости",
+                                   reply_markup=back_button())
 
 
-def show_news_detail(update, context, news_id):
-    """Показ полной новости"""
-    query = update.callback_query
-    query.answer()
+def render_search_results(match, page):
+    """Строим страницу результатов поиска"""
+    items, has_more = search_news(match, page)
+    if not items and page == 0:
+        return "🔍 Ничего не найдено", back_button()
+
+    keyboard = [
+        [InlineKeyboardButton(f"📰 {item.title} ({item.date_label})",
+                              callback_data=f"news_item:{item.id}")]
+        for item in items
+    ]
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"search:{page - 1}"))
+    if has_more:
+        nav.append(InlineKeyboardButton("Дальше ➡️", callback_data=f"search:{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+
+    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")])
+    return "🔍 Результаты поиска:", InlineKeyboardMarkup(keyboard)
 
+
+async def search_command(update, context):
+    """/search <текст> - поиск по новостям"""
     try:
-        logger.info(f"Пытаемся загрузить новость ID: {news_id}")  # Логируем
-
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            logger.info(f"Выполняем запрос для news_id={news_id}")
-            cursor.execute(
-                "SELECT title, content, image_path, date FROM news WHERE id = ?",
-                (news_id,))
-            news = cursor.fetchone()
-            logger.info(f"Результат запроса: {news}")  # Логируем результат
-
-            if not news:
-                # Используем новое сообщение вместо редактирования
-                context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text="❌ Новость не найдена"
-                )
-                return
-
-            title, content, image_path, date = news
-            formatted_date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y %H:%M")
-            text = f"<b>{title}</b>\n\n{content}\n\n<em>{formatted_date}</em>"
-
-            keyboard = [
-                [InlineKeyboardButton("📰 К списку новостей", callback_data="news")],
-                [InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")]
-            ]
+        match = fts_query(" ".join(context.args))
+        if match is None:
+            await update.message.reply_text("🔍 Напишите, что искать, например: /search выставка")
+            return
 
-            if query.from_user.id == ADMIN_ID:
-                keyboard.append(
-                    [InlineKeyboardButton("❌ Удалить", callback_data=f"confirm_delete_{news_id}")]
-                )
-
-            if image_path and os.path.exists(os.path.join(IMAGE_DIR, image_path)):
-                with open(os.path.join(IMAGE_DIR, image_path), 'rb') as img:
-                    context.bot.send_photo(
-                        chat_id=query.message.chat_id,
-                        photo=img,
-                        caption=text,
-                        parse_mode="HTML",
-                        reply_markup=InlineKeyboardMarkup(keyboard)
-                    )
-            else:
-                context.bot.send_message(
-                    chat_id=query.message.chat_id,
-                    text=text,
-                    parse_mode="HTML",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-           # Пытаемся удалить предыдущее сообщение (не обязательно)
-            try:
-                context.bot.delete_message(
-                    chat_id=query.message.chat_id,
-                    message_id=query.message.message_id
-                )
-            except Exception as e:
-                logger.warning(f"Не удалось удалить сообщение: {e}")
+        # Запрос храним у пользователя: в callback_data он может не поместиться
+        context.user_data['search_query'] = match
+        text, markup = await cached_view(
+            "news", ("search", match, 0), render_search_results, match, 0)
+        await update.message.reply_text(text, reply_markup=markup)
 
     except Exception as e:
-        logger.error(f"Ошибка в show_news_detail: {str(e)}")
-        query.edit_message_text("❌ Ошибка загрузки новости")
+        logger.error(f"Ошибка в search_command: {e}")
+        metrics.error("search_command")
+        await update.message.reply_text("❌ Ошибка поиска")
 
 
-def add_news(update, context):
+async def show_search_page(update, context, page):
+    """Переход по страницам результатов поиска"""
+    query = update.callback_query
+    await query.answer()
+
+    match = context.user_data.get('search_query')
+    if not match:
+        await query.edit_message_text("🔍 Запрос устарел, повторите поиск: /search текст",
+                                      reply_markup=back_button())
+        return
+
+    try:
+        text, markup = await cached_view(
+            "news", ("search", match, page), render_search_results, match, page)
+        await query.edit_message_text(text, reply_markup=markup)
+
+    except Exception as e:
+        logger.error(f"Ошибка в show_search_page: {e}")
+        metrics.error("show_search_page")
+        await query.edit_message_text("❌ Ошибка поиска")
+
+
+async def show_search_help(update, context):
+    """Кнопка поиска в главном меню"""
+    await update.callback_query.edit_message_text(
+        "🔍 Чтобы найти новость, отправьте команду /search и слова для поиска.\n"
+        "Например: /search выставка",
+        reply_markup=back_button()
+    )
+
+
+async def show_news_photo(update, context, news, image_file, fingerprint, **kwargs):
+    """Показываем изображение новости: по file_id, если файл не менялся,
+    иначе загружаем с диска и запоминаем полученный file_id."""
+    if news.image_file_id and news.image_fingerprint == fingerprint:
+        try:
+            return await screens.show_photo(update, context, news.image_file_id, **kwargs)
+        except BadRequest as e:
+            logger.warning(f"file_id новости {news.id} отклонен: {e}")
+
+    data = await run_blocking(read_file, image_file)
+    message = await screens.show_photo(update, context, data,
+                                       filename=os.path.basename(image_file), **kwargs)
+    await run_blocking(save_news_image_file_id, news.id, message.photo[-1].file_id, fingerprint)
+    # В кэше экрана остался старый file_id - перечитаем новость при следующем показе
+    render_cache.discard("news", ("detail", news.id))
+    return message
+
+
+async def add_news(update, context):
     """Обработчик начала добавления новости"""
     try:
         # Получаем сообщение в зависимости от типа вызова
         if update.callback_query:
             message = update.callback_query.message
-            update.callback_query.answer()
+            await update.callback_query.answer()
         else:
             message = update.message
 
         # Проверка прав администратора
         if update.effective_user.id != ADMIN_ID:
-            context.bot.send_message(
+            await context.bot.send_message(
                 chat_id=message.chat_id,
                 text="❌ У вас нет прав админа!"
             )
@@ -160,7 +259,7 @@ def add_news(update, context):
         context.user_data.clear()
 
         # Запрос изображения
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=message.chat_id,
             text="Пришлите изображение для новости (или /skip чтобы пропустить)",
             reply_markup=ReplyKeyboardRemove()
@@ -169,155 +268,213 @@ def add_news(update, context):
 
     except Exception as e:
         logger.error(f"Ошибка в add_news: {e}")
+        metrics.error("add_news")
         return ConversationHandler.END
 
 
 
-def handle_image(update, context):
+async def handle_image(update, context):
     """Обработка изображения"""
     try:
         if update.message.text == "/skip":
             context.user_data['news_image'] = None
-            update.message.reply_text("📝 Введите заголовок новости:")
+            await update.message.reply_text("📝 Введите заголовок новости:")
             return WAIT_TITLE
 
         if update.message.photo:
-            photo = update.message.photo[-1]
-            file = photo.get_file()
-            filename = f"news_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-            os.makedirs(IMAGE_DIR, exist_ok=True)
-            file.download(os.path.join(IMAGE_DIR, filename))
-            context.user_data['news_image'] = filename
-            update.message.reply_text("✅ Изображение сохранено! Введите заголовок:")
+            # Загрузка и обработка идут в фоне, пока админ вводит заголовок и текст
+            context.user_data['news_image'] = images.start_ingest(
+                context.bot, update.message.photo[-1])
+            await update.message.reply_text("✅ Изображение получено! Введите заголовок:")
             return WAIT_TITLE
 
-        update.message.reply_text("Пожалуйста, отправьте изображение или /skip")
+        await update.message.reply_text("Пожалуйста, отправьте изображение или /skip")
         return WAIT_IMAGE
 
     except Exception as e:
         logger.error(f"Ошибка в handle_image: {e}")
+        metrics.error("handle_image")
 
-    update.message.reply_text("Отправьте изображение или /skip")
+    await update.message.reply_text("Отправьте изображение или /skip")
     return WAIT_IMAGE
 
 
-def save_news(update, context):
+async def subscribe_command(update, context):
+    """/subscribe - получать новые новости"""
+    await run_blocking(set_subscription, update.effective_chat.id, True)
+    await update.message.reply_text("🔔 Вы подписались на новости. Отписаться: /unsubscribe")
+
+
+async def unsubscribe_command(update, context):
+    """/unsubscribe - больше не получать новости"""
+    await run_blocking(set_subscription, update.effective_chat.id, False)
+    await update.message.reply_text("🔕 Вы отписались от новостей.")
+
+
+async def toggle_subscription(update, context):
+    """Кнопка подписки в главном меню"""
+    chat_id = update.effective_chat.id
+    subscribed = not await run_blocking(is_subscribed, chat_id)
+    await run_blocking(set_subscription, chat_id, subscribed)
+    await update.callback_query.answer(
+        "🔔 Вы подписались на новости" if subscribed else "🔕 Вы отписались от новостей")
+
+
+async def save_news(update, context):
     """Сохранение заголовка"""
     try:
         context.user_data['news_title'] = update.message.text
-        update.message.reply_text("📝 Теперь введите текст новости:")
+        await update.message.reply_text("📝 Теперь введите текст новости:")
         return WAIT_CONTENT
     except Exception as e:
         logger.error(f"Ошибка в save_news: {e}")
+        metrics.error("save_news")
         return ConversationHandler.END
 
 
-def finish_news(update, context):
-    """Финальное сохранение"""
-    conn = None
+async def save_content(update, context):
+    """Сохранение текста и вопрос о времени публикации"""
+    context.user_data['news_content'] = update.message.text
+    await update.message.reply_text(
+        "🕒 Когда опубликовать? /now - сейчас, или время: 09:00 (ближайшие сегодня или "
+        "завтра), 25.12.2026 09:00")
+    return WAIT_PUBLISH
+
+
+def parse_publish_time(text, now=None):
+    """Время публикации из ответа админа: "дд.мм.гггг чч:мм" или "чч:мм".
+
+    Только время - ближайшее такое: сегодня, а если уже прошло - завтра.
+    None - не удалось разобрать.
+    """
+    now = now or datetime.now()
+    text = " ".join(text.split())
+    try:
+        return datetime.strptime(text, PUBLISH_TIME_FORMAT)
+    except ValueError:
+        pass
     try:
-        if 'news_title' not in context.user_data:
-            update.message.reply_text("❌ Ошибка: не указан заголовок")
+        clock = datetime.strptime(text, "%H:%M").time()
+    except ValueError:
+        return None
+    publish_at = datetime.combine(now.date(), clock)
+    return publish_at if publish_at > now else publish_at + timedelta(days=1)
+
+
+async def finish_news(update, context):
+    """Время публикации и финальное сохранение"""
+    publish_at = None
+    if update.message.text != "/now":
+        publish_at = parse_publish_time(update.message.text)
+        if publish_at is None:
+            await update.message.reply_text(
+                "❌ Не удалось разобрать время. Пример: 25.12.2026 09:00 или 09:00, сейчас - /now")
+            return WAIT_PUBLISH
+        if publish_at <= datetime.now():
+            await update.message.reply_text("❌ Это время уже прошло. Укажите другое или /now")
+            return WAIT_PUBLISH
+
+    try:
+        if 'news_title' not in context.user_data or 'news_content' not in context.user_data:
+            await update.message.reply_text("❌ Ошибка: не указан заголовок или текст")
             return ConversationHandler.END
 
-        # Подключение к БД
-        conn = sqlite3.connect("news_images/bot.db")
-        cursor = conn.cursor()
-
-        # Сохранение в БД
-        cursor.execute(
-            "INSERT INTO news (title, content, image_path, date) VALUES (?, ?, ?, ?)",
-            (
-                context.user_data['news_title'],
-                update.message.text,
-                context.user_data.get('news_image'),
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            )
+        image = None
+        if context.user_data.get('news_image'):
+            image = await images.resolve(context.bot, context.user_data['news_image'])
+
+        # Сохранение в БД; запланированная новость скрыта до publish_at
+        date = (publish_at or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        news_id = await run_blocking(
+            insert_news,
+            context.user_data['news_title'],
+            context.user_data['news_content'],
+            date,
+            image,
+            date if publish_at else None
         )
-        conn.commit()
-        update.message.reply_text("✅ Новость успешно добавлена!")
+
+        if publish_at:
+            # Публикацию и рассылку запустит publisher.py в назначенное время
+            publisher = context.bot_data.get("publisher")
+            if publisher:
+                publisher.schedule(news_id, publish_at)
+            await update.message.reply_text(
+                f"⏰ Новость будет опубликована {publish_at.strftime(PUBLISH_TIME_FORMAT)}")
+            return ConversationHandler.END
+
+        render_cache.bump("news")
+        await update.message.reply_text("✅ Новость успешно добавлена!")
+
+        # Рассылка подписчикам идет в фоне, диалог ее не ждет
+        await run_blocking(create_broadcast, news_id)
+        broadcaster = context.bot_data.get("broadcaster")
+        if broadcaster:
+            broadcaster.notify()
 
     except Exception as e:
         logger.error(f"Ошибка сохранения: {e}")
-        update.message.reply_text("❌ Ошибка при сохранении")
+        metrics.error("finish_news")
+        await update.message.reply_text("❌ Ошибка при сохранении")
 
     finally:
-        if 'conn' in locals():
-            conn.close()
         context.user_data.clear()
 
     return ConversationHandler.END
 
 
-def cancel(update, context):
+async def cancel(update, context):
     """Отмена добавления новости"""
-    update.message.reply_text("❌ Добавление новости отменено.")
+    await update.message.reply_text("❌ Добавление новости отменено.")
     # Очищаем временные данные
-    context.user_data.pop('news_image', None)
+    pending_image = context.user_data.pop('news_image', None)
     context.user_data.pop('news_title', None)
+    context.user_data.pop('news_content', None)
+    if pending_image:
+        # Дожидаться загрузки не нужно: файл удалится, когда она закончится
+        context.application.create_task(images.discard(context.bot, pending_image))
     return ConversationHandler.END
 
 
-def delete_news(update, context):
+async def delete_news(update, context, news_id):
     """Удаление новости"""
     query = update.callback_query
-    news_id = query.data.split('_')[1]
 
     if query.from_user.id != ADMIN_ID:
-        query.answer("🚫 Недостаточно прав!")
+        await query.answer("🚫 Недостаточно прав!")
         return
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-
-            # Получаем путь к изображению
-            cursor.execute("SELECT image_path FROM news WHERE id = ?", (news_id,))
-            result = cursor.fetchone()
-
-            if result and result[0]:
-                image_path = os.path.join(IMAGE_DIR, result[0])
-                if os.path.exists(image_path):
-                    os.remove(image_path)
+        # Удаляем запись из БД, затем файлы, на которые больше никто не ссылается
+        unused_files = await run_blocking(remove_news, news_id)
+        render_cache.bump("news")
+        await images.remove_files(unused_files)
 
-            # Удаляем запись из БД
-            cursor.execute("DELETE FROM news WHERE id = ?", (news_id,))
-            conn.commit()
-
-        query.answer("✅ Новость удалена")
-        show_news_menu(update, context)
+        await query.answer("✅ Новость удалена")
+        await show_news_menu(update, context)
 
     except Exception as e:
         logger.error(f"Ошибка удаления новости: {str(e)}")
-        query.answer("❌ Ошибка при удалении")
+        metrics.error("delete_news")
+        await query.answer("❌ Ошибка при удалении")
 
 
-def confirm_delete(update, context):
+async def confirm_delete(update, context, news_id):
     """Подтверждение удаления новости"""
     query = update.callback_query
-    news_id = query.data.split('_')[2]
 
-    # Отправляем сообщение с подтверждением
-    context.bot.send_message(
-        chat_id=query.message.chat_id,
-        text="⚠️ Вы уверены, что хотите удалить эту новость?",
+    # Вопрос - в том же сообщении (у фото новости - в подписи)
+    await screens.show_caption(
+        update, context,
+        "⚠️ Вы уверены, что хотите удалить эту новость?",
         reply_markup=InlineKeyboardMarkup([
             [
-                InlineKeyboardButton("✅ Да", callback_data=f"delete_{news_id}"),
-                InlineKeyboardButton("❌ Нет", callback_data=f"show_news_{news_id}")
+                InlineKeyboardButton("✅ Да", callback_data=f"delete_news:{news_id}"),
+                InlineKeyboardButton("❌ Нет", callback_data=f"news_item:{news_id}")
             ]
         ])
     )
 
-    # Удаляем предыдущее сообщение
-    try:
-        context.bot.delete_message(
-            chat_id=query.message.chat_id,
-            message_id=query.message.message_id
-        )
-    except:
-        pass
-
 
 # --- Регистрация обработчиков ---
 def setup_news_handlers(dp):
@@ -330,9 +487,11 @@ def setup_news_handlers(dp):
         conv_handler = ConversationHandler(
             entry_points=[CommandHandler('add_news', add_news)],
             states={
-                WAIT_IMAGE: [MessageHandler(Filters.photo | (Filters.text & ~Filters.command), handle_image)],
-                WAIT_TITLE: [MessageHandler(Filters.text & ~Filters.command, save_news)],
-                WAIT_CONTENT: [MessageHandler(Filters.text & ~Filters.command, finish_news)]
+                WAIT_IMAGE: [MessageHandler(filters.PHOTO | (filters.TEXT & ~filters.COMMAND), handle_image)],
+                WAIT_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_news)],
+                WAIT_CONTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_content)],
+                WAIT_PUBLISH: [MessageHandler(filters.TEXT & ~filters.COMMAND, finish_news),
+                               CommandHandler('now', finish_news)]
             },
             fallbacks=[CommandHandler('cancel', cancel)]
         )
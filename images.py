@@ -0,0 +1,173 @@
+# images.py
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from config import IMAGE_DIR, IMAGE_WORKERS, IMAGE_PREVIEW_SIZE
+from database import StoredImage, register_image, release_image
+from manifest import manifest
+"""Хранилище изображений новостей.
+
+Файл называется по sha256 содержимого, поэтому одинаковые картинки хранятся
+один раз, а загрузки в одну секунду не перезаписывают друг друга. Хэширование,
+запись на диск и превью выполняются в отдельном пуле потоков, чтобы не
+занимать пул для запросов к БД.
+"""
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow не обязателен: без него просто не будет превью
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = "previews"
+# Имена файлов, которые пишет store(): sha256 содержимого (и превью с тем же именем)
+_STORED_NAME = re.compile(rf"(?:{PREVIEW_DIR}/)?[0-9a-f]{{64}}\.jpg")
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="images")
+_tasks = {}  # file_unique_id -> asyncio.Task, загрузки до их resolve()
+_KEEP_TASKS = 64  # Сколько завершенных загрузок помнить (брошенные черновики)
+
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args))
+
+
+def _write_atomic(path, data):
+    """Пишем во временный файл и переименовываем: читатели не увидят половину файла"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _make_preview(source, target):
+    """Уменьшенная копия, возвращает размеры оригинала (или None без Pillow)"""
+    if Image is None:
+        return None, None
+    try:
+        with Image.open(source) as image:
+            size = image.size
+            if not os.path.exists(target):
+                image = image.convert("RGB")
+                image.thumbnail((IMAGE_PREVIEW_SIZE, IMAGE_PREVIEW_SIZE))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = target + ".tmp"
+                image.save(tmp_path, "JPEG", quality=80)
+                os.replace(tmp_path, target)
+            return size
+    except OSError as e:
+        logger.warning(f"Не удалось сделать превью {source}: {e}")
+        return None, None
+
+
+def store(data, width=None, height=None):
+    """Сохраняем изображение в хранилище (блокирующая, вызывать через пул).
+
+    width/height - размеры от Telegram, если Pillow не установлен.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = f"{digest}.jpg"
+    full_path = os.path.join(IMAGE_DIR, path)
+    if not os.path.exists(full_path):
+        _write_atomic(full_path, data)
+    entry = manifest.add(full_path, digest)
+
+    preview_path = None
+    if Image is not None:
+        preview_path = f"{PREVIEW_DIR}/{digest}.jpg"
+        real_width, real_height = _make_preview(full_path, os.path.join(IMAGE_DIR, preview_path))
+        if real_width is None:
+            preview_path = None
+        else:
+            width, height = real_width, real_height
+            manifest.add(os.path.join(IMAGE_DIR, preview_path))
+
+    image = StoredImage(path, digest, preview_path, width, height, len(data),
+                        fingerprint=entry.fingerprint)
+    register_image(image)
+    return image
+
+
+async def _ingest(bot, file_id, width, height):
+    file = await bot.get_file(file_id)
+    data = await file.download_as_bytearray()
+    return await _run(store, bytes(data), width, height)
+
+
+def start_ingest(bot, photo):
+    """Запускаем загрузку фото в фоне, обработчик диалога ее не ждет.
+
+    Возвращает словарь для user_data: по нему resolve() найдет результат.
+    """
+    key = photo.file_unique_id
+    if key not in _tasks:
+        task = asyncio.create_task(_ingest(bot, photo.file_id, photo.width, photo.height))
+        _tasks[key] = task
+        # Завершенная загрузка ждет resolve(): админ вводит текст дольше, чем она идет
+        for old_key in [old_key for old_key, old in _tasks.items() if old.done()][:-_KEEP_TASKS]:
+            del _tasks[old_key]
+    return {"file_id": photo.file_id, "unique_id": key,
+            "width": photo.width, "height": photo.height}
+
+
+async def resolve(bot, pending):
+    """Дожидаемся загрузки, начатой start_ingest.
+
+    Если задачи нет (фото принял другой процесс или бот перезапускался), загружаем
+    заново - одинаковое содержимое попадет в тот же файл. file_id админской
+    загрузки сохраняем: рассылка отправит фото без повторной загрузки.
+    """
+    task = _tasks.pop(pending["unique_id"], None)
+    if task is not None:
+        image = await asyncio.shield(task)
+    else:
+        image = await _ingest(bot, pending["file_id"], pending["width"], pending["height"])
+    return image._replace(file_id=pending["file_id"])
+
+
+def is_stored(path):
+    """Файл (относительно IMAGE_DIR) записан хранилищем, а не положен вручную"""
+    return _STORED_NAME.fullmatch(path.replace(os.sep, "/")) is not None
+
+
+def _remove_files(paths):
+    for path in paths:
+        full_path = os.path.join(IMAGE_DIR, path)
+        manifest.discard(full_path)
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+
+
+async def remove_files(paths):
+    """Удаляем файлы, на которые больше не ссылается ни одна новость"""
+    if paths:
+        await _run(_remove_files, paths)
+
+
+async def discard(bot, pending):
+    """Отмена диалога: удаляем загруженное изображение, если оно не пригодилось"""
+    try:
+        image = await resolve(bot, pending)
+    except Exception as e:
+        logger.warning(f"Загрузка изображения не удалась: {e}")
+        return
+    await remove_files(await _run(release_image, image.path))
+
+
+def shutdown():
+    """Дожидаемся записи файлов (вызывается при остановке бота)"""
+    _executor.shutdown()
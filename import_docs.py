@@ -0,0 +1,215 @@
+# import_docs.py
+"""Импорт документов из каталога в базу.
+
+Дерево обходится лениво, файлы обрабатываются пачками: хэши считает пул
+процессов, каждая пачка записывается одной транзакцией (executemany).
+Файлы с теми же размером и mtime, что при прошлом импорте, не читаются -
+повторный запуск на неизмененном дереве сводится к обходу каталога и
+одному SELECT. Каждый файл - отдельный документ, даже если его содержимое
+совпадает с уже импортированным (у него может быть другое название и тип);
+такие файлы перечисляются в отчете.
+
+Тип документа берется из DOC_TYPE_RULES по именам папок, затем по имени
+файла; файлы без типа пропускаются (или получают --type).
+
+После импорта извлекается текст новых и измененных .docx (см. doc_index),
+если не указан --no-text. Перезапускать бота не нужно: запись документов и
+текста поднимает счетчик 'docs' в data_versions, и кэш экранов бота
+сверяется с ним (раз в RENDER_CACHE_SYNC_INTERVAL).
+
+Запуск из корня проекта:
+    python import_docs.py docs
+    python import_docs.py /srv/forms --type template --prune
+"""
+import argparse
+import hashlib
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (DOCS_DIR, DOC_EXTENSIONS, DOC_TYPE_RULES, IMPORT_BATCH_SIZE,
+                    IMPORT_WORKERS)
+from database import init_db, get_document_states, upsert_documents, remove_documents
+import doc_index
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """sha256 содержимого (выполняется в процессе пула). None - файл не прочитать."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            while chunk := file.read(CHUNK_SIZE):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def walk(root, extensions=DOC_EXTENSIONS):
+    """Лениво отдаем (путь, stat) файлов документов, каталоги - по алфавиту."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.lower().endswith(extensions) and entry.is_file():
+                yield entry.path, entry.stat()
+        stack.extend(reversed(subdirs))
+
+
+def infer_type(root, path, rules=DOC_TYPE_RULES):
+    """Тип по ближайшей папке с подходящим именем, затем по имени файла"""
+    parts = os.path.relpath(path, root).lower().split(os.sep)
+    for part in reversed(parts[:-1]):
+        for doc_type, keywords in rules:
+            if any(keyword in part for keyword in keywords):
+                return doc_type
+    for doc_type, keywords in rules:
+        if any(keyword in parts[-1] for keyword in keywords):
+            return doc_type
+    return None
+
+
+def document_name(path):
+    """Название для кнопки: имя файла без расширения и подчеркиваний"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = " ".join(stem.replace("_", " ").replace("-", " ").split())
+    return name[:1].upper() + name[1:]
+
+
+class Importer:
+    def __init__(self, root, default_type=None, batch_size=IMPORT_BATCH_SIZE,
+                 workers=IMPORT_WORKERS):
+        self.root = os.path.normpath(root)
+        self.default_type = default_type
+        self.batch_size = batch_size
+        self.workers = workers
+        self.stats = Counter()
+        self._pool = None
+        self._known = {}
+        self._hashes = set()
+        self.same_content = []  # Файлы с тем же содержимым, что у другого документа
+
+    def run(self, prune=False):
+        self._known = get_document_states()
+        self._hashes = {state.hash for state in self._known.values() if state.hash}
+        seen = set()
+        batch = []
+        try:
+            for path, st in walk(self.root):
+                self.stats["files"] += 1
+                seen.add(path)
+                state = self._known.get(path)
+                if (state is not None and state.hash and state.size == st.st_size
+                        and state.mtime_ns == st.st_mtime_ns):
+                    self.stats["unchanged"] += 1
+                    continue
+                doc_type = infer_type(self.root, path) or self.default_type
+                if doc_type is None:
+                    self.stats["untyped"] += 1
+                    continue
+                batch.append((path, st, doc_type))
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            if batch:
+                self._flush(batch)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+        if prune:
+            prefix = self.root + os.sep
+            missing = [path for path in self._known
+                       if path.startswith(prefix) and path not in seen]
+            remove_documents(missing)
+            self.stats["removed"] = len(missing)
+        return self.stats
+
+    def _flush(self, batch):
+        # Пул нужен только если есть что хэшировать: повторный запуск его не поднимает
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        paths = [path for path, _, _ in batch]
+        chunksize = max(1, len(paths) // ((self.workers or os.cpu_count() or 1) * 4))
+        rows = []
+        for (path, st, doc_type), file_hash in zip(
+                batch, self._pool.map(hash_file, paths, chunksize=chunksize)):
+            if file_hash is None:
+                self.stats["errors"] += 1
+                continue
+            self.stats["bytes"] += st.st_size
+            state = self._known.get(path)
+            if state is not None:
+                self.stats["changed" if state.hash != file_hash else "touched"] += 1
+            else:
+                self.stats["new"] += 1
+                if file_hash in self._hashes:
+                    # Не пропускаем: одинаковые байты еще не значат один и тот же документ
+                    self.stats["same_content"] += 1
+                    self.same_content.append(path)
+            self._hashes.add(file_hash)
+            rows.append((document_name(path), doc_type, path, file_hash, st.st_size,
+                         st.st_mtime_ns))
+        upsert_documents(rows)
+
+
+def report(stats, elapsed, same_content=(), limit=10):
+    print(f"Файлов: {stats['files']}, новых {stats['new']}, изменено {stats['changed']}, "
+          f"только mtime {stats['touched']}, без изменений {stats['unchanged']}")
+    print(f"Пропущено: без типа {stats['untyped']}, "
+          f"ошибки чтения {stats['errors']}, удалено из базы {stats['removed']}")
+    if same_content:
+        print(f"⚠️ Содержимое совпадает с другим документом ({len(same_content)}), импортированы:")
+        for path in same_content[:limit]:
+            print(f"  {path}")
+    elapsed = max(elapsed, 1e-9)
+    print(f"Время: {elapsed:.2f} с, {stats['files'] / elapsed:.0f} файлов/с, "
+          f"хэшировано {stats['bytes'] / 2**20:.1f} МиБ ({stats['bytes'] / 2**20 / elapsed:.1f} МиБ/с)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", nargs="?", default=DOCS_DIR, help="Каталог с документами")
+    parser.add_argument("--type", dest="default_type",
+                        help="Тип для файлов, не подошедших под DOC_TYPE_RULES")
+    parser.add_argument("--batch", type=int, default=IMPORT_BATCH_SIZE,
+                        help="Файлов в одной транзакции")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS,
+                        help="Процессов для хэширования")
+    parser.add_argument("--prune", action="store_true",
+                        help="Удалить из базы документы, файлов которых в каталоге больше нет")
+    parser.add_argument("--no-text", action="store_true",
+                        help="Не извлекать текст (это сделает бот в фоне)")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.perf_counter()
+    importer = Importer(args.root, args.default_type, args.batch, args.workers)
+    stats = importer.run(args.prune)
+    report(stats, time.perf_counter() - started, importer.same_content)
+
+    if not args.no_text:
+        started = time.perf_counter()
+        try:
+            changed = doc_index.refresh()
+        finally:
+            doc_index.shutdown()
+        print(f"Текст извлечен из {changed} документов за {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ def main_menu(user_id=False):
         [InlineKeyboardButton("📄 Документы", callback_data="docs")],
         [InlineKeyboardButton("📞 Контакты", callback_data="contacts")],
         [InlineKeyboardButton("📢 Новости", callback_data="news")],
+        [InlineKeyboardButton("🔍 Поиск", callback_data="search_help")],
+        [InlineKeyboardButton("🔔 Подписка на новости", callback_data="subscribe")],
         [InlineKeyboardButton("❓ Помощь", callback_data="help")]
     ]
 
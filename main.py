@@ -1,13 +1,37 @@
 # main.py
+import asyncio
 import logging
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup
-from telegram.ext import (Updater, CommandHandler, CallbackQueryHandler,
-                          ConversationHandler, MessageHandler, Filters)
+from telegram.ext import (Application, CommandHandler, CallbackQueryHandler,
+                          ConversationHandler, InlineQueryHandler, MessageHandler, filters)
 from keyboards import main_menu, back_button
-from config import BOT_TOKEN, ADMIN_ID, WAIT_IMAGE, WAIT_TITLE, WAIT_CONTENT
-from handlers.docs import show_docs_menu, show_documents_list, send_document
+from config import (BOT_TOKEN, ADMIN_ID, WAIT_IMAGE, WAIT_TITLE, WAIT_CONTENT, WAIT_PUBLISH,
+                    MAX_CONCURRENT_UPDATES, BOT_MODE, WEBHOOK_MAX_PENDING)
+from runtime import PerUserUpdateProcessor, run_blocking, shutdown
+from database import init_db
+from router import CallbackRouter
+from state import SQLitePersistence
+from dialogs import UserDataDialog
+from broadcast import Broadcaster
+from publisher import Publisher
+from retention import Retention
+from doc_index import DocumentIndexer
+import doc_index
+from manifest import manifest, format_audit
+from contacts import directory as contacts_directory
+import webhook
+import botapi
+import metrics
+import screens
+import usage
+from handlers.docs import (show_docs_menu, show_documents_list, send_document, docsearch_command,
+                           show_docsearch_help, deliver_document, send_bundle)
+from handlers.inline import inline_query
+from handlers.contacts import show_contacts, contacts_command, show_contact_search_page
 from handlers.news import (show_news_menu, show_news_detail, confirm_delete, delete_news,
-                           add_news, handle_image, save_news, finish_news, cancel)
+                           add_news, handle_image, save_news, save_content, finish_news, cancel,
+                           search_command, show_search_page, show_search_help,
+                           subscribe_command, unsubscribe_command, toggle_subscription)
 
 # Включаем логирование для отладки
 logging.basicConfig(
@@ -21,8 +45,13 @@ def get_persistent_keyboard():
     return ReplyKeyboardMarkup([['🏠 Главное меню']], resize_keyboard=True, persistent=True)
 
 
-def start(update, context):
+async def start(update, context):
     """Обработчик команды /start"""
+    # Ссылка "Получить файл" из inline-режима: /start doc_<id>
+    if context.args and context.args[0].startswith("doc_") and context.args[0][4:].isdigit():
+        await deliver_document(context, update.effective_chat.id, int(context.args[0][4:]))
+        return ConversationHandler.END
+
     # Сбрасываем любые состояния диалога
     if 'conversation' in context.user_data:
         del context.user_data['conversation']
@@ -30,92 +59,229 @@ def start(update, context):
     # Очищаем временные данные
     context.user_data.pop('news_image', None)
     context.user_data.pop('news_title', None)
+    context.user_data.pop('news_content', None)
 
     # Отправляем главное меню
-    update.message.reply_text(
+    await update.effective_message.reply_text(
         "Приветствую! Выберите действие:",
         reply_markup=main_menu()
     )
+    # Используется и как fallback диалога добавления новости - выходим из него
+    return ConversationHandler.END
 
 
-def button_click(update, context):
-    query = update.callback_query
-    data = query.data
-
-    if data == "start":
-        start(update, context)
-    elif data == "docs":
-        show_docs_menu(update, context)
-    elif data == "docs_application":
-        show_documents_list(update, context, "application")
-    elif data == "docs_template":
-        show_documents_list(update, context, "template")
-    elif data.startswith("file_"):
-        file_path = data.replace("file_", "")
-        send_document(update, context, file_path)
-    elif data == "contacts":
-        query.edit_message_text(
-            "📞 Контакты предприятия:\n\n"
-            "📱 Телефон: +375 (XX) XXX-XX-XX\n"
-            "✉️ Email: info@prof.by",
-            reply_markup=back_button()
-        )
-    elif data == "news":
-        show_news_menu(update, context)
-    elif data == "add_news":
-        add_news(update, context)
-    elif data.startswith("news_"):
-        news_id = data.split('_')[1]
-        show_news_detail(update, context, news_id)
-    elif data.startswith("delete_"):
-        delete_news(update, context)
-    elif data.startswith("confirm_delete_"):
-        confirm_delete(update, context)
-    elif data == "back_to_news":
-        show_news_menu(update, context)
-    elif data == "back_to_main":
-        query.edit_message_text(
-            "🔹 Главное меню:",
-            reply_markup=main_menu()
-        )
+async def show_main_menu(update, context):
+    # Кнопка есть и под фото новости - его текстом не отредактировать
+    await screens.show_text(update, context, "🔹 Главное меню:", reply_markup=main_menu())
 
 
-def main():
-    updater = Updater(BOT_TOKEN, use_context=True)
-    dp = updater.dispatcher
+async def show_help(update, context):
+    await update.callback_query.edit_message_text(
+        "❓ Выберите раздел в главном меню, чтобы открыть документы, контакты или новости.\n"
+        "/start - вернуться в главное меню",
+        reply_markup=back_button()
+    )
+
+
+# Таблица маршрутов для inline-кнопок: имя -> обработчик (и типы параметров)
+router = CallbackRouter()
+router.add("start", start)
+router.add("back_to_main", show_main_menu)
+router.add("docs", show_docs_menu)
+router.add("doclist", show_documents_list, str)
+router.add("doclist_next", lambda update, context, doc_type, anchor_id:
+           show_documents_list(update, context, doc_type, after_id=anchor_id), str, int)
+router.add("doclist_prev", lambda update, context, doc_type, anchor_id:
+           show_documents_list(update, context, doc_type, before_id=anchor_id), str, int)
+router.add("doc", send_document, int)
+router.add("docbundle", send_bundle, str)
+router.add("docsearch_help", show_docsearch_help)
+router.add("contacts", show_contacts)
+router.add("contacts_page", show_contacts, int)
+router.add("contacts_found", show_contact_search_page, int)
+router.add("help", show_help)
+router.add("news", show_news_menu)
+router.add("news_older", lambda update, context, anchor_id:
+           show_news_menu(update, context, before_id=anchor_id), int)
+router.add("news_newer", lambda update, context, anchor_id:
+           show_news_menu(update, context, after_id=anchor_id), int)
+router.add("news_item", show_news_detail, int)
+router.add("search", show_search_page, int)
+router.add("search_help", show_search_help)
+router.add("subscribe", toggle_subscription)
+router.add("add_news", add_news)
+router.add("confirm_delete", confirm_delete, int)
+router.add("delete_news", delete_news, int)
+
+
+# Кнопки, которые открывают меню и списки: их открытия попадают в /stats
+MENU_ROUTES = {"start", "back_to_main", "docs", "doclist", "doclist_next", "doclist_prev",
+               "contacts", "contacts_page", "help", "news", "news_older", "news_newer",
+               "search_help", "docsearch_help"}
+
+
+async def button_click(update, context):
+    name = (update.callback_query.data or "").partition(":")[0]
+    if name in MENU_ROUTES:
+        usage.counters.hit(usage.MENU, name)
+    await router.dispatch(update, context)
+
+
+async def route_stats(update, context):
+    """/routes - самые частые экраны и время их обработки (только для админа)"""
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    lines = ["📊 Маршруты (вызовы, ошибки, ср./макс. мс):"]
+    for name, stats in router.stats()[:20]:
+        lines.append(f"{name}: {stats.calls}, {stats.errors}, "
+                     f"{stats.avg_time * 1000:.1f}/{stats.max_time * 1000:.1f}")
+    await update.message.reply_text("\n".join(lines))
+
+
+async def stats_command(update, context):
+    """/stats - популярные новости, документы и меню (только для админа)"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ У вас нет прав админа!")
+        return
+
+    # Отчет видит и то, что еще не записано в базу
+    await usage.counters.flush()
+    await update.message.reply_text(await run_blocking(usage.build_report))
 
-    # Регистрируем обработчики команд
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(MessageHandler(Filters.regex('^🏠 Главное меню$'), start))
-    dp.add_handler(CallbackQueryHandler(button_click))
+
+async def file_report(update, context):
+    """/files - записи без файлов и изображения без записей (только для админа)"""
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    loop = asyncio.get_running_loop()
+    missing, orphans = await loop.run_in_executor(None, manifest.audit)
+    await update.message.reply_text(format_audit(missing, orphans))
+
+
+async def start_background(application):
+    """post_init: запускаем фоновые задачи"""
+    # Первый обход файлов идет в фоне; до его конца обработчики проверяют файлы по stat
+    manifest.start()
+    application.persistence.start()
+    contacts_directory.start()
+    usage.counters.start()
+    broadcaster = Broadcaster(application.bot)
+    application.bot_data["broadcaster"] = broadcaster
+    broadcaster.start()
+    publisher = Publisher(broadcaster)
+    application.bot_data["publisher"] = publisher
+    publisher.start()
+    indexer = DocumentIndexer()
+    application.bot_data["doc_indexer"] = indexer
+    indexer.start()
+    retention = application.bot_data.get("retention")
+    if retention:
+        retention.start()
+    metrics.start_server()
+
+
+async def stop_background(application):
+    """post_stop: останавливаем фоновые задачи, пока бот еще доступен"""
+    await application.bot_data["publisher"].stop()
+    await application.bot_data["broadcaster"].stop()
+    await application.bot_data["doc_indexer"].stop()
+    if application.bot_data.get("retention"):
+        await application.bot_data["retention"].stop()
+    await manifest.stop()
+    await contacts_directory.stop()
+    await usage.counters.stop()
+    # Остаток запишет Application.shutdown (persistence.flush)
+    await application.persistence.stop()
+    await asyncio.get_running_loop().run_in_executor(None, doc_index.shutdown)
+    metrics.stop_server()
+
+
+def build_application(mode=BOT_MODE, builder=None, retention=True):
+    """Собираем Application с обработчиками бота.
+
+    mode="webhook" - без Updater: обновления кладет в очередь webhook.WebhookServer.
+    retention=False - без очистки (retention.py): для стендов и замеров.
+    """
+    # Черновики и шаги диалогов - в базе: переживают перезапуск, видны другим процессам
+    persistence = SQLitePersistence()
+    builder = (
+        (builder or Application.builder().token(BOT_TOKEN).request(botapi.create_request()))
+        # Обновления разных пользователей обрабатываются параллельно,
+        # одного пользователя - по порядку
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES, state=persistence))
+        .persistence(persistence)
+        .post_init(start_background)
+        .post_stop(stop_background)
+        .post_shutdown(shutdown)
+    )
+    if mode == "webhook":
+        builder = builder.updater(None).update_queue(webhook.UpdateQueue(WEBHOOK_MAX_PENDING))
+    application = builder.build()
+    persistence.attach(application)
+    if retention:
+        # Запустит start_background: удаляет файлы и переносит новости в архив
+        application.bot_data["retention"] = Retention()
+
+    # Обработчики команд и сообщений обернуты в metrics.handler (кнопки замеряет router)
 
     # --- АДМИН-ПАНЕЛЬ ---
-    dp.add_handler(ConversationHandler(
+    # Группа -1 - раньше остальных: иначе кнопку add_news перехватит button_click
+    # и диалог не начнется. Шаг диалога - в user_data (хранится в базе, state.py)
+    application.add_handler(UserDataDialog(
+        "add_news",
         entry_points=[
-            CommandHandler('add_news', add_news),  # Для команды /add_news
-            CallbackQueryHandler(add_news, pattern='^add_news$')  # Для кнопки
+            CommandHandler('add_news', metrics.handler(add_news)),  # Для команды /add_news
+            CallbackQueryHandler(metrics.handler(add_news), pattern='^add_news$')  # Для кнопки
         ],
         states={
             WAIT_IMAGE: [  # Ожидаем фото или команду /skip
-                MessageHandler(Filters.photo, handle_image),
-                CommandHandler('skip', handle_image)
+                MessageHandler(filters.PHOTO, metrics.handler(handle_image)),
+                CommandHandler('skip', metrics.handler(handle_image))
             ],
             WAIT_TITLE: [  # Ожидаем текст заголовка
-                MessageHandler(Filters.text & ~Filters.command, save_news)
+                MessageHandler(filters.TEXT & ~filters.COMMAND, metrics.handler(save_news))
             ],
             WAIT_CONTENT: [  # Ожидаем текст новости
-                MessageHandler(Filters.text & ~Filters.command, finish_news)
+                MessageHandler(filters.TEXT & ~filters.COMMAND, metrics.handler(save_content))
+            ],
+            WAIT_PUBLISH: [  # Ожидаем время публикации или команду /now
+                MessageHandler(filters.TEXT & ~filters.COMMAND, metrics.handler(finish_news)),
+                CommandHandler('now', metrics.handler(finish_news))
             ],
         },
         fallbacks=[
-            CommandHandler('cancel', cancel),
-            MessageHandler(Filters.regex('^🏠 Главное меню$'), start)
+            CommandHandler('cancel', metrics.handler(cancel)),
+            MessageHandler(filters.Regex('^🏠 Главное меню$'), metrics.handler(start))
         ],  # Точки выхода из диалога
-    ))
+    ), group=-1)
 
-    updater.start_polling()
+    # Регистрируем обработчики команд
+    application.add_handler(CommandHandler("start", metrics.handler(start)))
+    application.add_handler(CommandHandler("routes", metrics.handler(route_stats)))
+    application.add_handler(CommandHandler("files", metrics.handler(file_report)))
+    application.add_handler(CommandHandler("stats", metrics.handler(stats_command)))
+    application.add_handler(CommandHandler("search", metrics.handler(search_command)))
+    application.add_handler(CommandHandler("docsearch", metrics.handler(docsearch_command)))
+    application.add_handler(CommandHandler("contacts", metrics.handler(contacts_command)))
+    application.add_handler(CommandHandler("subscribe", metrics.handler(subscribe_command)))
+    application.add_handler(CommandHandler("unsubscribe", metrics.handler(unsubscribe_command)))
+    application.add_handler(MessageHandler(filters.Regex('^🏠 Главное меню$'), metrics.handler(start)))
+    application.add_handler(CallbackQueryHandler(button_click))
+    application.add_handler(InlineQueryHandler(metrics.handler(inline_query)))
+    return application
+
+
+def main():
+    # Схема обновляется до запуска обработчиков; актуальная - одно чтение user_version
+    init_db()
+    application = build_application()
     print("Бот запущен с базой данных!")
-    updater.idle()
+    if BOT_MODE == "webhook":
+        asyncio.run(webhook.run(application))
+    else:
+        application.run_polling()
 
 
 if __name__ == "__main__":
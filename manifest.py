@@ -0,0 +1,262 @@
+# manifest.py
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import NamedTuple, Optional
+from config import IMAGE_DIR, DOCS_DIR, DB_PATH, MANIFEST_WORKERS, MANIFEST_RESCAN_INTERVAL
+from database import init_db, get_document_states, get_file_references, file_fingerprint
+import metrics
+"""Список файлов бота в памяти: изображения новостей и документы.
+
+При старте каталоги обходятся параллельно, для каждого файла запоминаются
+размер, mtime и sha256. Дальше обработчики узнают, есть ли файл и какой у
+него отпечаток, из памяти - без stat на каждый запрос. Список обновляется
+пересмотром каталогов раз в MANIFEST_RESCAN_INTERVAL (хэш пересчитывается
+только у изменившихся файлов), а файлы, которые пишет и удаляет сам бот,
+отмечаются сразу.
+"""
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Файлы хранилища названы по хэшу содержимого - читать их не нужно
+_HASH_NAME = re.compile(r"^([0-9a-f]{64})\.\w+$")
+# База данных (и ее -wal, -shm) лежит в IMAGE_DIR и меняется постоянно - ее не учитываем
+_DB_NAME = os.path.basename(DB_PATH)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+
+class Entry(NamedTuple):
+    size: int
+    mtime_ns: int
+    hash: Optional[str]
+
+    @property
+    def fingerprint(self):
+        # Тот же формат, что у database.file_fingerprint (с ним сверяются file_id)
+        return f"{self.size}:{self.mtime_ns}"
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scan_dir(directory):
+    """Файлы и подкаталоги одного каталога (задача пула)"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif not entry.name.startswith(_DB_NAME) and not entry.name.endswith(".tmp"):
+                    try:
+                        files.append((entry.path, entry.stat()))
+                    except OSError:
+                        pass  # Файл удалили во время обхода
+    except OSError as e:
+        logger.warning(f"Не удалось прочитать каталог {directory}: {e}")
+    return files, subdirs
+
+
+def _outermost(paths):
+    """Убираем каталоги, вложенные в другие из списка"""
+    roots = []
+    for path in sorted(set(paths)):
+        if not any(path == root or path.startswith(root + os.sep) for root in roots):
+            roots.append(path)
+    return roots
+
+
+class FileManifest:
+    def __init__(self, workers=MANIFEST_WORKERS, interval=MANIFEST_RESCAN_INTERVAL):
+        self.workers = workers
+        self.interval = interval
+        self.roots = []
+        self.ready = False  # До первого обхода отвечаем по stat
+        self.scanned_at = None
+        self._entries = {}  # путь (normpath) -> Entry
+        self._lock = threading.Lock()
+        self._changed = set()  # Пути, отмеченные add/discard во время обхода
+        self._task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _covers(self, path):
+        return any(path == root or path.startswith(root + os.sep) for root in self.roots)
+
+    def get(self, path):
+        return self._entries.get(os.path.normpath(path))
+
+    def fingerprint(self, path):
+        """Отпечаток файла (размер:mtime) или None, если файла нет.
+
+        Для путей вне известных каталогов и до первого обхода - по stat.
+        """
+        path = os.path.normpath(path)
+        if not self.ready or not self._covers(path):
+            return file_fingerprint(path)
+        entry = self._entries.get(path)
+        return entry.fingerprint if entry else None
+
+    def add(self, path, file_hash=None):
+        """Бот записал файл: отмечаем сразу, не дожидаясь пересмотра"""
+        path = os.path.normpath(path)
+        st = os.stat(path)
+        entry = Entry(st.st_size, st.st_mtime_ns, file_hash)
+        with self._lock:
+            self._entries[path] = entry
+            self._changed.add(path)
+        return entry
+
+    def discard(self, path):
+        path = os.path.normpath(path)
+        with self._lock:
+            self._entries.pop(path, None)
+            self._changed.add(path)
+
+    def scan(self):
+        """Обходим каталоги (блокирующий вызов). Хэш считаем только у новых
+        и изменившихся файлов. Возвращает (файлов, хэшировано, секунд)."""
+        started = time.perf_counter()
+        documents = get_document_states()
+        roots = [os.path.normpath(IMAGE_DIR), os.path.normpath(DOCS_DIR)]
+        roots.extend(os.path.dirname(os.path.normpath(path)) or "." for path in documents)
+        roots = _outermost(path for path in roots if os.path.isdir(path))
+
+        with self._lock:
+            self._changed = set()
+            previous = self._entries
+        # Хэши, которые уже известны: прошлый обход и импорт документов
+        known = {os.path.normpath(path): Entry(state.size, state.mtime_ns, state.hash)
+                 for path, state in documents.items() if state.hash}
+        known.update(previous)
+
+        image_dir = os.path.normpath(IMAGE_DIR)
+        entries = {}
+        hashed = 0
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="manifest") as pool:
+            scans = {pool.submit(_scan_dir, root) for root in roots}
+            hashes = {}
+            while scans:
+                done, scans = wait(scans, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    scans.update(pool.submit(_scan_dir, subdir) for subdir in subdirs)
+                    for path, st in files:
+                        path = os.path.normpath(path)
+                        old = known.get(path)
+                        file_hash = None
+                        if old and old.size == st.st_size and old.mtime_ns == st.st_mtime_ns:
+                            file_hash = old.hash
+                        elif (os.path.dirname(path) == image_dir
+                              and (match := _HASH_NAME.match(os.path.basename(path)))):
+                            file_hash = match.group(1)
+                        entries[path] = Entry(st.st_size, st.st_mtime_ns, file_hash)
+                        if file_hash is None:
+                            hashes[pool.submit(_hash_file, path)] = path
+            for future, path in hashes.items():
+                try:
+                    entries[path] = entries[path]._replace(hash=future.result())
+                    hashed += 1
+                except OSError:
+                    entries.pop(path, None)
+
+        with self._lock:
+            # Что бот записал или удалил, пока шел обход, точнее того, что видел обход
+            for path in self._changed:
+                if path in self._entries:
+                    entries[path] = self._entries[path]
+                else:
+                    entries.pop(path, None)
+            self._entries = entries
+            self.roots = roots
+            self.ready = True
+        self.scanned_at = time.time()
+        return len(entries), hashed, time.perf_counter() - started
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                count, hashed, seconds = await loop.run_in_executor(None, self.scan)
+                logger.info(f"Файлы: {count}, хэшировано {hashed}, обход {seconds:.2f} с")
+            except Exception as e:
+                logger.error(f"Ошибка обхода файлов: {e}")
+                metrics.error("manifest")
+            await asyncio.sleep(self.interval)
+
+    def audit(self):
+        """Сверка базы с диском: записи без файлов и изображения без записей.
+
+        Возвращает (missing, orphans): [(что, id, путь)] и [путь].
+        """
+        news, documents, images = get_file_references()
+        missing = []
+        referenced = set()
+        for news_id, image_path, preview in news:
+            path = os.path.normpath(os.path.join(IMAGE_DIR, image_path))
+            referenced.add(path)
+            if self.get(path) is None:
+                missing.append(("news", news_id, path))
+            if preview:
+                referenced.add(os.path.normpath(os.path.join(IMAGE_DIR, preview)))
+        for doc_id, file_path in documents:
+            if self.fingerprint(file_path) is None:
+                missing.append(("document", doc_id, os.path.normpath(file_path)))
+        for image_path, preview in images:
+            path = os.path.normpath(os.path.join(IMAGE_DIR, image_path))
+            referenced.add(path)
+            if self.get(path) is None:
+                missing.append(("image", None, path))
+            if preview:
+                referenced.add(os.path.normpath(os.path.join(IMAGE_DIR, preview)))
+
+        image_root = os.path.normpath(IMAGE_DIR) + os.sep
+        orphans = sorted(path for path in self._entries
+                         if path.startswith(image_root) and path not in referenced
+                         and path.lower().endswith(IMAGE_EXTENSIONS))
+        return missing, orphans
+
+
+manifest = FileManifest()
+
+
+def format_audit(missing, orphans, limit=30):
+    """Текст отчета для /files и командной строки"""
+    lines = [f"🗂 Файлов в списке: {len(manifest)}"]
+    lines.append(f"❌ Записи без файлов: {len(missing)}")
+    lines.extend(f"  {kind} {item_id or ''} {path}" for kind, item_id, path in missing[:limit])
+    lines.append(f"🗑 Изображения без записей: {len(orphans)}")
+    lines.extend(f"  {path}" for path in orphans[:limit])
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python manifest.py - отчет без запуска бота
+    init_db()
+    count, hashed, seconds = manifest.scan()
+    print(f"Файлов: {count}, хэшировано {hashed}, обход {seconds:.2f} с")
+    print(format_audit(*manifest.audit()))
@@ -0,0 +1,186 @@
+# metrics.py
+import bisect
+import functools
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_ENABLED, METRICS_LISTEN, METRICS_PORT
+"""Метрики бота в формате Prometheus: гистограммы задержек обработчиков,
+SQL-запросов и вызовов Bot API, счетчики ошибок и загруженных байт.
+
+При METRICS_ENABLED = False обертки не устанавливаются вовсе, а error()
+сводится к проверке флага - накладных расходов почти нет.
+"""
+
+logger = logging.getLogger(__name__)
+
+enabled = METRICS_ENABLED
+
+# От 100 мкс (запрос к SQLite) до 10 с (загрузка файла в Telegram)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, description, labelnames):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values = {}
+        # Пишут и цикл событий, и потоки пула (SQL)
+        self._lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}  # labels -> [счетчики по корзинам, сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total))
+                           for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время обработки обновления", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total",
+                         "Ошибки, перехваченные в обработчиках", ("handler",))
+SQL_SECONDS = Histogram("bot_sql_seconds", "Время выполнения SQL-запроса", ("statement",))
+API_SECONDS = Histogram("bot_api_seconds", "Время вызова Bot API", ("method",))
+API_QUEUE_SECONDS = Histogram("bot_api_queue_seconds",
+                              "Ожидание запроса в очереди планировщика Bot API", ("lane",))
+API_ERRORS = Counter("bot_api_errors_total", "Ответы Bot API с ошибкой", ("method", "status"))
+UPLOADED_BYTES = Counter("bot_api_uploaded_bytes_total",
+                         "Байт загружено в Telegram", ("method",))
+
+ALL = (HANDLER_SECONDS, HANDLER_ERRORS, SQL_SECONDS, API_SECONDS, API_QUEUE_SECONDS, API_ERRORS,
+       UPLOADED_BYTES)
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in ALL:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def error(handler):
+    """Учитываем ошибку, которую обработчик перехватил и не пробросил"""
+    if enabled:
+        HANDLER_ERRORS.inc((handler,))
+
+
+def handler(callback, name=None):
+    """Оборачиваем обработчик для замера времени (без метрик - возвращаем как есть)"""
+    if not enabled:
+        return callback
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc((name,))
+            raise
+        finally:
+            HANDLER_SECONDS.observe((name,), time.perf_counter() - start)
+    return wrapper
+
+
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=512)
+def statement_label(sql):
+    """Метка SQL-запроса: текст без лишних пробелов, не длиннее 120 символов"""
+    return _SPACES.sub(" ", sql).strip()[:120]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Prometheus опрашивает часто, не засоряем лог
+
+
+_server = None
+
+
+def start_server(host=METRICS_LISTEN, port=METRICS_PORT):
+    """Отдаем /metrics из отдельного потока (только если метрики включены)"""
+    global _server
+    if not enabled or _server is not None:
+        return
+    _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Метрики: http://{host}:{_server.server_address[1]}/metrics")
+
+
+def stop_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,428 @@
+# migrations.py
+import logging
+"""Версии схемы базы данных.
+
+Номер текущей версии хранится в PRAGMA user_version. Каждая миграция
+выполняется в своей транзакции вместе с записью нового номера: если шаг
+упал, база остается на предыдущей версии. Если схема актуальна, запуск
+бота обходится одним чтением user_version.
+
+Новая миграция - функция в конце MIGRATIONS; менять уже выпущенные нельзя.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(cursor, table, columns):
+    """Добавляем новые столбцы в уже существующую таблицу."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def _baseline(cursor):
+    """1: схема, которую раньше создавал init_db при каждом запуске.
+
+    Базы без user_version могли быть созданы любой из прежних версий init_db,
+    поэтому шаг приводит к общему виду все, что найдет: недостающие таблицы,
+    столбцы и индексы.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS news (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        image_path TEXT,
+        date TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )
+    ''')
+    # В старых базах таблица news создана без image_path и кэша file_id
+    _add_missing_columns(cursor, "news", [
+        ("image_path", "TEXT"),
+        ("image_file_id", "TEXT"),
+        ("image_fingerprint", "TEXT"),
+        # Метаданные изображения из хранилища
+        ("image_preview", "TEXT"),
+        ("image_width", "INTEGER"),
+        ("image_height", "INTEGER"),
+        ("image_size", "INTEGER"),
+    ])
+    # Индекс для сортировки ленты и keyset-пагинации
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_date_id ON news (date DESC, id DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_image_path ON news (image_path)")
+
+    # Хранилище изображений: один файл на содержимое, счетчик ссылок из новостей
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS images (
+        path TEXT PRIMARY KEY,
+        hash TEXT NOT NULL,
+        preview_path TEXT,
+        width INTEGER,
+        height INTEGER,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )
+    ''')
+
+    # Таблица документов
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        file_path TEXT NOT NULL
+    )
+    ''')
+    _add_missing_columns(cursor, "documents", [
+        # Кэш file_id Telegram: повторная отправка без загрузки файла
+        ("file_id", "TEXT"),
+        ("file_fingerprint", "TEXT"),
+        # Для повторного импорта: неизмененные файлы не хэшируются
+        ("file_hash", "TEXT"),
+        ("file_size", "INTEGER"),
+        ("file_mtime_ns", "INTEGER"),
+    ])
+    index_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'idx_documents_file_path'").fetchone()
+    if not index_exists:
+        # Один файл - одна запись: из дублей, если они были, оставляем первую
+        cursor.execute(
+            "DELETE FROM documents "
+            "WHERE id NOT IN (SELECT MIN(id) FROM documents GROUP BY file_path)")
+        cursor.execute("CREATE UNIQUE INDEX idx_documents_file_path ON documents (file_path)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (file_hash)")
+
+    # Текст документов (см. doc_index.py) и полнотекстовый индекс по нему
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS document_texts (
+        document_id INTEGER PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        hash TEXT,
+        text TEXT NOT NULL,
+        preview TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        text,
+        content='document_texts', content_rowid='document_id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+    ''')
+    # По одному запросу: executescript сам фиксирует транзакцию
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS document_texts_ai AFTER INSERT ON document_texts BEGIN
+        INSERT INTO documents_fts (rowid, text) VALUES (new.document_id, new.text);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS document_texts_ad AFTER DELETE ON document_texts BEGIN
+        INSERT INTO documents_fts (documents_fts, rowid, text)
+        VALUES ('delete', old.document_id, old.text);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS document_texts_au AFTER UPDATE OF text ON document_texts BEGIN
+        INSERT INTO documents_fts (documents_fts, rowid, text)
+        VALUES ('delete', old.document_id, old.text);
+        INSERT INTO documents_fts (rowid, text) VALUES (new.document_id, new.text);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS documents_texts_cleanup AFTER DELETE ON documents BEGIN
+        DELETE FROM document_texts WHERE document_id = old.id;
+    END
+    ''')
+
+    # Полнотекстовый индекс новостей, синхронизируется триггерами
+    fts_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'news_fts'").fetchone()
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+        title, content,
+        content='news', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS news_fts_ai AFTER INSERT ON news BEGIN
+        INSERT INTO news_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS news_fts_ad AFTER DELETE ON news BEGIN
+        INSERT INTO news_fts (news_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS news_fts_au AFTER UPDATE OF title, content ON news BEGIN
+        INSERT INTO news_fts (news_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO news_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    ''')
+    if not fts_exists:
+        # Совпадения в заголовке весят больше, чем в тексте
+        cursor.execute("INSERT INTO news_fts (news_fts, rank) VALUES ('rank', 'bm25(4.0, 1.0)')")
+        # Индексируем новости, добавленные до появления FTS
+        cursor.execute("INSERT INTO news_fts (news_fts) VALUES ('rebuild')")
+
+    # Таблица контактов
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS contacts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        department TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        email TEXT
+    )
+    ''')
+
+    # Подписчики на новости и очередь рассылок
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS subscribers (
+        chat_id INTEGER PRIMARY KEY,
+        subscribed_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        news_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        last_chat_id INTEGER,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        photo_file_id TEXT,
+        lease_owner TEXT,
+        lease_until REAL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcasts_pending ON broadcasts (status, id)")
+
+
+def _documents_type_index(cursor):
+    """2: список документов выбирается по type (get_documents) - без индекса
+    это полный просмотр таблицы на каждое открытие списка."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_type ON documents (type)")
+
+
+def _conversation_state(cursor):
+    """3: состояние диалогов (state.py) - user_data и шаги ConversationHandler
+    в базе, чтобы с ней могли работать несколько процессов бота."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_state (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS conversations (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        user_id INTEGER,
+        state TEXT NOT NULL,
+        PRIMARY KEY (name, key)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id)")
+    # Аренда пользователя процессом: его обновления обрабатываются по одному
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_locks (
+        user_id INTEGER PRIMARY KEY,
+        owner TEXT NOT NULL,
+        lease_until REAL NOT NULL
+    )
+    ''')
+
+
+def _contacts_version(cursor):
+    """4: счетчик изменений контактов. Справочник в памяти (contacts.py)
+    проверяет его одним чтением и перечитывает таблицу, только если она
+    изменилась - в том числе из другого процесса или sqlite3."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name) VALUES ('contacts')")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_version_{event.lower()} AFTER {event} ON contacts BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE name = 'contacts';
+        END
+        ''')
+
+
+def _usage_hourly(cursor):
+    """5: счетчики просмотров, скачиваний и открытий меню по часам (usage.py).
+    Отчет /stats суммирует часы за период, а не отдельные события."""
+    # item без типа: id новости или документа - числом, имя меню - строкой
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usage_hourly (
+        hour INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        item NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (hour, kind, item)
+    ) WITHOUT ROWID
+    ''')
+
+
+def _bundles(cursor):
+    """6: ZIP-архивы документов одного типа (bundles.py). key - хэш состава
+    архива: пока документы не менялись, архив не пересобирается и
+    отправляется по file_id."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS bundles (
+        key TEXT PRIMARY KEY,
+        doc_type TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        file_id TEXT,
+        created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bundles_type ON bundles (doc_type)")
+
+
+def _news_publish_at(cursor):
+    """7: отложенная публикация (publisher.py). publish_at - когда показать
+    новость; NULL - уже опубликована. Лента читает только опубликованные по
+    частичному индексу, очередь публикации - по частичному индексу ожидающих."""
+    _add_missing_columns(cursor, "news", [("publish_at", "TEXT")])
+    cursor.execute("DROP INDEX IF EXISTS idx_news_date_id")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_published ON news (date DESC, id DESC) "
+                   "WHERE publish_at IS NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_scheduled ON news (publish_at) "
+                   "WHERE publish_at IS NOT NULL")
+
+
+def _news_archive(cursor):
+    """8: архив старых новостей (retention.py). Лента и ее индексы остаются
+    маленькими; из архива новость не показывается, изображение освобождается
+    (file_id Telegram сохраняется)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS news_archive (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        date TEXT NOT NULL,
+        image_file_id TEXT,
+        archived_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )
+    ''')
+
+
+def _render_versions(cursor):
+    """9: счетчики изменений новостей и документов для кэша экранов
+    (cache.py). Их поднимают триггеры в той же транзакции, что и правку, -
+    кэши всех процессов бота видят изменения, сделанные в любом из них."""
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name) VALUES ('news'), ('docs')")
+    # file_id и отпечаток изображения - не правка: экран сбрасывается точечно (discard)
+    for event, when in (("INSERT", "INSERT"), ("DELETE", "DELETE"),
+                        ("UPDATE", "UPDATE OF title, content, date, publish_at, image_path")):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS news_version_{event.lower()} AFTER {when} ON news BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE name = 'news';
+        END
+        ''')
+
+
+def _documents_version(cursor):
+    """10: правки документов поднимают счетчик 'docs' (кэш списков, поиска и
+    inline-ответов) в той же транзакции - будь то импорт (import_docs.py),
+    индекс текста или правка базы вручную."""
+    # file_id и отпечаток записывает сам бот при отправке - списки от них не зависят
+    for table, columns in (("documents", "name, type, file_path, file_hash"),
+                           ("document_texts", "text, preview")):
+        for event, when in (("INSERT", "INSERT"), ("DELETE", "DELETE"),
+                            ("UPDATE", f"UPDATE OF {columns}")):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {when} ON {table}
+            BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'docs';
+            END
+            ''')
+
+
+def _documents_page_index(cursor):
+    """11: список документов листается страницами по (name, id) внутри типа
+    (get_documents_page) - индекс (type, name) отдает страницу без сортировки
+    всех документов типа. idx_documents_type - его префикс, он больше не нужен."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_type_name ON documents (type, name)")
+    cursor.execute("DROP INDEX IF EXISTS idx_documents_type")
+
+
+def _dialog_steps(cursor):
+    """12: шаг диалога хранится в user_data (dialogs.py) под ключом
+    "<имя диалога>_step", а не в таблице conversations. Незаконченные диалоги
+    переносим туда, таблицу удаляем."""
+    cursor.execute('''
+    INSERT INTO user_state (user_id, data)
+    SELECT user_id, json_set('{}', '$."' || name || '_step"', json(state))
+    FROM conversations WHERE user_id IS NOT NULL
+    ON CONFLICT (user_id) DO UPDATE SET data = json_patch(user_state.data, excluded.data)
+    ''')
+    cursor.execute("DROP TABLE conversations")
+
+
+# Версия схемы = число примененных миграций
+MIGRATIONS = [
+    _baseline,
+    _documents_type_index,
+    _conversation_state,
+    _contacts_version,
+    _usage_hourly,
+    _bundles,
+    _news_publish_at,
+    _news_archive,
+    _render_versions,
+    _documents_version,
+    _documents_page_index,
+    _dialog_steps,
+]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Применяем недостающие миграции. Возвращает число примененных."""
+    target = len(migrations)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == target:
+        return 0
+    if version > target:
+        raise RuntimeError(f"Схема базы (версия {version}) новее кода (версия {target})")
+
+    start = version
+    applied = 0
+    while version < target:
+        # IMMEDIATE: второй процесс ждет здесь и не применит тот же шаг повторно
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= target:
+                conn.rollback()
+                break
+            migrations[version](conn.cursor())
+            version += 1
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        logger.info(f"Схема базы обновлена до версии {version}: {migrations[version - 1].__name__}")
+        applied += 1
+
+    # Статистика для планировщика запросов по новым индексам - только по настоящим
+    # данным: ANALYZE новой пустой базы записал бы в sqlite_stat1, что все таблицы
+    # крошечные, и SQLite верил бы этому при заполнении (вставка - сверхлинейная)
+    if applied and start and conn.execute("SELECT EXISTS (SELECT 1 FROM news)").fetchone()[0]:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
@@ -0,0 +1,107 @@
+# publisher.py
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from config import STATE_SHARED, PUBLISH_RESYNC_INTERVAL
+from database import get_scheduled_news, publish_news
+from runtime import run_blocking
+from cache import render_cache
+import metrics
+"""Отложенная публикация новостей.
+
+Запланированные новости хранятся в news.publish_at - очередь переживает
+перезапуск. При старте она читается из базы (по частичному индексу) в кучу
+(время, id), и задача спит до ближайшего срока, а не опрашивает таблицу.
+Новость, запланированная в этом процессе, добавляется в кучу сразу
+(schedule) и будит задачу. Пропущенные, пока бот не работал, сроки
+публикуются при старте.
+"""
+
+logger = logging.getLogger(__name__)
+
+DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # Формат news.date и news.publish_at
+
+
+class Publisher:
+    """Публикует новости, у которых наступил publish_at, и запускает рассылку."""
+
+    def __init__(self, broadcaster=None,
+                 resync_interval=PUBLISH_RESYNC_INTERVAL if STATE_SHARED else None):
+        self.broadcaster = broadcaster
+        self.resync_interval = resync_interval
+        self._heap = []  # (время публикации, id новости)
+        self._loaded = False  # Куча совпадает с базой (после ошибки - перечитать)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, news_id, publish_at):
+        """Новость запланирована в этом процессе - ставим в очередь, не дожидаясь базы"""
+        heapq.heappush(self._heap, (publish_at, news_id))
+        self._wakeup.set()
+
+    async def load(self):
+        """Перечитываем очередь из базы"""
+        rows = await run_blocking(get_scheduled_news)
+        heap = [(datetime.strptime(publish_at, DB_TIME_FORMAT), news_id)
+                for news_id, publish_at in rows]
+        heapq.heapify(heap)
+        self._heap = heap
+        self._loaded = True
+
+    async def publish_due(self):
+        """Публикуем все, чей срок наступил. Возвращает число опубликованных."""
+        now = datetime.now()
+        published = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, news_id = heapq.heappop(self._heap)
+            # Новость могли удалить или уже опубликовать другим процессом - тогда False
+            if await run_blocking(publish_news, news_id, now.strftime(DB_TIME_FORMAT)):
+                published += 1
+                logger.info(f"Опубликована запланированная новость {news_id}")
+        if published:
+            render_cache.bump("news")
+            if self.broadcaster:
+                self.broadcaster.notify()
+        return published
+
+    def _timeout(self):
+        """Сколько спать: до ближайшего срока, но не дольше интервала сверки с базой"""
+        if not self._loaded:
+            return PUBLISH_RESYNC_INTERVAL  # Повтор после ошибки
+        timeouts = []
+        if self._heap:
+            timeouts.append(max(0.0, (self._heap[0][0] - datetime.now()).total_seconds()))
+        if self.resync_interval is not None:
+            timeouts.append(self.resync_interval)
+        return min(timeouts) if timeouts else None
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._loaded or self.resync_interval is not None:
+                    await self.load()
+                await self.publish_due()
+            except Exception as e:
+                logger.error(f"Ошибка отложенной публикации: {e}")
+                metrics.error("publisher")
+                # Снятая с кучи новость осталась в базе - вернется при перечитывании
+                self._loaded = False
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._timeout())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
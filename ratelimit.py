@@ -0,0 +1,77 @@
+# ratelimit.py
+import asyncio
+import time
+"""Ограничение частоты запросов к Bot API (token bucket)"""
+
+
+class TokenBucket:
+    """Ведро токенов: не больше rate запросов в секунду в среднем,
+    кратковременно - до capacity подряд.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds):
+        """Не выдаем токены seconds секунд (Telegram ответил 429 retry_after)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        """Ждем, пока можно отправить запрос."""
+        # Lock выстраивает ожидающих в очередь, иначе они будут соревноваться
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class KeyedLimiter:
+    """Отдельное ведро на каждый ключ (например, chat_id)."""
+
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict()
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+        return bucket
+
+    def _evict(self):
+        # Полное ведро (без паузы) ничем не отличается от нового - удаляем такие
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            bucket._refill(now)
+            if bucket._tokens >= bucket.capacity and bucket._paused_until <= now:
+                del self._buckets[key]
+
+    async def acquire(self, key):
+        await self.bucket(key).acquire()
+
+
+def retry_after_seconds(error):
+    """retry_after из telegram.error.RetryAfter в секундах (int или timedelta)."""
+    value = error.retry_after
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
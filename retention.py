@@ -0,0 +1,154 @@
+# retention.py
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from config import (IMAGE_DIR, RETENTION_DAYS, RETENTION_INTERVAL, RETENTION_BATCH,
+                    RETENTION_PAUSE, IMAGE_GC_GRACE, VACUUM_PAGES)
+from database import (init_db, archive_news, release_stale_images, get_image_references,
+                      incremental_vacuum, enable_incremental_vacuum)
+from runtime import run_blocking
+from cache import render_cache
+from manifest import manifest
+import images
+import metrics
+"""Архив старых новостей и очистка места.
+
+Раз в RETENTION_INTERVAL:
+1. новости старше RETENTION_DAYS (если задан) переносятся в news_archive
+   пачками по RETENTION_BATCH, их изображения освобождаются;
+2. удаляются изображения без ссылок: записи хранилища от брошенных
+   черновиков и файлы хранилища (images.is_stored - имя по sha256), которых
+   нет в базе (старше IMAGE_GC_GRACE). Прочие файлы в IMAGE_DIR - например,
+   положенные вручную - не трогаем;
+3. свободные страницы базы возвращаются ОС шагами по VACUUM_PAGES
+   (PRAGMA incremental_vacuum) - каждый шаг держит запись недолго.
+
+Каждый шаг - своя короткая транзакция, между шагами пауза RETENTION_PAUSE,
+поэтому обработчики не ждут очистку. python retention.py - один проход без
+бота; python retention.py --enable-vacuum - перевести старую базу на
+incremental_vacuum (полный VACUUM, бот должен быть остановлен).
+"""
+
+logger = logging.getLogger(__name__)
+
+DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # Формат news.date и images.created_at
+
+
+class Retention:
+    def __init__(self, days=RETENTION_DAYS, interval=RETENTION_INTERVAL, batch=RETENTION_BATCH,
+                 pause=RETENTION_PAUSE, grace=IMAGE_GC_GRACE, vacuum_pages=VACUUM_PAGES):
+        self.days = days
+        self.interval = interval
+        self.batch = batch
+        self.pause = pause
+        self.grace = grace
+        self.vacuum_pages = vacuum_pages
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка очистки: {e}")
+                metrics.error("retention")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        """Один проход. Возвращает (перенесено новостей, удалено файлов, освобождено страниц)."""
+        archived = await self.archive()
+        removed = await self.collect_images()
+        freed = await self.vacuum()
+        if archived or removed or freed:
+            logger.info(f"Очистка: в архив {archived} новостей, удалено {removed} файлов, "
+                        f"освобождено {freed or 0} страниц базы")
+        return archived, removed, freed
+
+    async def archive(self):
+        """Переносим старые новости в архив пачками"""
+        if self.days is None:
+            return 0
+        before = (datetime.now() - timedelta(days=self.days)).strftime(DB_TIME_FORMAT)
+        total = 0
+        while True:
+            count, files = await run_blocking(archive_news, before, self.batch)
+            await images.remove_files(files)
+            total += count
+            if count < self.batch:
+                break
+            await asyncio.sleep(self.pause)
+        if total:
+            render_cache.bump("news")
+        return total
+
+    async def collect_images(self):
+        """Удаляем изображения, на которые не ссылается ни одна строка"""
+        removed = 0
+        before = (datetime.now() - timedelta(seconds=self.grace)).strftime(DB_TIME_FORMAT)
+        while True:
+            count, files = await run_blocking(release_stale_images, before, self.batch)
+            await images.remove_files(files)
+            removed += len(files)
+            if count < self.batch:
+                break
+            await asyncio.sleep(self.pause)
+
+        # Файлы без записей - по списку файлов в памяти, после первого обхода.
+        # Удаляем только записанные хранилищем: чужие файлы в IMAGE_DIR не наши
+        if not manifest.ready:
+            return removed
+        _, orphans = await run_blocking(manifest.audit)
+        cutoff_ns = time.time_ns() - int(self.grace * 1e9)
+        orphans = [relative for path in orphans
+                   if images.is_stored(relative := os.path.relpath(path, IMAGE_DIR))
+                   and (entry := manifest.get(path)) and entry.mtime_ns < cutoff_ns]
+        for start in range(0, len(orphans), self.batch):
+            batch = orphans[start:start + self.batch]
+            # Перепроверяем по базе: файл мог понадобиться новой новости после сверки
+            referenced = await run_blocking(get_image_references, batch)
+            files = [path for path in batch if path not in referenced]
+            await images.remove_files(files)
+            removed += len(files)
+            await asyncio.sleep(self.pause)
+        return removed
+
+    async def vacuum(self):
+        """Возвращаем свободные страницы базы ОС по частям. None - режим выключен."""
+        total = 0
+        while True:
+            result = await run_blocking(incremental_vacuum, self.vacuum_pages)
+            if result is None:
+                return None
+            freed, remaining = result
+            total += freed
+            if not remaining or not freed:
+                return total
+            await asyncio.sleep(self.pause)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    if "--enable-vacuum" in sys.argv:
+        enable_incremental_vacuum()
+        print("База переведена на auto_vacuum = INCREMENTAL")
+    else:
+        manifest.scan()
+        archived, removed, freed = asyncio.run(Retention(pause=0).run_once())
+        print(f"В архив: {archived} новостей, удалено файлов: {removed}, "
+              f"освобождено страниц: {'-' if freed is None else freed}")
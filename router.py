@@ -0,0 +1,113 @@
+# router.py
+import logging
+import time
+from typing import NamedTuple
+import metrics
+"""Маршрутизация callback-кнопок"""
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = ":"
+
+
+class Route(NamedTuple):
+    name: str
+    callback: object
+    param_types: tuple
+
+
+class RouteStats:
+    """Счетчики одного маршрута: вызовы, ошибки и время обработки."""
+    __slots__ = ("calls", "errors", "total_time", "max_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def avg_time(self):
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class CallbackRouter:
+    """Таблица маршрутов для callback_data.
+
+    Формат данных кнопки: "имя" или "имя:парам1:парам2". Маршрут ищется по
+    имени в словаре (без перебора условий), параметры приводятся к типам,
+    указанным при регистрации. Так callback_data остается коротким: в кнопку
+    кладется id записи, а не путь к файлу.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._stats = {}
+
+    def add(self, name, callback, *param_types):
+        """Регистрируем маршрут. callback(update, context, *params)."""
+        if SEPARATOR in name:
+            raise ValueError(f"Имя маршрута не может содержать '{SEPARATOR}': {name}")
+        if name in self._routes:
+            raise ValueError(f"Маршрут уже зарегистрирован: {name}")
+        self._routes[name] = Route(name, callback, param_types)
+        self._stats[name] = RouteStats()
+
+    def route(self, name, *param_types):
+        """Декоратор для регистрации маршрута."""
+        def decorator(callback):
+            self.add(name, callback, *param_types)
+            return callback
+        return decorator
+
+    def resolve(self, data):
+        """Находим маршрут и разбираем параметры. None, если данные не подходят."""
+        name, _, rest = data.partition(SEPARATOR)
+        route = self._routes.get(name)
+        if route is None:
+            return None
+
+        if not route.param_types:
+            return (route, ()) if not rest else None
+
+        raw = rest.split(SEPARATOR, len(route.param_types) - 1)
+        if len(raw) != len(route.param_types):
+            return None
+        try:
+            params = tuple(cast(value) for cast, value in zip(route.param_types, raw))
+        except ValueError:
+            return None
+        return route, params
+
+    async def dispatch(self, update, context):
+        """Вызываем обработчик для нажатой кнопки."""
+        query = update.callback_query
+        resolved = self.resolve(query.data or "")
+        if resolved is None:
+            logger.warning(f"Неизвестная кнопка: {query.data!r}")
+            await query.answer("Кнопка устарела, откройте меню заново")
+            return
+
+        route, params = resolved
+        stats = self._stats[route.name]
+        start = time.perf_counter()
+        try:
+            return await route.callback(update, context, *params)
+        except Exception:
+            stats.errors += 1
+            metrics.error(f"button:{route.name}")
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.calls += 1
+            stats.total_time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+            if metrics.enabled:
+                metrics.HANDLER_SECONDS.observe((f"button:{route.name}",), elapsed)
+
+    def stats(self):
+        """Статистика маршрутов, самые частые - первыми."""
+        items = [(name, s) for name, s in self._stats.items() if s.calls]
+        return sorted(items, key=lambda item: item[1].calls, reverse=True)
+
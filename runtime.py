@@ -0,0 +1,99 @@
+# runtime.py
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from telegram.ext import BaseUpdateProcessor
+from config import BLOCKING_WORKERS
+from database import close_all
+import images
+"""Асинхронный рантайм бота: параллельная обработка обновлений и пул потоков
+для блокирующих операций."""
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+# Лимит для семафора BaseUpdateProcessor: настоящий лимит - в PerUserUpdateProcessor
+_UNLIMITED = 2 ** 31 - 1
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Выполняем блокирующую функцию (SQLite, диск) в пуле потоков."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def read_file(path):
+    """Читаем файл целиком (вызывать через run_blocking)."""
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Обрабатывает обновления параллельно (не больше max_concurrent_updates),
+    но обновления одного пользователя - строго по очереди.
+
+    Это сохраняет корректность диалогов (dialogs.py): следующий шаг диалога
+    не начнется, пока не завершен предыдущий.
+
+    Слот общего лимита занимается только после очереди пользователя:
+    BaseUpdateProcessor.process_update берет свой семафор до
+    do_process_update, поэтому ему передан лимит без ограничения, а
+    max_concurrent_updates соблюдает семафор _slots. Иначе пачка обновлений
+    одного пользователя заняла бы все слоты ожиданием своей очереди.
+
+    state - хранилище состояния (state.SQLitePersistence): обновление
+    обрабатывается через state.handle(), которое подгружает и записывает
+    состояние пользователя и держит его от других процессов.
+    """
+
+    def __init__(self, max_concurrent_updates, state=None):
+        super().__init__(_UNLIMITED)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self.state = state
+        self._locks = {}  # ключ пользователя -> [asyncio.Lock, число ожидающих]
+
+    @staticmethod
+    def _ordering_key(update):
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return user.id
+        chat = getattr(update, "effective_chat", None)
+        return chat.id if chat is not None else None
+
+    async def do_process_update(self, update, coroutine):
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                if self.state is None:
+                    await coroutine
+                else:
+                    await self.state.handle(key, coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+async def shutdown(application):
+    """post_shutdown: дожидаемся блокирующих задач и закрываем соединения с БД."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _executor.shutdown)
+    await loop.run_in_executor(None, images.shutdown)
+    close_all()
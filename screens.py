@@ -0,0 +1,84 @@
+# screens.py
+import logging
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest, TelegramError
+"""Смена экрана под inline-кнопками одним запросом к Bot API.
+
+Экран по возможности правится на месте: текст - edit_message_text, фото -
+edit_message_media. Текстовое сообщение нельзя превратить в фото (и
+наоборот), только тогда отправляем новое и удаляем старое.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def has_media(message):
+    """Сообщение с фото/документом: у него подпись вместо текста"""
+    return bool(message.photo or message.document or message.video or message.animation)
+
+
+def _not_modified(error):
+    # Повторное нажатие той же кнопки: Telegram отказывает править без изменений
+    return "message is not modified" in str(error).lower()
+
+
+async def _delete_old(context, message):
+    try:
+        await context.bot.delete_message(chat_id=message.chat_id, message_id=message.message_id)
+    except TelegramError as e:
+        logger.warning(f"Не удалось удалить сообщение: {e}")
+
+
+async def show_text(update, context, text, reply_markup=None, parse_mode=None):
+    """Показываем текстовый экран вместо сообщения, под которым нажата кнопка"""
+    query = update.callback_query
+    message = query.message
+    if not has_media(message):
+        try:
+            return await query.edit_message_text(text, reply_markup=reply_markup,
+                                                 parse_mode=parse_mode)
+        except BadRequest as e:
+            if not _not_modified(e):
+                raise
+            return message
+
+    new_message = await context.bot.send_message(chat_id=message.chat_id, text=text,
+                                                 reply_markup=reply_markup, parse_mode=parse_mode)
+    await _delete_old(context, message)
+    return new_message
+
+
+async def show_photo(update, context, photo, caption, reply_markup=None, parse_mode=None,
+                     filename=None):
+    """Показываем фото с подписью: правкой медиа, если под кнопкой уже фото"""
+    query = update.callback_query
+    message = query.message
+    if message.photo:
+        try:
+            return await query.edit_message_media(
+                InputMediaPhoto(photo, caption=caption, parse_mode=parse_mode, filename=filename),
+                reply_markup=reply_markup)
+        except BadRequest as e:
+            if not _not_modified(e):
+                raise
+            return message
+
+    new_message = await context.bot.send_photo(
+        chat_id=message.chat_id, photo=photo, caption=caption, parse_mode=parse_mode,
+        filename=filename, reply_markup=reply_markup)
+    await _delete_old(context, message)
+    return new_message
+
+
+async def show_caption(update, context, text, reply_markup=None, parse_mode=None):
+    """Короткий экран (подтверждение, ошибка): у фото меняем подпись, фото остается"""
+    query = update.callback_query
+    if query.message.photo:
+        try:
+            return await query.edit_message_caption(caption=text, reply_markup=reply_markup,
+                                                    parse_mode=parse_mode)
+        except BadRequest as e:
+            if not _not_modified(e):
+                raise
+            return query.message
+    return await show_text(update, context, text, reply_markup, parse_mode)
@@ -0,0 +1,221 @@
+# state.py
+"""Состояние диалогов в базе: user_data.
+
+Черновик новости (news_image, news_title) и шаг диалога add_news (тоже в
+user_data, см. dialogs.py) переживают
+перезапуск бота, а при STATE_SHARED с одной базой могут работать несколько
+процессов: соседние сообщения админа можно обработать в разных процессах.
+
+Запись отложенная: изменения копятся в памяти, фоновая задача пишет все,
+что накопилось, одной транзакцией. Неизмененные данные не пишутся.
+
+При STATE_SHARED обновление пользователя обрабатывается так (см. handle):
+аренда пользователя в таблице user_locks и чтение его состояния - один
+запрос, затем обработчик, затем запись изменений вместе со снятием аренды.
+Следующее обновление того же пользователя в другом процессе ждет аренду и
+читает уже записанное состояние: оно подставляется в user_data через
+refresh_user_data, который PTB вызывает перед обработчиком.
+
+chat_data и bot_data не хранятся: в bot_data лежат фоновые задачи процесса.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from telegram.ext import BasePersistence, PersistenceInput
+from config import STATE_SHARED, STATE_LOCK_LEASE, STATE_LOCK_POLL
+from database import get_user_states, lock_user_state, save_states
+from runtime import run_blocking
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, sort_keys=True)
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранилище состояния для Application.persistence.
+
+    Вместе с runtime.PerUserUpdateProcessor: процессор вызывает handle() для
+    каждого обновления. Другое хранилище (например, Redis) должно реализовать
+    те же методы BasePersistence и handle().
+    """
+
+    def __init__(self, shared=STATE_SHARED, lease_seconds=STATE_LOCK_LEASE,
+                 poll_interval=STATE_LOCK_POLL, owner=None):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False,
+                                                     user_data=True, callback_data=False))
+        self.shared = shared
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.application = None
+        self._known = {}  # user_id -> user_data в базе (JSON): не пишем то же самое
+        self._loaded = {}  # user_id -> user_data, прочитанные под арендой (для refresh_user_data)
+        self._users = {}  # Ожидают записи: user_id -> JSON или None (удалить)
+        self._unlock = set()
+        self._waiters = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def attach(self, application):
+        """Application, изменения которого handle() записывает после обновления"""
+        self.application = application
+
+    # --- Загрузка при старте (Application.initialize) ---
+
+    async def get_user_data(self):
+        # Только чтение: схему обновляет main() (database.init_db) до запуска бота
+        rows = await run_blocking(get_user_states)
+        self._known = dict(rows)
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    async def get_conversations(self, name):
+        return {}  # Шаги диалогов - в user_data (dialogs.py)
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # --- Изменения от Application.update_persistence ---
+
+    async def update_user_data(self, user_id, data):
+        data = _dumps(data) if data else None
+        if self._known.get(user_id) == data:
+            return
+        self._known[user_id] = data
+        self._users[user_id] = data
+        self._wakeup.set()
+
+    async def drop_user_data(self, user_id):
+        await self.update_user_data(user_id, None)
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        """PTB вызывает перед обработчиком: подставляем прочитанное в handle()"""
+        if user_id not in self._loaded:
+            return  # Без STATE_SHARED в памяти и так последнее состояние
+        data = self._loaded.pop(user_id)
+        user_data.clear()
+        if data is not None:
+            user_data.update(json.loads(data))
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # --- Обработка обновления ---
+
+    async def handle(self, user_id, coroutine):
+        """Обрабатываем обновление пользователя (вызывает PerUserUpdateProcessor).
+
+        Внутри процесса обновления одного пользователя уже идут по очереди.
+        """
+        if not self.shared:
+            try:
+                await coroutine
+            finally:
+                # Запись пойдет в фоне, обновление ее не ждет
+                await self.application.update_persistence()
+            return
+
+        await self._lock(user_id)
+        try:
+            await coroutine
+        finally:
+            # Обновление могло не дойти до обработчика - не подставим устаревшее позже
+            self._loaded.pop(user_id, None)
+            await self.application.update_persistence()
+            self._unlock.add(user_id)
+            await self._commit()
+
+    async def _lock(self, user_id):
+        while True:
+            locked, data = await run_blocking(lock_user_state, user_id, self.owner,
+                                              self.lease_seconds)
+            if locked:
+                break
+            await asyncio.sleep(self.poll_interval)
+        # Другой процесс мог изменить данные или закончить диалог
+        self._known[user_id] = data
+        self._loaded[user_id] = data
+
+    # --- Запись ---
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _commit(self):
+        """Дожидаемся записи накопленных изменений"""
+        if self._task is None:
+            await self.flush()
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._wakeup.set()
+        await waiter
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            waiters, self._waiters = self._waiters, []
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи состояния диалогов: {e}")
+                metrics.error("state")
+                # Изменения остались в очереди - повторим чуть позже
+                asyncio.get_running_loop().call_later(1, self._wakeup.set)
+            # Обработчик ждет запись только ради снятия аренды - не держим его и при ошибке
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def flush(self):
+        """Пишем все накопленное одной транзакцией (и при остановке бота)"""
+        if not (self._users or self._unlock):
+            return
+        users, self._users = self._users, {}
+        unlock, self._unlock = self._unlock, set()
+        try:
+            await run_blocking(save_states, list(users.items()), list(unlock), self.owner)
+        except BaseException:
+            # Вернем в очередь то, что не успели переписать более новым
+            for user_id, data in users.items():
+                self._users.setdefault(user_id, data)
+            self._unlock |= unlock
+            raise
@@ -0,0 +1,120 @@
+# usage.py
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from config import STATS_FLUSH_INTERVAL, STATS_TOP
+from database import (add_usage, get_usage_top, get_usage_totals, get_news_titles,
+                      get_document_names)
+from runtime import run_blocking
+import metrics
+"""Счетчики использования: просмотры новостей, скачивания документов,
+открытия меню.
+
+hit() только увеличивает счетчик в памяти - чтение новости или документа не
+ждет записи в базу. Раз в STATS_FLUSH_INTERVAL накопленное прибавляется к
+часовым строкам usage_hourly одной транзакцией, при остановке бота - тоже.
+Несколько процессов бота прибавляют к одним и тем же строкам.
+"""
+
+logger = logging.getLogger(__name__)
+
+NEWS = "news"
+DOCUMENT = "doc"
+MENU = "menu"
+KIND_LABELS = {NEWS: "👁 просмотры", DOCUMENT: "📥 скачивания", MENU: "📋 меню"}
+
+
+def current_hour(now=None):
+    return int((time.time() if now is None else now) // 3600)
+
+
+class UsageCounters:
+    def __init__(self, interval=STATS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._counts = Counter()  # (час, вид, элемент) -> сколько
+        self._task = None
+
+    def hit(self, kind, item):
+        self._counts[(current_hour(), kind, item)] += 1
+
+    async def flush(self):
+        """Записываем накопленное (при ошибке вернем счетчики обратно)"""
+        if not self._counts:
+            return
+        counts, self._counts = self._counts, Counter()
+        try:
+            await run_blocking(add_usage, [key + (count,) for key, count in counts.items()])
+        except BaseException:
+            self._counts.update(counts)
+            raise
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи статистики: {e}")
+                metrics.error("usage")
+
+
+counters = UsageCounters()
+
+
+def _top_lines(kind, since, labels=None, limit=STATS_TOP):
+    rows = get_usage_top(kind, since, limit)
+    names = labels([item for item, _ in rows]) if labels else {}
+    return [f"  {count} - {names.get(item, item)}" for item, count in rows]
+
+
+def build_report(now=None):
+    """Текст отчета /stats (блокирующий вызов)"""
+    hour = current_hour(now)
+    day_ago, week_ago = hour - 23, hour - 24 * 7 + 1
+
+    lines = ["📊 Статистика за 24 часа"]
+    for kind, title, labels in ((NEWS, "📰 Новости:", get_news_titles),
+                                (DOCUMENT, "📄 Документы:", get_document_names),
+                                (MENU, "📋 Меню:", None)):
+        top = _top_lines(kind, day_ago, labels)
+        if top:
+            lines.append(title)
+            lines.extend(top)
+
+    # Динамика: сутки к предыдущим суткам и по дням недели
+    by_day = defaultdict(Counter)
+    last, previous = Counter(), Counter()
+    for bucket, kind, count in get_usage_totals(week_ago):
+        if bucket >= day_ago:
+            last[kind] += count
+        elif bucket >= day_ago - 24:
+            previous[kind] += count
+        if bucket >= week_ago:
+            by_day[time.localtime(bucket * 3600)[:3]][kind] += count
+
+    lines.append("\n📈 Сутки к предыдущим:")
+    for kind, label in KIND_LABELS.items():
+        change = (f"{(last[kind] - previous[kind]) / previous[kind]:+.0%}"
+                  if previous[kind] else "-")
+        lines.append(f"  {label}: {last[kind]} ({change})")
+    if by_day:
+        lines.append("\n📅 По дням:")
+        for (_, month, day), counts in sorted(by_day.items()):
+            icons = ", ".join(f"{label.split()[0]} {counts[kind]}"
+                              for kind, label in KIND_LABELS.items())
+            lines.append(f"  {day:02d}.{month:02d}: {icons}")
+    return "\n".join(lines)
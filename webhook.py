@@ -0,0 +1,270 @@
+# webhook.py
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from telegram import Update
+import metrics
+from config import (WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET,
+                    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_ENQUEUE_TIMEOUT, WEBHOOK_MAX_BODY,
+                    WEBHOOK_IDLE_TIMEOUT, WEBHOOK_DRAIN_TIMEOUT)
+"""Прием обновлений через webhook: встроенный HTTP-сервер на asyncio.
+
+Telegram (или обратный прокси перед ботом) шлет POST с обновлением в JSON.
+Сервер проверяет секретный заголовок и кладет обновление в очередь
+Application. Если бот не успевает, запрос ждет место в очереди, а потом
+получает 503: Telegram повторит доставку позже.
+"""
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large",
+           503: "Service Unavailable"}
+
+
+class UpdateQueue(asyncio.Queue):
+    """Очередь обновлений с ограничением на число обновлений в работе.
+
+    Application сразу забирает обновления из очереди и обрабатывает их
+    параллельно, поэтому ограничивать размер самой очереди бесполезно.
+    task_done() вызывается после обработки - по нему и считаем, сколько
+    обновлений еще не обработано.
+    """
+
+    def __init__(self, max_pending):
+        super().__init__()
+        self.max_pending = max_pending
+        self.pending = 0
+        self._room = asyncio.Event()
+        self._room.set()
+
+    def put_nowait(self, item):
+        super().put_nowait(item)
+        self.pending += 1
+        if self.pending >= self.max_pending:
+            self._room.clear()
+
+    def task_done(self):
+        super().task_done()
+        self.pending -= 1
+        if self.pending < self.max_pending:
+            self._room.set()
+
+    async def put_limited(self, item, timeout):
+        """Кладем обновление, дождавшись места. False, если не дождались."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.pending >= self.max_pending:
+            try:
+                await asyncio.wait_for(self._room.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                return False
+        self.put_nowait(item)
+        return True
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class WebhookServer:
+    """HTTP/1.1-сервер с keep-alive: Telegram держит до max_connections соединений."""
+
+    def __init__(self, application, host=WEBHOOK_LISTEN, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 secret=WEBHOOK_SECRET, enqueue_timeout=WEBHOOK_ENQUEUE_TIMEOUT):
+        if not secret:
+            raise ValueError("Для webhook нужен WEBHOOK_SECRET")
+        if not isinstance(application.update_queue, UpdateQueue):
+            raise ValueError("Application должен быть собран с update_queue=UpdateQueue(...)")
+        self.application = application
+        self.queue = application.update_queue
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret.encode()
+        self.enqueue_timeout = enqueue_timeout
+        self.draining = False
+        self.accepted = 0
+        self.rejected = 0
+        self._server = None
+        self._connections = {}  # writer -> занято ли соединение запросом
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Порт 0 - выбрать свободный (для локальных тестов)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook слушает http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self, timeout=WEBHOOK_DRAIN_TIMEOUT):
+        """Перестаем принимать обновления и закрываем соединения.
+
+        Запросы, которые уже читаются, дорабатываются; новым отвечаем 503.
+        Сами обновления из очереди дообработает Application.stop().
+        """
+        self.draining = True
+        self._server.close()
+        for writer, busy in list(self._connections.items()):
+            if not busy:
+                writer.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._connections and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = False
+        try:
+            while not self.draining:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), WEBHOOK_IDLE_TIMEOUT)
+                except HttpError as e:
+                    await _respond(writer, e.status, {"ok": False, "description": str(e)}, close=True)
+                    break
+                if request is None:
+                    break
+                self._connections[writer] = True
+                method, target, headers, body = request
+                status, payload, extra = await self._dispatch(method, target, headers, body)
+                close = self.draining or headers.get("connection", "").lower() == "close"
+                await _respond(writer, status, payload, extra, close=close)
+                self._connections[writer] = False
+                if close:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Простой соединения, обрыв или слишком длинная строка заголовка
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка webhook-соединения: {e}")
+            metrics.error("webhook")
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body):
+        path = target.split("?", 1)[0]
+        if path == "/healthz":
+            payload = {"ok": not self.draining, "pending": self.queue.pending,
+                       "accepted": self.accepted, "rejected": self.rejected}
+            return (503 if self.draining else 200), payload, ()
+        if path != self.path:
+            return 404, {"ok": False}, ()
+        if method != "POST":
+            return 405, {"ok": False}, (("Allow", "POST"),)
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret):
+            logger.warning("Webhook: неверный секретный токен")
+            return 403, {"ok": False}, ()
+        if self.draining:
+            return 503, {"ok": False, "accepted": 0}, (("Retry-After", "1"),)
+
+        try:
+            data = json.loads(body)
+            # Telegram шлет по одному обновлению; список - для пачек из записей
+            updates = [Update.de_json(item, self.application.bot)
+                       for item in (data if isinstance(data, list) else [data])]
+        except (ValueError, TypeError, KeyError) as e:
+            return 400, {"ok": False, "description": f"Некорректное обновление: {e}"}, ()
+
+        for accepted, update in enumerate(updates):
+            if not await self.queue.put_limited(update, self.enqueue_timeout):
+                # Не успеваем обрабатывать: пусть отправитель повторит остаток
+                self.accepted += accepted
+                self.rejected += len(updates) - accepted
+                logger.warning(f"Webhook: очередь переполнена ({self.queue.pending} в работе)")
+                return 503, {"ok": False, "accepted": accepted}, (("Retry-After", "1"),)
+        self.accepted += len(updates)
+        return 200, {"ok": True, "accepted": len(updates)}, ()
+
+
+async def _read_request(reader):
+    """Читаем один HTTP-запрос. None - клиент закрыл соединение."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "Некорректная строка запроса")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= 100:
+            raise HttpError(400, "Слишком много заголовков")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    body = b""
+    if method == "POST":
+        if "content-length" not in headers:
+            raise HttpError(411, "Нужен Content-Length")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HttpError(400, "Некорректный Content-Length")
+        if length < 0 or length > WEBHOOK_MAX_BODY:
+            raise HttpError(413, "Слишком большое тело запроса")
+        body = await reader.readexactly(length)
+    return method, target, headers, body
+
+
+async def _respond(writer, status, payload, extra_headers=(), close=False):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'close' if close else 'keep-alive'}"]
+    head.extend(f"{name}: {value}" for name, value in extra_headers)
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def run(application, stop_event=None, server=None):
+    """Запуск бота в режиме webhook (вместо run_polling).
+
+    Повторяет жизненный цикл run_polling: post_init, обработка, по сигналу -
+    остановка сервера, дообработка очереди, post_stop, post_shutdown.
+    """
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+    server = server or WebhookServer(application)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+            )
+
+        await stop_event.wait()
+        logger.info("Webhook: остановка, дообрабатываем очередь")
+        await server.stop()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+    finally:
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)